@@ -15,6 +15,9 @@ class EmailAttachment(BaseModel):
     sha256: Optional[str] = Field(None, description="SHA256 hash of file content")
     bytes_b64: Optional[str] = Field(None, description="Base64 encoded file content")
     url: Optional[str] = Field(None, description="URL to download attachment")
+    file_id: Optional[str] = Field(
+        None, description="Stored attachment file id (reference mode: content is read lazily, not embedded)"
+    )
 
     @field_validator("sha256")
     @classmethod
@@ -1,8 +1,8 @@
 """Master data models."""
 
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, PrivateAttr
 
 
 class Customer(BaseModel):
@@ -41,27 +41,75 @@ class Product(BaseModel):
 
 
 class MasterData(BaseModel):
-    """Master data container."""
+    """Master data container.
+
+    Lookups use hash indexes built lazily once per table snapshot. An index is rebuilt
+    when its list is reassigned or changes length; call invalidate_indexes() after
+    replacing rows in place.
+    """
 
     customers: list[Customer] = Field(default_factory=list, description="Customer list")
     contacts: list[Contact] = Field(default_factory=list, description="Contact list")
     companys: list[Company] = Field(default_factory=list, description="Company list")
     products: list[Product] = Field(default_factory=list, description="Product list")
 
+    # {index_name: ((id(rows), len(rows)), index)}
+    _indexes: dict[str, tuple[tuple[int, int], dict[str, Any]]] = PrivateAttr(default_factory=dict)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Drop indexes when a table is reassigned."""
+        if name in type(self).model_fields:
+            self._indexes.clear()
+        super().__setattr__(name, value)
+
+    def invalidate_indexes(self) -> None:
+        """Drop all lookup indexes (rebuilt lazily on next lookup)."""
+        self._indexes.clear()
+
+    def _index(
+        self,
+        name: str,
+        rows: list[Any],
+        key: Callable[[Any], str],
+        group: bool = False,
+    ) -> dict[str, Any]:
+        """Get or build an index over rows; first row wins for unique keys."""
+        fingerprint = (id(rows), len(rows))
+        cached = self._indexes.get(name)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        index: dict[str, Any] = {}
+        for row in rows:
+            if group:
+                index.setdefault(key(row), []).append(row)
+            else:
+                index.setdefault(key(row), row)
+        self._indexes[name] = (fingerprint, index)
+        return index
+
     def get_customer_by_id(self, customer_id: str) -> Customer | None:
         """Get customer by ID."""
-        return next((c for c in self.customers if c.customer_id == customer_id), None)
+        return self._index("customer_by_id", self.customers, lambda c: c.customer_id).get(customer_id)
 
     def get_contact_by_email(self, email: str) -> Contact | None:
         """Get contact by email (case-insensitive)."""
         email_lower = email.lower().strip()
-        return next((c for c in self.contacts if c.email.lower() == email_lower), None)
+        return self._index("contact_by_email", self.contacts, lambda c: c.email.lower()).get(email_lower)
+
+    def get_contact_by_id(self, contact_id: str) -> Contact | None:
+        """Get contact by ID."""
+        return self._index("contact_by_id", self.contacts, lambda c: c.contact_id).get(contact_id)
+
+    def get_contacts_by_customer_id(self, customer_id: str) -> list[Contact]:
+        """Get all contacts of a customer."""
+        index = self._index("contacts_by_customer_id", self.contacts, lambda c: c.customer_id, group=True)
+        return list(index.get(customer_id, []))
 
     def get_company_by_id(self, company_id: str) -> Company | None:
         """Get company by ID."""
-        return next((c for c in self.companys if c.company_id == company_id), None)
+        return self._index("company_by_id", self.companys, lambda c: c.company_id).get(company_id)
 
     def get_product_by_id(self, product_id: str) -> Product | None:
         """Get product by ID."""
-        return next((p for p in self.products if p.product_id == product_id), None)
-
+        return self._index("product_by_id", self.products, lambda p: p.product_id).get(product_id)
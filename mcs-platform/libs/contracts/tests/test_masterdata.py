@@ -0,0 +1,47 @@
+"""Test MasterData indexed lookups."""
+
+from mcs_contracts import Contact, Customer, MasterData
+
+
+def _masterdata() -> MasterData:
+    return MasterData(
+        customers=[
+            Customer(customer_id="c1", customer_num="C001", name="Customer 1"),
+            Customer(customer_id="c2", customer_num="C002", name="Customer 2"),
+        ],
+        contacts=[
+            Contact(contact_id="ct1", email="A@Example.com", name="A", customer_id="c1"),
+            Contact(contact_id="ct2", email="b@example.com", name="B", customer_id="c1"),
+        ],
+    )
+
+
+def test_lookups():
+    """Test lookups by id, email and customer."""
+    masterdata = _masterdata()
+    assert masterdata.get_customer_by_id("c2").name == "Customer 2"
+    assert masterdata.get_customer_by_id("missing") is None
+    assert masterdata.get_contact_by_email(" a@EXAMPLE.com ").contact_id == "ct1"
+    assert masterdata.get_contact_by_id("ct2").name == "B"
+    assert [c.contact_id for c in masterdata.get_contacts_by_customer_id("c1")] == ["ct1", "ct2"]
+    assert masterdata.get_contacts_by_customer_id("c2") == []
+
+
+def test_indexes_follow_mutation():
+    """Test indexes are rebuilt after append or reassignment."""
+    masterdata = _masterdata()
+    assert masterdata.get_customer_by_id("c3") is None
+
+    masterdata.customers.append(Customer(customer_id="c3", customer_num="C003", name="Customer 3"))
+    assert masterdata.get_customer_by_id("c3").name == "Customer 3"
+
+    masterdata.customers = [Customer(customer_id="c9", customer_num="C009", name="Customer 9")]
+    assert masterdata.get_customer_by_id("c1") is None
+    assert masterdata.get_customer_by_id("c9").name == "Customer 9"
+
+
+def test_indexes_not_serialized():
+    """Test private indexes stay out of model_dump."""
+    masterdata = _masterdata()
+    masterdata.get_customer_by_id("c1")
+    assert set(masterdata.model_dump()) == {"customers", "contacts", "companys", "products"}
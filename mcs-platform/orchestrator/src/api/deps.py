@@ -1,8 +1,8 @@
 """Dependencies for FastAPI routes."""
 
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.orm import Session
 
 from db.engine import create_db_engine, create_session_factory
@@ -12,7 +12,7 @@ from internal.repo import MasterDataRepo
 from settings import Settings
 from services.gateway_service import GatewayService
 from services.masterdata_service import MasterDataService
-from tools.dify_client import DifyClient
+from tools.dify_client import DifyClient, dify_clients
 from tools.file_server import FileServerClient
 from tools.mailer import Mailer
 from tools.masterdata_client import MasterDataClient
@@ -61,24 +61,44 @@ def get_repo(session: Annotated[Session, Depends(get_db_session)]) -> Orchestrat
     return OrchestratorRepo(session)
 
 
-def get_masterdata_client(settings: Annotated[Settings, Depends(get_settings)]) -> MasterDataClient:
-    """Get master data client."""
+def get_masterdata_client(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> MasterDataClient:
+    """Get master data client (process-wide instance from app lifespan keeps its local copy and pool)."""
+    shared = getattr(request.app.state, "masterdata_client", None)
+    if shared is not None:
+        return shared
     return MasterDataClient(settings.masterdata_api_url, settings.masterdata_api_key)
 
 
-def get_file_server(settings: Annotated[Settings, Depends(get_settings)]) -> FileServerClient:
-    """Get file server client."""
-    return FileServerClient(settings.file_server_base_url, settings.file_server_api_key)
+async def get_file_server(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> AsyncIterator[FileServerClient]:
+    """Get file server client (the pooled instance created in app lifespan when available).
+
+    没有 lifespan 实例时为本次请求新建客户端，请求结束后关闭其 HTTP 连接池。
+    """
+    shared = getattr(request.app.state, "file_server", None)
+    if shared is not None:
+        yield shared
+        return
+    file_server = FileServerClient(settings.file_server_base_url, settings.file_server_api_key)
+    try:
+        yield file_server
+    finally:
+        await file_server.aclose()
 
 
 def get_dify_contract_client(settings: Annotated[Settings, Depends(get_settings)]) -> DifyClient:
     """Get Dify contract client."""
-    return DifyClient(settings.dify_base_url, settings.dify_contract_app_key)
+    return dify_clients.get(settings.dify_base_url, settings.dify_contract_app_key)
 
 
 def get_dify_order_client(settings: Annotated[Settings, Depends(get_settings)]) -> DifyClient:
     """Get Dify order client."""
-    return DifyClient(settings.dify_base_url, settings.dify_order_app_key)
+    return dify_clients.get(settings.dify_base_url, settings.dify_order_app_key)
 
 
 def get_mailer(settings: Annotated[Settings, Depends(get_settings)]) -> Mailer:
@@ -92,12 +112,22 @@ def get_gateway_service(settings: Annotated[Settings, Depends(get_settings)]) ->
 
 
 def get_masterdata_service(
+    request: Request,
     settings: Annotated[Settings, Depends(get_settings)],
     session: Annotated[Session, Depends(get_masterdata_session)],
 ) -> MasterDataService:
-    """Get masterdata service."""
+    """Get masterdata service (shares the cache tiers and version memo created in app lifespan)."""
     repo = MasterDataRepo(session)
-    return MasterDataService(repo, settings)
+    shared = getattr(request.app.state, "masterdata_service", None)
+    return MasterDataService(
+        repo,
+        settings,
+        memory_cache=shared.cache if shared else None,
+        redis_cache=shared.redis_cache if shared else None,
+        version_memo=shared.version_memo if shared else None,
+        # 流式导出在请求 session 关闭后仍在读取，需从连接池取自己的 session
+        repo_factory=shared.repo_factory if shared else None,
+    )
 
 
 def get_listener_session(settings: Annotated[Settings, Depends(get_settings)]) -> Session:
@@ -137,6 +167,7 @@ def get_listener_service(
 
 
 def get_orchestration_service(
+    request: Request,
     settings: Annotated[Settings, Depends(get_settings)],
     session: Annotated[Session, Depends(get_db_session)],
     repo: Annotated[OrchestratorRepo, Depends(get_repo)],
@@ -147,7 +178,7 @@ def get_orchestration_service(
     mailer: Annotated[Mailer, Depends(get_mailer)],
     gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
 ) -> "OrchestrationService":
-    """Get orchestration service."""
+    """Get orchestration service (reuses the checkpointer created in app lifespan)."""
     from services.orchestration_service import OrchestrationService
     
     return OrchestrationService(
@@ -159,5 +190,7 @@ def get_orchestration_service(
         dify_order_client=dify_order_client,
         mailer=mailer,
         gateway_service=gateway_service,
+        checkpointer=request.app.state.checkpointer,
+        attachment_store=getattr(request.app.state, "attachment_store", None),
     )
 
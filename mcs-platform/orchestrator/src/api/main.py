@@ -25,15 +25,19 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from api.middleware import ExceptionMiddleware, LoggingMiddleware, RequestIdMiddleware
 from observability.logging import get_logger
+from observability.retry import circuit_breakers
 from api.routes.file import router as file_router
 from api.routes.gateway import router as gateway_router
 from api.routes.listener import router as listener_router
 from api.routes.masterdata import router as masterdata_router
 from api.routes.orchestration import router as orchestration_router
+from db.checkpoint.factory import create_checkpointer
 from db.engine import create_db_engine, create_session_factory
 from db.repo import OrchestratorRepo
+from graphs.registry import graph_registry
 from listener.db.engine import create_listener_engine, create_listener_session_factory
 from listener.repo import ListenerRepo
+from internal.cache.version_memo import VersionMemo
 from internal.db.engine import create_masterdata_engine, create_masterdata_session_factory
 from internal.repo import MasterDataRepo
 from services.gateway_service import GatewayService
@@ -42,9 +46,11 @@ from services.masterdata_service import MasterDataService
 from services.memory_service import MCSMemoryService
 from services.orchestration_service import OrchestrationService
 from settings import Settings
-from tools.dify_client import DifyClient
+from tools.attachment_store import AttachmentStore
+from tools.dify_client import dify_clients
 from tools.file_server import FileServerClient
 from tools.mailer import Mailer
+from tools.masterdata_client import MasterDataClient
 
 # 确保从项目根目录读取 .env 文件
 # 如果从 src/ 目录运行，需要向上查找 .env
@@ -73,15 +79,35 @@ async def lifespan(app: FastAPI):
     
     # Create services
     masterdata_repo = MasterDataRepo(masterdata_session_factory())
-    masterdata_service = MasterDataService(masterdata_repo, settings)
+    masterdata_service = MasterDataService(
+        masterdata_repo,
+        settings,
+        version_memo=VersionMemo(settings.masterdata_version_ttl_seconds),
+        repo_factory=lambda: MasterDataRepo(masterdata_session_factory()),
+    )
     
     gateway_service = GatewayService(settings)
     
     orchestration_repo = OrchestratorRepo(orchestration_session_factory())
-    file_server = FileServerClient(settings.file_server_base_url, settings.file_server_api_key)
-    dify_contract_client = DifyClient(settings.dify_base_url, settings.dify_contract_app_key)
-    dify_order_client = DifyClient(settings.dify_base_url, settings.dify_order_app_key)
+    file_server = FileServerClient(
+        settings.file_server_base_url,
+        settings.file_server_api_key,
+        timeout=settings.file_server_timeout_seconds,
+        max_connections=settings.file_server_max_connections,
+    )
+    circuit_breakers.configure(settings)
+    dify_clients.configure(settings)
+    dify_contract_client = dify_clients.get(settings.dify_base_url, settings.dify_contract_app_key)
+    dify_order_client = dify_clients.get(settings.dify_base_url, settings.dify_order_app_key)
     mailer = Mailer(settings)
+    masterdata_client = MasterDataClient(
+        settings.masterdata_api_url, settings.masterdata_api_key, settings.cache_ttl_seconds
+    )
+
+    attachment_store = AttachmentStore(lambda: ListenerRepo(listener_session_factory()))
+
+    # One checkpointer per process; compiled graphs are cached against it in graph_registry
+    checkpointer, checkpoint_store = await create_checkpointer(settings)
     
     orchestration_service = OrchestrationService(
         settings=settings,
@@ -92,10 +118,17 @@ async def lifespan(app: FastAPI):
         dify_order_client=dify_order_client,
         mailer=mailer,
         gateway_service=gateway_service,
+        checkpointer=checkpointer,
+        attachment_store=attachment_store,
     )
     
     listener_repo = ListenerRepo(listener_session_factory())
-    listener_service = ListenerService(settings, listener_repo, orchestration_service)
+    listener_service = ListenerService(
+        settings,
+        listener_repo,
+        orchestration_service,
+        repo_factory=lambda: ListenerRepo(listener_session_factory()),
+    )
     
     # Initialize memory service
     memory_service = None
@@ -112,19 +145,33 @@ async def lifespan(app: FastAPI):
             memory_service = None
     
     # Store services in app.state
+    app.state.checkpointer = checkpointer
+    app.state.attachment_store = attachment_store
+    app.state.file_server = file_server
     app.state.masterdata_service = masterdata_service
+    app.state.masterdata_client = masterdata_client
     app.state.gateway_service = gateway_service
     app.state.orchestration_service = orchestration_service
     app.state.listener_service = listener_service
     app.state.memory_service = memory_service
     
     # Start listener scheduler
+    await masterdata_service.start_invalidation_listener()
     await listener_service.start_scheduler()
+    await listener_service.start_workers()
     
     yield
     
     # Shutdown: Stop scheduler and close connections
     await listener_service.stop_scheduler()
+    await listener_service.stop_workers()
+    await masterdata_service.stop_invalidation_listener()
+    await masterdata_client.close()
+    await file_server.aclose()
+    await dify_clients.aclose()
+    graph_registry.clear_compiled()
+    if checkpoint_store:
+        await checkpoint_store.close()
 
 
 app = FastAPI(
@@ -407,7 +407,7 @@ async def submit_manual_review(
         resume_node = determine_resume_node(state, patch)
 
         # Apply patch and resume
-        masterdata = masterdata_service.get_all()
+        masterdata = await masterdata_service.get_snapshot_async(state.masterdata_version)
         patched_state = await resume_from_node(state, resume_node, patch, repo, masterdata)
 
         # Update run status to RUNNING
@@ -1,20 +1,29 @@
 """File download API routes."""
 
+import asyncio
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, Response
 
-from api.deps import get_file_server, get_listener_repo
+from api.deps import get_listener_repo
 from listener.repo import ListenerRepo
-from tools.file_server import FileServerClient
+from tools.attachment_store import FILES_BASE_DIR
 
 router = APIRouter(prefix="/v1/file", tags=["file"])
 
-# Base directory for attachment files (consistent with alimail listener save path)
-_FILES_BASE_DIR = "public/files"
+# 附件按 sha256 寻址且不可变：允许浏览器缓存，但每次用 ETag 重新验证（仍需经过 message_id 校验）
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
 
 
 @router.get("/{message_id}")
@@ -22,13 +31,17 @@ async def get_file(
     message_id: str,
     file_id: Annotated[UUID, Query(description="Attachment file UUID")],
     repo: Annotated[ListenerRepo, Depends(get_listener_repo)],
-    file_server: Annotated[FileServerClient, Depends(get_file_server)],
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> Response:
     """Get attachment file by file_id.
 
+    文件经 FileResponse 分块发送（服务器支持时走 sendfile），不整体读入内存；
+    支持 Range / If-Range 断点续传，ETag 取内容 sha256，If-None-Match 命中时返回 304。
+
     Args:
         message_id: Email message ID (path parameter, used for access validation).
         file_id: UUID of the attachment file record (query parameter).
+        if_none_match: Conditional GET header.
 
     Returns:
         File stream response with appropriate content headers.
@@ -48,22 +61,35 @@ async def get_file(
             detail=f"Attachment file not found for message: {message_id}",
         )
 
-    # Read file from disk
+    full_path = Path(FILES_BASE_DIR) / record.file_path
     try:
-        file_bytes = await file_server.read_file(_FILES_BASE_DIR, record.file_path)
+        stat_result = await asyncio.to_thread(full_path.stat)
     except FileNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Attachment file not found on disk",
         )
 
-    # Extract filename from file_path for Content-Disposition header
-    filename = Path(record.file_path).name
+    # 旧记录没有 sha256 时使用 FileResponse 基于 mtime/size 的默认 ETag
+    headers = {"Cache-Control": _CACHE_CONTROL}
+    if record.sha256:
+        headers["ETag"] = f'"{record.sha256}"'
 
-    return Response(
-        content=file_bytes,
-        media_type="application/octet-stream",
-        headers={
-            "Content-Disposition": f'attachment; filename="{filename}"',
-        },
+    response = FileResponse(
+        full_path,
+        media_type=record.content_type or "application/octet-stream",
+        # Original filename (content-addressed blobs are named by sha256)
+        filename=record.filename or full_path.name,
+        headers=headers,
+        stat_result=stat_result,
     )
+
+    if if_none_match and _etag_matches(if_none_match, response.headers["etag"]):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={
+                "ETag": response.headers["etag"],
+                "Cache-Control": _CACHE_CONTROL,
+            },
+        )
+    return response
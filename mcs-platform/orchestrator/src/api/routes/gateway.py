@@ -5,6 +5,7 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from api.deps import get_gateway_service, get_settings
+from observability.retry import CircuitOpenError
 from services.gateway_service import GatewayService
 from settings import Settings
 
@@ -20,6 +21,12 @@ async def create_order(
     try:
         result = await gateway_service.create_order(order_payload)
         return result
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_in_seconds)))},
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -36,6 +43,12 @@ async def get_order(
     try:
         result = await gateway_service.get_order(order_id)
         return result
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_in_seconds)))},
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
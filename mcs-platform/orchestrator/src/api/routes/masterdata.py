@@ -1,61 +1,102 @@
 """Masterdata API routes."""
 
 import uuid
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from api.deps import get_masterdata_service, get_masterdata_session, get_settings
 from mcs_contracts import Company, Contact, Customer, MasterData, Product
-from services.masterdata_service import MasterDataService
+from services.masterdata_service import EXPORT_TABLES, MasterDataService
 from settings import Settings
 
 router = APIRouter(prefix="/v1/masterdata", tags=["masterdata"])
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+StreamQuery = Annotated[bool, Query(description="Stream rows as NDJSON instead of one JSON body")]
+SinceVersionQuery = Annotated[
+    Optional[int],
+    Query(description="Only rows changed after this version (implies NDJSON streaming)"),
+]
+
+
+def _ndjson_response(
+    masterdata_service: MasterDataService,
+    tables: tuple[str, ...],
+    since_version: Optional[int],
+) -> StreamingResponse:
+    """Stream tables as NDJSON (sync generator runs in the threadpool)."""
+    return StreamingResponse(
+        masterdata_service.export_ndjson(tables, since_version=since_version),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
 
 @router.get("/customers", response_model=list[Customer])
 async def get_customers(
     masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    stream: StreamQuery = False,
+    since_version: SinceVersionQuery = None,
 ):
     """Get all customers."""
-    masterdata = masterdata_service.get_all()
+    if stream or since_version is not None:
+        return _ndjson_response(masterdata_service, ("customers",), since_version)
+    masterdata = await masterdata_service.get_all_async()
     return masterdata.customers
 
 
 @router.get("/contacts", response_model=list[Contact])
 async def get_contacts(
     masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    stream: StreamQuery = False,
+    since_version: SinceVersionQuery = None,
 ):
     """Get all contacts."""
-    masterdata = masterdata_service.get_all()
+    if stream or since_version is not None:
+        return _ndjson_response(masterdata_service, ("contacts",), since_version)
+    masterdata = await masterdata_service.get_all_async()
     return masterdata.contacts
 
 
 @router.get("/companies", response_model=list[Company])
 async def get_companies(
     masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    stream: StreamQuery = False,
+    since_version: SinceVersionQuery = None,
 ):
     """Get all companies."""
-    masterdata = masterdata_service.get_all()
+    if stream or since_version is not None:
+        return _ndjson_response(masterdata_service, ("companys",), since_version)
+    masterdata = await masterdata_service.get_all_async()
     return masterdata.companys
 
 
 @router.get("/products", response_model=list[Product])
 async def get_products(
     masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    stream: StreamQuery = False,
+    since_version: SinceVersionQuery = None,
 ):
     """Get all products."""
-    masterdata = masterdata_service.get_all()
+    if stream or since_version is not None:
+        return _ndjson_response(masterdata_service, ("products",), since_version)
+    masterdata = await masterdata_service.get_all_async()
     return masterdata.products
 
 
 @router.get("/all", response_model=MasterData)
 async def get_all(
     masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    stream: StreamQuery = False,
+    since_version: SinceVersionQuery = None,
 ):
-    """Get all master data (with caching)."""
-    return masterdata_service.get_all()
+    """Get all master data (with caching), or stream it as NDJSON."""
+    if stream or since_version is not None:
+        return _ndjson_response(masterdata_service, EXPORT_TABLES, since_version)
+    return await masterdata_service.get_all_async()
 
 
 @router.get("/version", response_model=dict[str, int])
@@ -67,6 +108,15 @@ async def get_version(
     return {"version": version}
 
 
+@router.get("/changes", response_model=dict)
+async def get_changes(
+    masterdata_service: Annotated[MasterDataService, Depends(get_masterdata_service)],
+    since: Annotated[int, Query(ge=0, description="Client's current version")],
+):
+    """Get row changes after a version (truncated=true means the client must resync fully)."""
+    return masterdata_service.get_changes(since)
+
+
 @router.post("/customers", response_model=Customer, status_code=status.HTTP_201_CREATED)
 async def create_customer(
     customer: Customer,
@@ -1,9 +1,9 @@
 """Orchestration API routes."""
 
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from api.deps import (
@@ -18,9 +18,11 @@ from api.deps import (
     get_repo,
     get_settings,
 )
+from db.repo import OrchestratorRepo
 from api.schemas import ManualReviewRequest, ManualReviewResponse, ReplayRequest, RunRequest, RunResponse
 from mcs_contracts import OrchestratorRunResult, StatusEnum
 from observability.logging import get_logger
+from observability.retry import CircuitOpenError
 from services.gateway_service import GatewayService
 from services.masterdata_service import MasterDataService
 from services.orchestration_service import OrchestrationService
@@ -42,6 +44,12 @@ async def run_sales_email(
     try:
         result = await orchestration_service.run_sales_email(request)
         return result
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Orchestration unavailable: {str(e)}",
+            headers={"Retry-After": str(max(1, int(e.retry_in_seconds)))},
+        ) from e
     except Exception as e:
         logger.error(
             "Sales email orchestration failed",
@@ -91,3 +99,18 @@ async def submit_manual_review(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Manual review submission failed: {str(e)}",
         ) from e
+
+
+@router.delete("/dify-cache", response_model=dict[str, int])
+async def invalidate_dify_cache(
+    repo: Annotated[OrchestratorRepo, Depends(get_repo)],
+    file_sha256: Annotated[Optional[str], Query(description="Only results for this PDF")] = None,
+    customer_id: Annotated[Optional[str], Query(description="Only results for this customer")] = None,
+):
+    """Invalidate cached Dify results (all entries when no filter is given)."""
+    deleted = repo.invalidate_dify_results(file_sha256=file_sha256, customer_id=customer_id)
+    logger.info(
+        "Dify result cache invalidated",
+        extra={"file_sha256": file_sha256, "customer_id": customer_id, "deleted": deleted},
+    )
+    return {"deleted": deleted}
@@ -0,0 +1,26 @@
+"""Checkpointer factory used by the app lifespan (one checkpointer per process)."""
+
+from typing import Any, Optional
+
+from db.checkpoint.redis_checkpoint import RedisCheckpointStore
+from settings import Settings
+
+
+async def create_checkpointer(settings: Settings) -> tuple[Any, Optional[RedisCheckpointStore]]:
+    """Create the process-wide LangGraph checkpointer.
+
+    checkpoint_backend=memory 时用 MemorySaver（无需 Redis JSON）；
+    redis 时需 Redis Stack/RedisJSON。
+
+    Returns:
+        (checkpointer, store): store is the RedisCheckpointStore to close on shutdown,
+        or None for the memory backend.
+    """
+    if settings.checkpoint_backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+
+        return MemorySaver(), None
+
+    checkpoint_store = RedisCheckpointStore(settings)
+    await checkpoint_store.initialize()
+    return checkpoint_store.get_checkpoint_saver_sync(), checkpoint_store
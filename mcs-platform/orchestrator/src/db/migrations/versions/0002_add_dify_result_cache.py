@@ -0,0 +1,39 @@
+"""Add dify_result_cache table.
+
+Revision ID: 0002_dify_result_cache
+Revises: 0001_init
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_dify_result_cache'
+down_revision: Union[str, None] = '0001_init'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create dify_result_cache table (content-addressed Dify results)
+    op.create_table(
+        'dify_result_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('file_sha256', sa.String(length=64), nullable=False),
+        sa.Column('customer_id', sa.String(length=100), nullable=True),
+        sa.Column('app_id', sa.String(length=200), nullable=False),
+        sa.Column('app_version', sa.String(length=50), nullable=False),
+        sa.Column('result_json', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index('ix_dify_result_cache_file_sha256', 'dify_result_cache', ['file_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS dify_result_cache')
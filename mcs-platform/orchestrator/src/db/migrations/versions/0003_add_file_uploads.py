@@ -0,0 +1,34 @@
+"""Add file_uploads table.
+
+Revision ID: 0003_file_uploads
+Revises: 0002_dify_result_cache
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_file_uploads'
+down_revision: Union[str, None] = '0002_dify_result_cache'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create file_uploads table (sha256 -> file server url, uploads happen once per content)
+    op.create_table(
+        'file_uploads',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('file_url', sa.String(length=1000), nullable=False),
+        sa.Column('file_id', sa.String(length=200), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS file_uploads')
@@ -3,7 +3,7 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, Index, String, Text
+from sqlalchemy import BigInteger, Column, DateTime, Index, String, Text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -63,3 +63,29 @@ class AuditEvent(Base):
         Index("ix_audit_events_run_id", "run_id"),
     )
 
+
+class DifyResultCache(Base):
+    """Content-addressed cache of Dify chatflow results."""
+
+    __tablename__ = "dify_result_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    customer_id: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    app_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    app_version: Mapped[str] = mapped_column(String(50), nullable=False)
+    result_json: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class FileUpload(Base):
+    """Content-addressed index of files already uploaded to the file server (sha256 -> file_url)."""
+
+    __tablename__ = "file_uploads"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_url: Mapped[str] = mapped_column(String(1000), nullable=False)
+    file_id: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
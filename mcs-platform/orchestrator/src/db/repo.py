@@ -1,14 +1,15 @@
 """Data access layer for mcs-orchestrator."""
 
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Any, Optional
 from uuid import uuid4
 
-from sqlalchemy import or_, select
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from mcs_contracts import ErrorInfo
-from db.models import AuditEvent, IdempotencyRecord, OrchestrationRun
+from db.models import AuditEvent, DifyResultCache, FileUpload, IdempotencyRecord, OrchestrationRun
 from listener.utils import normalize_message_id
 from errors import (
     RUN_NOT_IN_MANUAL_REVIEW,
@@ -140,6 +141,86 @@ class OrchestratorRepo:
         self.session.commit()
         return record
 
+    def rollback(self) -> None:
+        """Roll back the current transaction after a failed statement whose error the caller handles."""
+        try:
+            if self.session.in_transaction():
+                self.session.rollback()
+        except Exception:
+            # 如果回滚也失败，可能是事务已经关闭，忽略
+            pass
+
+    def get_dify_result(self, cache_key: str) -> Optional[dict[str, Any]]:
+        """Get an unexpired cached Dify result."""
+        stmt = select(DifyResultCache.result_json).where(
+            DifyResultCache.cache_key == cache_key,
+            DifyResultCache.expires_at > datetime.utcnow(),
+        )
+        return self.session.scalar(stmt)
+
+    def put_dify_result(
+        self,
+        cache_key: str,
+        file_sha256: str,
+        customer_id: Optional[str],
+        app_id: str,
+        app_version: str,
+        result_json: dict[str, Any],
+        ttl_seconds: int,
+    ) -> None:
+        """Store (or refresh) a cached Dify result."""
+        now = datetime.utcnow()
+        values = {
+            "file_sha256": file_sha256,
+            "customer_id": customer_id,
+            "app_id": app_id,
+            "app_version": app_version,
+            "result_json": result_json,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+        }
+        stmt = pg_insert(DifyResultCache).values(cache_key=cache_key, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=["cache_key"], set_=values)
+        self.session.execute(stmt)
+        self.session.commit()
+
+    def invalidate_dify_results(
+        self,
+        file_sha256: Optional[str] = None,
+        customer_id: Optional[str] = None,
+    ) -> int:
+        """Delete cached Dify results matching the filters (all entries when none given)."""
+        stmt = delete(DifyResultCache)
+        if file_sha256:
+            stmt = stmt.where(DifyResultCache.file_sha256 == file_sha256)
+        if customer_id:
+            stmt = stmt.where(DifyResultCache.customer_id == customer_id)
+        result = self.session.execute(stmt)
+        self.session.commit()
+        return result.rowcount or 0
+
+    def get_file_upload(self, sha256: str) -> Optional[FileUpload]:
+        """Get the file server upload recorded for a content hash."""
+        return self.session.get(FileUpload, sha256)
+
+    def put_file_upload(
+        self,
+        sha256: str,
+        file_url: str,
+        file_id: Optional[str] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        """Record a file server upload by content hash (first upload wins)."""
+        stmt = pg_insert(FileUpload).values(
+            sha256=sha256,
+            file_url=file_url,
+            file_id=file_id,
+            size=size,
+            created_at=datetime.utcnow(),
+        )
+        self.session.execute(stmt.on_conflict_do_nothing(index_elements=["sha256"]))
+        self.session.commit()
+
     def find_run_by_message_id(self, message_id: str) -> Optional[OrchestrationRun]:
         """Find orchestration run by message_id (raw or normalized; RFC 5322 allows angle brackets)."""
         try:
@@ -8,6 +8,7 @@ from errors import (
     ERP_CREATE_FAILED,
     ERP_INVALID_RESPONSE,
 )
+from observability.retry import CircuitOpenError, circuit_breakers
 from settings import Settings
 
 
@@ -20,6 +21,8 @@ class ERPClient:
         self.base_url = settings.erp_base_url
         self.api_key = settings.erp_api_key
         self.tenant_id = settings.erp_tenant_id
+        # 进程内共享：ERP 不可用时所有调用方快速失败（CircuitOpenError 原样抛出）
+        self.breaker = circuit_breakers.get("erp")
 
     async def create_order(self, order_payload: dict) -> dict:
         """Create order in ERP system."""
@@ -33,17 +36,18 @@ class ERPClient:
                 if self.tenant_id:
                     headers["X-Tenant-ID"] = self.tenant_id
 
-                response = await client.post(
-                    f"{self.base_url}/api/orders",
-                    json=order_payload,
-                    headers=headers,
-                    timeout=30.0,
-                )
+                with self.breaker.guard():
+                    response = await client.post(
+                        f"{self.base_url}/api/orders",
+                        json=order_payload,
+                        headers=headers,
+                        timeout=30.0,
+                    )
 
-                if response.status_code == 401:
-                    raise ValueError(f"{ERP_AUTH_FAILED}: Invalid credentials")
+                    if response.status_code == 401:
+                        raise ValueError(f"{ERP_AUTH_FAILED}: Invalid credentials")
 
-                response.raise_for_status()
+                    response.raise_for_status()
                 result = response.json()
 
                 # Validate response structure
@@ -57,6 +61,8 @@ class ERPClient:
                     "order_id": result.get("order_id", ""),
                 }
 
+        except CircuitOpenError:
+            raise
         except httpx.RequestError as e:
             raise ValueError(f"{ERP_CONNECTION_FAILED}: {str(e)}") from e
         except httpx.HTTPStatusError as e:
@@ -74,15 +80,18 @@ class ERPClient:
                 if self.tenant_id:
                     headers["X-Tenant-ID"] = self.tenant_id
 
-                response = await client.get(
-                    f"{self.base_url}/api/orders/{order_id}",
-                    headers=headers,
-                    timeout=30.0,
-                )
+                with self.breaker.guard():
+                    response = await client.get(
+                        f"{self.base_url}/api/orders/{order_id}",
+                        headers=headers,
+                        timeout=30.0,
+                    )
 
-                response.raise_for_status()
+                    response.raise_for_status()
                 return response.json()
 
+        except CircuitOpenError:
+            raise
         except httpx.RequestError as e:
             raise ValueError(f"{ERP_CONNECTION_FAILED}: {str(e)}") from e
         except httpx.HTTPStatusError as e:
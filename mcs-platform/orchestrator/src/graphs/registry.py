@@ -1,5 +1,6 @@
 """Graph registry for managing multiple business graphs."""
 
+import threading
 from dataclasses import dataclass
 from typing import Any, Callable, Optional
 
@@ -29,6 +30,10 @@ class GraphRegistry:
     def __init__(self):
         """Initialize graph registry."""
         self._graphs: dict[str, dict[str, GraphInfo]] = {}  # {name: {version: GraphInfo}}
+        # {(name, version, id(checkpointer)): (checkpointer, compiled graph)}
+        # 持有 checkpointer 引用，避免 id 被回收后复用
+        self._compiled: dict[tuple[str, str, int], tuple[Any, Any]] = {}
+        self._compile_lock = threading.Lock()
 
     def register(self, graph_info: GraphInfo) -> None:
         """Register a graph."""
@@ -50,6 +55,33 @@ class GraphRegistry:
                 return max(versions.values(), key=lambda g: g.version)
             return None
 
+    def get_compiled(self, name: str, checkpointer: Any, version: Optional[str] = None) -> Any:
+        """Get a compiled graph, building it once per (name, version, checkpointer).
+
+        build_callable must accept a ``checkpointer`` keyword and return a compiled graph
+        that holds no per-run state; per-run dependencies are passed through the run config.
+        """
+        graph_info = self.get(name, version)
+        if graph_info is None:
+            raise KeyError(f"Graph not registered: {name}" + (f"@{version}" if version else ""))
+
+        key = (graph_info.name, graph_info.version, id(checkpointer))
+        cached = self._compiled.get(key)
+        if cached is not None:
+            return cached[1]
+
+        with self._compile_lock:
+            cached = self._compiled.get(key)
+            if cached is None:
+                cached = (checkpointer, graph_info.build_callable(checkpointer=checkpointer))
+                self._compiled[key] = cached
+        return cached[1]
+
+    def clear_compiled(self) -> None:
+        """Drop all compiled graphs (e.g. on shutdown or after checkpointer change)."""
+        with self._compile_lock:
+            self._compiled.clear()
+
     def list_graphs(self) -> list[GraphInfo]:
         """List all registered graphs."""
         graphs = []
@@ -57,3 +89,7 @@ class GraphRegistry:
             graphs.extend(versions.values())
         return graphs
 
+
+
+# Process-wide registry; graphs register themselves on import (see graphs/sales_email/graph.py)
+graph_registry = GraphRegistry()
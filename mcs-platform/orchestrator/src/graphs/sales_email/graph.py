@@ -1,12 +1,14 @@
 """Build sales email LangGraph."""
 
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, Optional
 
 from langgraph.config import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 
-from mcs_contracts import StatusEnum
+from mcs_contracts import EmailEvent, MasterData, OrchestratorRunResult, StatusEnum
 from db.repo import OrchestratorRepo
+from graphs.registry import GraphInfo, graph_registry
 from graphs.sales_email.nodes import (
     call_dify_contract,
     call_dify_order_payload,
@@ -25,83 +27,163 @@ from graphs.sales_email.state import SalesEmailState
 from settings import Settings
 from services.gateway_service import GatewayService
 from services.masterdata_service import MasterDataService
+from tools.attachment_store import AttachmentStore
 from tools.dify_client import DifyClient
 from tools.file_server import FileServerClient
 from tools.mailer import Mailer
 
 
-def build_sales_email_graph(
-    settings: Settings,
-    db_repo: OrchestratorRepo,
-    checkpointer: Any,
-    masterdata_service: MasterDataService,
-    file_server: FileServerClient,
-    dify_contract_client: DifyClient,
-    dify_order_client: DifyClient,
-    mailer: Mailer,
-    gateway_service: GatewayService,
-) -> StateGraph:
-    """Build sales email LangGraph."""
+# 运行时依赖在 config["configurable"] 中的键名
+DEPS_CONFIG_KEY = "sales_email_deps"
+
+
+@dataclass
+class SalesEmailDeps:
+    """Per-run node dependencies, passed via config["configurable"][DEPS_CONFIG_KEY].
+
+    编译后的图在进程内共享，节点不再闭包绑定依赖，而是在运行时从 config 中取。
+    """
+
+    settings: Settings
+    db_repo: OrchestratorRepo
+    masterdata_service: MasterDataService
+    file_server: FileServerClient
+    dify_contract_client: DifyClient
+    dify_order_client: DifyClient
+    mailer: Mailer
+    gateway_service: GatewayService
+    attachment_store: Optional[AttachmentStore] = None
+
+
+def _get_configurable(config: RunnableConfig | dict | None) -> dict[str, Any]:
+    """Extract the configurable dict from a RunnableConfig."""
+    if not config:
+        return {}
+    configurable = (
+        config.get("configurable", {})
+        if isinstance(config, dict)
+        else getattr(config, "configurable", None) or {}
+    )
+    return configurable if isinstance(configurable, dict) else {}
+
+
+def get_deps(config: RunnableConfig | dict | None) -> SalesEmailDeps:
+    """Get node dependencies from run config."""
+    deps = _get_configurable(config).get(DEPS_CONFIG_KEY)
+    if not isinstance(deps, SalesEmailDeps):
+        raise RuntimeError(
+            f"Missing '{DEPS_CONFIG_KEY}' in run config; "
+            "invoke the graph with build_run_config(thread_id, deps)."
+        )
+    return deps
+
+
+async def resolve_masterdata(state: SalesEmailState, deps: SalesEmailDeps) -> Optional[MasterData]:
+    """Resolve the run's master data snapshot from state.masterdata_version."""
+    if state.masterdata_version is None:
+        return None
+    return await deps.masterdata_service.get_snapshot_async(state.masterdata_version)
+
+
+def build_run_config(thread_id: str, deps: SalesEmailDeps) -> dict[str, Any]:
+    """Build run config carrying thread_id and node dependencies."""
+    return {"configurable": {"thread_id": thread_id, DEPS_CONFIG_KEY: deps}}
+
+
+def build_sales_email_graph(checkpointer: Any) -> StateGraph:
+    """Build and compile sales email LangGraph.
+
+    The compiled graph holds no per-run dependencies, so it can be compiled once per
+    process (see graphs.registry.GraphRegistry.get_compiled) and shared by all runs.
+    """
     graph = StateGraph(SalesEmailState)
 
     # Add nodes
     # 注意：所有节点函数都是异步的，LangGraph 会自动处理异步函数
-    # 使用包装函数来绑定额外参数，确保异步函数被正确调用
-    
-    # 为需要额外参数的节点创建包装函数
-    async def check_idempotency_wrapper(state: SalesEmailState) -> SalesEmailState:
+    # 包装函数从 config 中取依赖（LangGraph 节点函数可以接受 (state, config) 参数）
+
+    async def check_idempotency_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for check_idempotency node."""
-        return await check_idempotency(state, db_repo)
-    
-    async def load_masterdata_wrapper(state: SalesEmailState) -> SalesEmailState:
+        return await check_idempotency(state, get_deps(config).db_repo)
+
+    async def load_masterdata_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for load_masterdata node."""
-        return await load_masterdata(state, masterdata_service)
-    
-    async def match_customer_wrapper(state: SalesEmailState) -> SalesEmailState:
+        return await load_masterdata(state, get_deps(config).masterdata_service)
+
+    async def match_contact_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
+        """Wrapper for match_contact node."""
+        deps = get_deps(config)
+        return await match_contact(state, await resolve_masterdata(state, deps))
+
+    async def match_customer_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for match_customer node."""
-        return await match_customer(state, settings)
-    
-    async def upload_pdf_wrapper(state: SalesEmailState) -> SalesEmailState:
+        deps = get_deps(config)
+        return await match_customer(state, await resolve_masterdata(state, deps), deps.settings)
+
+    async def upload_pdf_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for upload_pdf node."""
-        return await upload_pdf(state, file_server, db_repo)
-    
-    async def call_dify_contract_wrapper(state: SalesEmailState) -> SalesEmailState:
+        deps = get_deps(config)
+        return await upload_pdf(state, deps.file_server, deps.db_repo, deps.attachment_store)
+
+    async def call_dify_contract_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for call_dify_contract node."""
-        return await call_dify_contract(state, dify_contract_client, settings)
-    
-    async def call_dify_order_payload_wrapper(state: SalesEmailState) -> SalesEmailState:
+        deps = get_deps(config)
+        return await call_dify_contract(
+            state,
+            await resolve_masterdata(state, deps),
+            deps.dify_contract_client,
+            deps.settings,
+            deps.db_repo,
+        )
+
+    async def call_dify_order_payload_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for call_dify_order_payload node."""
-        return await call_dify_order_payload(state, dify_order_client, settings)
-    
-    async def call_gateway_wrapper(state: SalesEmailState) -> SalesEmailState:
+        deps = get_deps(config)
+        return await call_dify_order_payload(
+            state, await resolve_masterdata(state, deps), deps.dify_order_client, deps.settings
+        )
+
+    async def call_gateway_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for call_gateway node."""
-        return await call_gateway(state, gateway_service, db_repo)
-    
-    async def notify_sales_wrapper(state: SalesEmailState) -> SalesEmailState:
+        deps = get_deps(config)
+        return await call_gateway(state, deps.gateway_service, deps.db_repo)
+
+    async def notify_sales_wrapper(
+        state: SalesEmailState, config: RunnableConfig
+    ) -> SalesEmailState:
         """Wrapper for notify_sales node."""
-        return await notify_sales(state, mailer, settings)
-    
-    # 为 finalize 节点创建包装函数，从 config 中获取 run_id (thread_id)
-    # LangGraph 节点函数可以接受 (state, config) 参数，其中 config 是 RunnableConfig
+        deps = get_deps(config)
+        return await notify_sales(
+            state, await resolve_masterdata(state, deps), deps.mailer, deps.settings
+        )
+
     async def finalize_wrapper(
-        state: SalesEmailState,
-        config: RunnableConfig | dict | None = None,
+        state: SalesEmailState, config: RunnableConfig
     ) -> SalesEmailState:
         """Wrapper for finalize node: run_id 优先从 state 取（调用方注入），否则从 config 回退."""
-        run_id = state.run_id or ""
-        if not run_id and config:
-            configurable = (
-                config.get("configurable", {})
-                if isinstance(config, dict)
-                else getattr(config, "configurable", None) or {}
-            )
-            if isinstance(configurable, dict):
-                run_id = configurable.get("thread_id", "")
-        return await finalize(state, db_repo, run_id)
-    
+        run_id = state.run_id or _get_configurable(config).get("thread_id", "")
+        deps = get_deps(config)
+        return await finalize(state, await resolve_masterdata(state, deps), deps.db_repo, run_id)
+
     graph.add_node("check_idempotency", check_idempotency_wrapper)
     graph.add_node("load_masterdata", load_masterdata_wrapper)
-    graph.add_node("match_contact", match_contact)
+    graph.add_node("match_contact", match_contact_wrapper)
     graph.add_node("detect_contract_signal", detect_contract_signal)
     graph.add_node("match_customer", match_customer_wrapper)
     graph.add_node("upload_pdf", upload_pdf_wrapper)
@@ -171,6 +253,21 @@ def build_sales_email_graph(
         },
     )
 
-    # Compile with checkpoint（checkpointer 由调用方传入：RedisCheckpointStore.get_checkpoint_saver_sync() 或 MemorySaver()）
+    # Compile with checkpoint（checkpointer 由调用方传入，进程内共享：
+    # 见 db.checkpoint.factory.create_checkpointer）
     return graph.compile(checkpointer=checkpointer)
 
+
+SALES_EMAIL_GRAPH_NAME = "sales_email"
+SALES_EMAIL_GRAPH_VERSION = "1"
+
+graph_registry.register(
+    GraphInfo(
+        name=SALES_EMAIL_GRAPH_NAME,
+        version=SALES_EMAIL_GRAPH_VERSION,
+        input_model=EmailEvent,
+        output_model=OrchestratorRunResult,
+        build_callable=build_sales_email_graph,
+        required_scopes=["mcs:sales_email:run"],
+    )
+)
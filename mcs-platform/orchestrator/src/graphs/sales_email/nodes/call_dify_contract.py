@@ -1,26 +1,50 @@
 """Call Dify contract recognition node."""
 
-from mcs_contracts import DifyContractResult
+import hashlib
+from typing import Any, Optional
+
+from mcs_contracts import DifyContractResult, MasterData
+from db.repo import OrchestratorRepo
 from errors import DIFY_CONTRACT_FAILED, OrchestratorError
 from graphs.sales_email.state import SalesEmailState
+from observability.logging import get_logger
+from observability.metrics import dify_result_cache_total
 from settings import Settings
-from tools.dify_client import DifyClient
+from tools.dify_client import DifyClient, dify_clients
+
+logger = get_logger()
+
+
+def contract_app_id(client: DifyClient) -> str:
+    """Identify the chatflow app behind a client without storing its token."""
+    token_digest = hashlib.sha256(client.app_key.encode()).hexdigest()[:12]
+    return f"{client.base_url}{client.api_path}#{token_digest}"
+
+
+def contract_cache_key(file_sha256: str, customer_id: str, app_id: str, app_version: str) -> str:
+    """Content-addressed cache key for a contract recognition result."""
+    return hashlib.sha256(f"{file_sha256}:{customer_id}:{app_id}:{app_version}".encode()).hexdigest()
 
 
 async def node_call_dify_contract(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
     dify_client: DifyClient,
     settings: Settings | None = None,
+    repo: OrchestratorRepo | None = None,
 ) -> SalesEmailState:
     """Call Dify contract recognition chatflow.
     
     If settings is provided and DIFY_CONF contains 'sales_email-call_dify_contract',
     uses the configured url, path, and token. Otherwise, uses the provided dify_client.
+
+    With a repo and dify_contract_cache_enabled, successful results are cached by
+    (pdf sha256, customer_id, chatflow app, dify_contract_cache_version); a hit skips the call.
     """
     if not state.matched_customer or not state.file_upload or not state.file_upload.ok:
         return state
 
-    customer = state.masterdata.get_customer_by_id(state.matched_customer.customer_id) if state.masterdata else None
+    customer = masterdata.get_customer_by_id(state.matched_customer.customer_id) if masterdata else None
     if not customer:
         return state
 
@@ -29,8 +53,8 @@ async def node_call_dify_contract(
     if settings:
         node_config = settings.get_dify_node_config("sales_email-call_dify_contract")
         if node_config and node_config.get("url") and node_config.get("token"):
-            # 使用配置中的 url、path、token 创建新的客户端
-            client_to_use = DifyClient(
+            # 使用配置中的 url、path、token 取共享的池化客户端
+            client_to_use = dify_clients.get(
                 base_url=node_config["url"],
                 app_key=node_config["token"],
                 api_path=node_config.get("path", "/v1/chat-messages"),
@@ -49,6 +73,19 @@ async def node_call_dify_contract(
         }
     ]
 
+    file_sha256 = (state.pdf_attachment.sha256 if state.pdf_attachment else None) or state.file_upload.sha256
+    cache_key = None
+    if repo and settings and settings.dify_contract_cache_enabled and file_sha256:
+        app_id = contract_app_id(client_to_use)
+        cache_key = contract_cache_key(
+            file_sha256, customer.customer_id, app_id, settings.dify_contract_cache_version
+        )
+        cached = _get_cached(repo, cache_key)
+        dify_result_cache_total.labels(app="contract", result="hit" if cached else "miss").inc()
+        if cached:
+            state.contract_result = DifyContractResult(**cached)
+            return state
+
     result = await client_to_use.chatflow_async(
         query="识别采购合同",
         user=state.email_event.from_email,
@@ -57,6 +94,18 @@ async def node_call_dify_contract(
     )
 
     contract_result = DifyContractResult(**result)
+    # 仅缓存成功结果，失败结果下次重新识别
+    if cache_key and contract_result.ok:
+        _put_cached(
+            repo,
+            cache_key,
+            file_sha256=file_sha256,
+            customer_id=customer.customer_id,
+            app_id=app_id,
+            app_version=settings.dify_contract_cache_version,
+            result_json=contract_result.model_dump(mode="json"),
+            ttl_seconds=settings.dify_contract_cache_ttl_seconds,
+        )
     state.contract_result = contract_result
 
     if not contract_result.ok:
@@ -67,3 +116,22 @@ async def node_call_dify_contract(
 
     return state
 
+
+def _get_cached(repo: OrchestratorRepo, cache_key: str) -> Optional[dict[str, Any]]:
+    """Read cached result; cache errors never fail the run."""
+    try:
+        return repo.get_dify_result(cache_key)
+    except Exception as e:
+        # 共享 session 的事务已中止，回滚后后续的 repo 调用（如幂等记录）才能继续
+        repo.rollback()
+        logger.warning("Dify result cache read failed", extra={"error": str(e)})
+        return None
+
+
+def _put_cached(repo: OrchestratorRepo, cache_key: str, **kwargs: Any) -> None:
+    """Write cached result; cache errors never fail the run."""
+    try:
+        repo.put_dify_result(cache_key, **kwargs)
+    except Exception as e:
+        repo.rollback()
+        logger.warning("Dify result cache write failed", extra={"error": str(e)})
@@ -1,14 +1,17 @@
 """Call Dify order payload generation node."""
 
-from mcs_contracts import DifyOrderPayloadResult
+from typing import Optional
+
+from mcs_contracts import DifyOrderPayloadResult, MasterData
 from errors import DIFY_ORDER_PAYLOAD_BLOCKED, OrchestratorError
 from graphs.sales_email.state import SalesEmailState
 from settings import Settings
-from tools.dify_client import DifyClient
+from tools.dify_client import DifyClient, dify_clients
 
 
 async def node_call_dify_order_payload(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
     dify_client: DifyClient,
     settings: Settings | None = None,
 ) -> SalesEmailState:
@@ -20,8 +23,8 @@ async def node_call_dify_order_payload(
     if not state.contract_result or not state.contract_result.ok:
         return state
 
-    customer = state.masterdata.get_customer_by_id(state.matched_customer.customer_id) if state.masterdata and state.matched_customer else None
-    contact = state.masterdata.get_contact_by_email(state.email_event.from_email) if state.masterdata else None
+    customer = masterdata.get_customer_by_id(state.matched_customer.customer_id) if masterdata and state.matched_customer else None
+    contact = masterdata.get_contact_by_email(state.email_event.from_email) if masterdata else None
 
     if not customer or not contact:
         return state
@@ -31,8 +34,8 @@ async def node_call_dify_order_payload(
     if settings:
         node_config = settings.get_dify_node_config("sales_email-call_dify_order_payload")
         if node_config and node_config.get("url") and node_config.get("token"):
-            # 使用配置中的 url、path、token 创建新的客户端
-            client_to_use = DifyClient(
+            # 使用配置中的 url、path、token 取共享的池化客户端
+            client_to_use = dify_clients.get(
                 base_url=node_config["url"],
                 app_key=node_config["token"],
                 api_path=node_config.get("path", "/v1/chat-messages"),
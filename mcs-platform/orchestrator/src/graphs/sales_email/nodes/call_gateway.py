@@ -3,7 +3,7 @@
 from mcs_contracts import ERPCreateOrderResult, ErrorInfo, StatusEnum, now_iso
 from errors import ERP_CREATE_FAILED
 from graphs.sales_email.state import SalesEmailState
-from observability.retry import retry_with_backoff
+from observability.retry import CircuitOpenError, retry_with_backoff
 from services.gateway_service import GatewayService
 
 
@@ -41,6 +41,9 @@ async def node_call_gateway(
             )
 
         state.erp_result = erp_result
+    except CircuitOpenError:
+        # ERP 熔断：不记为下单失败，原样抛出由工作队列暂存后重试（同 DifyClient）
+        raise
     except Exception as e:
         state.erp_result = ERPCreateOrderResult(
             ok=False,
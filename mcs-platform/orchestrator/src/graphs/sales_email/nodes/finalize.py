@@ -1,6 +1,8 @@
 """Finalize node."""
 
-from mcs_contracts import OrchestratorRunResult, StatusEnum, now_iso
+from typing import Optional
+
+from mcs_contracts import MasterData, OrchestratorRunResult, StatusEnum, now_iso
 from db.repo import OrchestratorRepo
 from graphs.sales_email.nodes.generate_candidates import generate_manual_review_candidates
 from graphs.sales_email.state import SalesEmailState
@@ -9,6 +11,7 @@ from observability.redaction import redact_dict
 
 async def node_finalize(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
     repo: OrchestratorRepo,
     run_id: str,
 ) -> SalesEmailState:
@@ -45,7 +48,7 @@ async def node_finalize(
 
     # Generate candidates if entering MANUAL_REVIEW
     if state.final_status == StatusEnum.MANUAL_REVIEW:
-        candidates = generate_manual_review_candidates(state)
+        candidates = generate_manual_review_candidates(state, masterdata)
         state.set_manual_review(reason_code or "MANUAL_REVIEW", candidates=candidates)
 
         # Persist to state_json (redacted)
@@ -1,16 +1,22 @@
 """Generate manual review candidates."""
 
+from typing import Optional
+
 from mcs_contracts import (
     ManualReviewCandidateContact,
     ManualReviewCandidateCustomer,
     ManualReviewCandidatePdf,
     ManualReviewCandidates,
+    MasterData,
 )
 from graphs.sales_email.state import SalesEmailState
 from tools.similarity import normalize_filename
 
 
-def generate_manual_review_candidates(state: SalesEmailState) -> ManualReviewCandidates:
+def generate_manual_review_candidates(
+    state: SalesEmailState,
+    masterdata: Optional[MasterData],
+) -> ManualReviewCandidates:
     """Generate candidates for manual review."""
     candidates = ManualReviewCandidates()
 
@@ -48,7 +54,7 @@ def generate_manual_review_candidates(state: SalesEmailState) -> ManualReviewCan
 
         for candidate in state.matched_customer.top_candidates[:3]:  # Top 3
             customer_id = candidate["customer_id"]
-            customer = state.masterdata.get_customer_by_id(customer_id) if state.masterdata else None
+            customer = masterdata.get_customer_by_id(customer_id) if masterdata else None
 
             if customer:
                 normalized_filename = (
@@ -71,10 +77,10 @@ def generate_manual_review_candidates(state: SalesEmailState) -> ManualReviewCan
                 )
 
     # Generate contact candidates
-    if state.masterdata:
+    if masterdata:
         # If contact matched, include it
         if state.matched_contact and state.matched_contact.ok and state.matched_contact.contact_id:
-            contact = state.masterdata.get_contact_by_email(state.email_event.from_email)
+            contact = masterdata.get_contact_by_email(state.email_event.from_email)
             if contact:
                 candidates.contacts.append(
                     ManualReviewCandidateContact(
@@ -89,18 +95,17 @@ def generate_manual_review_candidates(state: SalesEmailState) -> ManualReviewCan
         # If contact not found, try to find contacts by customer_id
         elif state.matched_customer and state.matched_customer.ok:
             customer_id = state.matched_customer.customer_id
-            for contact in state.masterdata.contacts:
-                if contact.customer_id == customer_id:
-                    candidates.contacts.append(
-                        ManualReviewCandidateContact(
-                            contact_id=contact.contact_id,
-                            name=contact.name,
-                            email=contact.email,
-                            telephone=contact.telephone,
-                            customer_id=contact.customer_id,
-                            suggested=(contact.email.lower() == state.email_event.from_email.lower()),
-                        )
+            for contact in masterdata.get_contacts_by_customer_id(customer_id):
+                candidates.contacts.append(
+                    ManualReviewCandidateContact(
+                        contact_id=contact.contact_id,
+                        name=contact.name,
+                        email=contact.email,
+                        telephone=contact.telephone,
+                        customer_id=contact.customer_id,
+                        suggested=(contact.email.lower() == state.email_event.from_email.lower()),
                     )
+                )
 
     # Ensure only one suggested per category
     _ensure_single_suggested(candidates)
@@ -12,10 +12,14 @@ async def node_load_masterdata(
     state: SalesEmailState,
     masterdata_service: MasterDataService,
 ) -> SalesEmailState:
-    """Load master data from service (with caching)."""
+    """Load master data from service (memory -> Redis -> DB).
+
+    Only the snapshot version is stored in state; nodes resolve the data via
+    MasterDataService.get_snapshot_async(state.masterdata_version).
+    """
     try:
-        masterdata = masterdata_service.get_all()
-        state.masterdata = masterdata
+        version, _ = await masterdata_service.load_snapshot_async()
+        state.masterdata_version = version
         return state
     except Exception as e:
         state.add_error(
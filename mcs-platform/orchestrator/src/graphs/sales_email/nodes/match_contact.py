@@ -1,15 +1,18 @@
 """Match contact node."""
 
-from mcs_contracts import ContactMatchResult, ErrorInfo
+from typing import Optional
+
+from mcs_contracts import ContactMatchResult, ErrorInfo, MasterData
 from errors import CONTACT_NOT_FOUND
 from graphs.sales_email.state import SalesEmailState
 
 
 async def node_match_contact(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
 ) -> SalesEmailState:
     """Match contact by email."""
-    if not state.masterdata:
+    if not masterdata:
         state.add_error(
             "MASTERDATA_NOT_LOADED",
             "Master data not loaded",
@@ -17,7 +20,7 @@ async def node_match_contact(
         return state
 
     from_email = state.email_event.from_email
-    contact = state.masterdata.get_contact_by_email(from_email)
+    contact = masterdata.get_contact_by_email(from_email)
 
     if contact:
         state.matched_contact = ContactMatchResult(
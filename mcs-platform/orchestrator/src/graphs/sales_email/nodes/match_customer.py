@@ -1,6 +1,8 @@
 """Match customer node."""
 
-from mcs_contracts import CustomerMatchResult, ErrorInfo
+from typing import Optional
+
+from mcs_contracts import CustomerMatchResult, ErrorInfo, MasterData
 from errors import CUSTOMER_MATCH_LOW_SCORE
 from graphs.sales_email.state import SalesEmailState
 from settings import Settings
@@ -8,14 +10,15 @@ from settings import Settings
 
 async def node_match_customer(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
     settings: Settings,
 ) -> SalesEmailState:
     """Match customer by matched_contact's customer_id from masterdata.customers."""
-    if not state.masterdata or not state.matched_contact or not state.matched_contact.ok or not state.matched_contact.customer_id:
+    if not masterdata or not state.matched_contact or not state.matched_contact.ok or not state.matched_contact.customer_id:
         return state
 
     customer_id = state.matched_contact.customer_id
-    customer = state.masterdata.get_customer_by_id(customer_id)
+    customer = masterdata.get_customer_by_id(customer_id)
     if not customer:
         state.matched_customer = CustomerMatchResult(
             ok=False,
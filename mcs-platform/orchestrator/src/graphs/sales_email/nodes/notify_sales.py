@@ -1,6 +1,8 @@
 """Notify sales node."""
 
-from mcs_contracts import StatusEnum, now_iso
+from typing import Optional
+
+from mcs_contracts import MasterData, StatusEnum, now_iso
 from graphs.sales_email.state import SalesEmailState
 from tools.mailer import Mailer
 from settings import Settings
@@ -8,6 +10,7 @@ from settings import Settings
 
 async def node_notify_sales(
     state: SalesEmailState,
+    masterdata: Optional[MasterData],
     mailer: Mailer,
     settings: Settings,
 ) -> SalesEmailState:
@@ -46,7 +49,7 @@ async def node_notify_sales(
     if state.erp_result and state.erp_result.ok:
         context["sales_order_no"] = state.erp_result.sales_order_no
         context["order_url"] = state.erp_result.order_url
-        customer = state.masterdata.get_customer_by_id(state.matched_customer.customer_id) if state.masterdata and state.matched_customer else None
+        customer = masterdata.get_customer_by_id(state.matched_customer.customer_id) if masterdata and state.matched_customer else None
         context["customer_name"] = customer.name if customer else "Unknown"
 
     # Render and send (non-blocking, failures are logged but don't affect state)
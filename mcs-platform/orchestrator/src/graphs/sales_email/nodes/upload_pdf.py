@@ -1,38 +1,52 @@
 """Upload PDF node."""
 
+import asyncio
 import base64
 import hashlib
+from typing import Optional
 
-from mcs_contracts import FileUploadResult, StatusEnum, now_iso
+from mcs_contracts import EmailAttachment, FileUploadResult, StatusEnum, now_iso
 from db.repo import OrchestratorRepo
 from graphs.sales_email.state import SalesEmailState
-from tools.file_server import FileServerClient
+from observability.logging import get_logger
+from observability.metrics import file_upload_dedup_total
+from tools.attachment_store import AttachmentStore
+from tools.file_server import FileServerClient, UploadSource
+
+logger = get_logger()
 
 
 async def node_upload_pdf(
     state: SalesEmailState,
     file_server: FileServerClient,
     repo: OrchestratorRepo,
+    attachment_store: Optional[AttachmentStore] = None,
 ) -> SalesEmailState:
-    """Upload PDF to file server."""
+    """Upload PDF to file server.
+
+    Uploads are content-addressed: if the PDF's sha256 was uploaded before (other email,
+    replay), the recorded file_url is reused and no bytes are decoded or transferred.
+    Attachments carried by reference (file_id) are streamed from attachment_store only on a miss.
+    """
     if not state.pdf_attachment:
         return state
 
-    # Decode base64 if available
-    if state.pdf_attachment.bytes_b64:
-        file_bytes = base64.b64decode(state.pdf_attachment.bytes_b64)
-    else:
-        # TODO: Fetch from email_listener API if bytes not available
-        state.add_warning("PDF bytes not available, cannot upload")
-        return state
+    upload_result = _lookup_upload(repo, state.pdf_attachment.sha256)
+    if upload_result is None:
+        source = await _load_source(state.pdf_attachment, attachment_store)
+        if source is None:
+            state.add_warning("PDF bytes not available, cannot upload")
+            return state
 
-    # Upload to file server
-    upload_result = file_server.upload_file(
-        file_bytes=file_bytes,
-        filename=state.pdf_attachment.filename,
-        content_type=state.pdf_attachment.content_type,
-        sha256=state.pdf_attachment.sha256,
-    )
+        # Upload to file server (async, streamed from memory or the stored file)
+        upload_result = await file_server.upload_file_async(
+            source,
+            filename=state.pdf_attachment.filename,
+            content_type=state.pdf_attachment.content_type,
+            sha256=state.pdf_attachment.sha256,
+        )
+        if upload_result.ok and upload_result.file_url:
+            _record_upload(repo, upload_result, state.pdf_attachment.size)
 
     state.file_upload = upload_result
 
@@ -72,3 +86,53 @@ async def node_upload_pdf(
 
     return state
 
+
+async def _load_source(
+    attachment: EmailAttachment,
+    attachment_store: Optional[AttachmentStore],
+) -> Optional[UploadSource]:
+    """Get attachment content: inline base64, or the path of the stored file referenced by file_id."""
+    if attachment.bytes_b64:
+        return base64.b64decode(attachment.bytes_b64)
+    if attachment.file_id and attachment_store:
+        try:
+            return await asyncio.to_thread(attachment_store.resolve, attachment.file_id)
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning(
+                "Attachment reference could not be read",
+                extra={"file_id": attachment.file_id, "error": str(e)},
+            )
+    return None
+
+
+def _lookup_upload(repo: OrchestratorRepo, sha256: Optional[str]) -> Optional[FileUploadResult]:
+    """Find an earlier upload of the same content; index errors never fail the run."""
+    if not sha256:
+        return None
+    try:
+        record = repo.get_file_upload(sha256)
+    except Exception as e:
+        # 共享 session 的事务已中止，回滚后后续的 repo 调用（如幂等记录）才能继续
+        repo.rollback()
+        logger.warning("File upload index read failed", extra={"error": str(e)})
+        return None
+    file_upload_dedup_total.labels(result="hit" if record else "miss").inc()
+    if record is None:
+        return None
+    return FileUploadResult(ok=True, file_url=record.file_url, file_id=record.file_id, sha256=sha256)
+
+
+def _record_upload(repo: OrchestratorRepo, upload_result: FileUploadResult, size: int) -> None:
+    """Remember the upload by content hash; index errors never fail the run."""
+    if not upload_result.sha256:
+        return
+    try:
+        repo.put_file_upload(
+            upload_result.sha256,
+            file_url=upload_result.file_url,
+            file_id=upload_result.file_id,
+            size=size,
+        )
+    except Exception as e:
+        repo.rollback()
+        logger.warning("File upload index write failed", extra={"error": str(e)})
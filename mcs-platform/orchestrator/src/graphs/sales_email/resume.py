@@ -65,12 +65,9 @@ async def resume_from_node(
 
     if "selected_contact_id" in patch and patch["selected_contact_id"]:
         contact = masterdata.get_contact_by_email(state.email_event.from_email) if masterdata else None
-        if not contact:
+        if not contact and masterdata:
             # Try to find by contact_id
-            for c in masterdata.contacts if masterdata else []:
-                if c.contact_id == patch["selected_contact_id"]:
-                    contact = c
-                    break
+            contact = masterdata.get_contact_by_id(patch["selected_contact_id"])
 
         if contact:
             state.matched_contact = ContactMatchResult(
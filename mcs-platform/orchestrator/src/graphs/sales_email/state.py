@@ -17,7 +17,6 @@ from mcs_contracts import (
     ErrorInfo,
     FileUploadResult,
     ManualReviewCandidates,
-    MasterData,
     StatusEnum,
 )
 
@@ -41,9 +40,9 @@ class SalesEmailState(BaseModel):
         ..., description="Input email event"
     )
 
-    # Master data
-    masterdata: Annotated[Optional[MasterData], _keep_first] = Field(
-        None, description="Loaded master data"
+    # Master data（仅保存版本号，完整主数据按版本从进程内快照存储解析，不写入检查点）
+    masterdata_version: Annotated[Optional[int], _keep_first] = Field(
+        None, description="Loaded master data version (snapshot handle)"
     )
 
     # Matching results
@@ -1,7 +1,7 @@
 """Redis cache implementation."""
 
 import json
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 import redis.asyncio as redis
 from redis.asyncio import Redis
@@ -9,6 +9,10 @@ from redis.asyncio import Redis
 from mcs_contracts import MasterData
 
 
+# 主数据版本变更广播频道（各副本订阅后清理进程内缓存）
+INVALIDATION_CHANNEL = "masterdata:invalidate"
+
+
 class RedisCache:
     """Redis cache with version checking."""
 
@@ -71,6 +75,29 @@ class RedisCache:
         version_key = "masterdata:version"
         await client.delete(cache_key, version_key)
 
+    async def publish_invalidation(self, version: int) -> None:
+        """Broadcast a master data version bump to all replicas."""
+        client = await self._get_client()
+        await client.publish(INVALIDATION_CHANNEL, str(version))
+
+    async def listen_invalidations(self, on_version: Callable[[int], Awaitable[None]]) -> None:
+        """Subscribe to version bumps and call on_version for each; runs until cancelled."""
+        client = await self._get_client()
+        pubsub = client.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    version = int(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                await on_version(version)
+        finally:
+            await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+            await pubsub.close()
+
     async def close(self) -> None:
         """Close Redis connection."""
         if self._client:
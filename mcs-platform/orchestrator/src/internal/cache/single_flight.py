@@ -0,0 +1,36 @@
+"""Single-flight loader: concurrent callers for the same key share one load."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Deduplicate concurrent async loads by key.
+
+    第一个调用方执行加载，同一 key 上的并发调用方等待同一结果（或同一异常）。
+    """
+
+    def __init__(self):
+        """Initialize single-flight group."""
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn once for key; concurrent callers await the same result."""
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # 无等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,50 @@
+"""Process-wide versioned masterdata snapshot store."""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from mcs_contracts import MasterData
+
+
+class MasterDataSnapshotStore:
+    """Versioned, immutable MasterData snapshots shared by all graph runs in a process.
+
+    图状态只携带 masterdata_version，节点按版本从这里取快照；保留最近若干版本，
+    使主数据更新时仍在运行中的图能继续使用其开始时的版本。
+    """
+
+    def __init__(self, max_versions: int = 4):
+        """Initialize snapshot store."""
+        self.max_versions = max(1, max_versions)
+        self._snapshots: OrderedDict[int, MasterData] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version: int) -> Optional[MasterData]:
+        """Get snapshot by version."""
+        with self._lock:
+            masterdata = self._snapshots.get(version)
+            if masterdata is not None:
+                self._snapshots.move_to_end(version)
+            return masterdata
+
+    def put(self, version: int, masterdata: MasterData) -> MasterData:
+        """Store snapshot for version; an existing snapshot for the same version wins."""
+        with self._lock:
+            existing = self._snapshots.get(version)
+            if existing is not None:
+                self._snapshots.move_to_end(version)
+                return existing
+            self._snapshots[version] = masterdata
+            while len(self._snapshots) > self.max_versions:
+                self._snapshots.popitem(last=False)
+            return masterdata
+
+    def invalidate(self) -> None:
+        """Drop all snapshots."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+# 进程级共享实例（MasterDataService 按请求创建，快照需跨请求/跨运行共享）
+masterdata_snapshots = MasterDataSnapshotStore()
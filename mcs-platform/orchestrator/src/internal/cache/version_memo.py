@@ -0,0 +1,46 @@
+"""Short-TTL in-process memo of the current masterdata version."""
+
+import threading
+import time
+from typing import Optional
+
+
+class VersionMemo:
+    """Remember the current masterdata version for a short TTL.
+
+    缓存命中时无需每次查询 masterdata_version 表；本地写入后调用 invalidate，
+    其他副本的版本变更经 Redis pub/sub 调用 set 立即生效，无 Redis 时最多滞后 ttl_seconds。
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0):
+        """Initialize version memo."""
+        self.ttl_seconds = ttl_seconds
+        self._version: Optional[int] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[int]:
+        """Get memoized version, or None when missing/expired."""
+        with self._lock:
+            if self._version is None or time.monotonic() >= self._expires_at:
+                return None
+            return self._version
+
+    def set(self, version: int) -> None:
+        """Memoize version; never moves backwards while the memo is fresh."""
+        with self._lock:
+            now = time.monotonic()
+            if self._version is not None and now < self._expires_at and version < self._version:
+                return
+            self._version = version
+            self._expires_at = now + self.ttl_seconds
+
+    def invalidate(self) -> None:
+        """Force the next lookup to hit the database."""
+        with self._lock:
+            self._version = None
+            self._expires_at = 0.0
+
+
+# 进程级共享实例（MasterDataService 按请求创建）
+masterdata_version_memo = VersionMemo()
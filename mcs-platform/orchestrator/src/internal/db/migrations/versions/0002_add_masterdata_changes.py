@@ -0,0 +1,38 @@
+"""Create masterdata_changes table (per-version row change log).
+
+Revision ID: 0002_masterdata_changes
+Revises: 0001_init
+Create Date: 2026-10-17
+
+Table schema matches internal.db.models.MasterDataChange:
+fields: id (bigint), version, table_name, row_id, op, data, created_at.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002_masterdata_changes"
+down_revision: Union[str, None] = "0001_init"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "masterdata_changes",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("table_name", sa.String(length=50), nullable=False),
+        sa.Column("row_id", sa.String(length=100), nullable=False),
+        sa.Column("op", sa.String(length=10), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_masterdata_changes_version", "masterdata_changes", ["version"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_masterdata_changes_version", table_name="masterdata_changes")
+    op.drop_table("masterdata_changes")
@@ -3,7 +3,7 @@
 from datetime import datetime
 from uuid import UUID, uuid4
 
-from sqlalchemy import DateTime, Index, String, Text
+from sqlalchemy import JSON, BigInteger, DateTime, Index, String, Text
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -82,3 +82,21 @@ class MasterDataVersion(Base):
     version: Mapped[int] = mapped_column(nullable=False, unique=True, index=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     checksum: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+
+class MasterDataChange(Base):
+    """Per-version row change log used for incremental client sync."""
+
+    __tablename__ = "masterdata_changes"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    version: Mapped[int] = mapped_column(nullable=False)
+    table_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    row_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)  # upsert / delete
+    data: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_masterdata_changes_version", "version"),
+    )
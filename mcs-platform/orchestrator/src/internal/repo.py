@@ -1,16 +1,20 @@
 """Data access layer for masterdata."""
 
-from typing import Optional
+from datetime import datetime
+from typing import Any, Iterator, Optional, Sequence
 from uuid import uuid4
 
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
+from pydantic import BaseModel
+
 from mcs_contracts import Company, Contact, Customer, MasterData, Product
 from internal.db.models import Company as CompanyModel
 from internal.db.models import Contact as ContactModel
 from internal.db.models import Customer as CustomerModel
-from internal.db.models import MasterDataVersion
+from internal.db.models import MasterDataChange, MasterDataVersion
 from internal.db.models import Product as ProductModel
 
 
@@ -18,6 +22,31 @@ from internal.db.models import Product as ProductModel
 DUPLICATE_ENTRY = "DUPLICATE_ENTRY"
 DATABASE_ERROR = "DATABASE_ERROR"
 
+# 流式导出时服务端游标每批读取的行数
+_EXPORT_BATCH_SIZE = 1000
+
+# 变更日志条目：(table_name, row_id, op, data)；op 为 "upsert" 或 "delete"
+ChangeEntry = tuple[str, str, str, Optional[dict[str, Any]]]
+
+# bulk_update 每批 INSERT ... ON CONFLICT / DELETE 的行数
+_BULK_BATCH_SIZE = 1000
+
+
+def diff_rows(
+    current: dict[str, dict[str, Any]],
+    incoming: dict[str, dict[str, Any]],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]], list[str]]:
+    """Diff rows keyed by primary key.
+
+    Returns:
+        (inserts, updates, delete_ids): rows only in incoming, rows whose columns
+        changed, and primary keys only in current.
+    """
+    inserts = [row for pk, row in incoming.items() if pk not in current]
+    updates = [row for pk, row in incoming.items() if pk in current and current[pk] != row]
+    delete_ids = [pk for pk in current if pk not in incoming]
+    return inserts, updates, delete_ids
+
 
 class MasterDataRepo:
     """Repository for master data operations."""
@@ -50,6 +79,30 @@ class MasterDataRepo:
                 pass
             raise
 
+    def iter_table(self, table: str, since: Optional[datetime] = None) -> Iterator[BaseModel]:
+        """Stream one masterdata table with a server-side cursor.
+
+        Args:
+            table: "customers" | "contacts" | "companys" | "products"
+            since: only rows updated after this timestamp
+        """
+        model, to_contract = {
+            "customers": (CustomerModel, self._customer_to_contract),
+            "contacts": (ContactModel, self._contact_to_contract),
+            "companys": (CompanyModel, self._company_to_contract),
+            "products": (ProductModel, self._product_to_contract),
+        }[table]
+        stmt = select(model).execution_options(yield_per=_EXPORT_BATCH_SIZE)
+        if since is not None:
+            stmt = stmt.where(model.updated_at > since)
+        for row in self.session.scalars(stmt):
+            yield to_contract(row)
+
+    def get_version_updated_at(self, version: int) -> Optional[datetime]:
+        """Get the timestamp at which a version was created (None if unknown)."""
+        stmt = select(MasterDataVersion.updated_at).where(MasterDataVersion.version == version)
+        return self.session.scalar(stmt)
+
     def get_customer(self, customer_id: str) -> Optional[Customer]:
         """Get customer by ID."""
         customer = self.session.get(CustomerModel, customer_id)
@@ -84,8 +137,8 @@ class MasterDataRepo:
             company_id=customer.company_id,
         )
         self.session.add(db_customer)
-        self.session.commit()
-        self._increment_version()
+        self.session.flush()
+        self._increment_version([("customers", customer.customer_id, "upsert", customer.model_dump())])
         return db_customer
 
     def create_contact(self, contact: Contact) -> ContactModel:
@@ -102,8 +155,8 @@ class MasterDataRepo:
             telephone=contact.telephone,
         )
         self.session.add(db_contact)
-        self.session.commit()
-        self._increment_version()
+        self.session.flush()
+        self._increment_version([("contacts", contact.contact_id, "upsert", self._contact_row(contact))])
         return db_contact
 
     def update_customer(self, customer: Customer) -> CustomerModel:
@@ -115,8 +168,8 @@ class MasterDataRepo:
         db_customer.customer_num = customer.customer_num
         db_customer.name = customer.name
         db_customer.company_id = customer.company_id
-        self.session.commit()
-        self._increment_version()
+        self.session.flush()
+        self._increment_version([("customers", customer.customer_id, "upsert", customer.model_dump())])
         return db_customer
 
     def update_contact(self, contact: Contact) -> ContactModel:
@@ -129,35 +182,86 @@ class MasterDataRepo:
         db_contact.name = contact.name
         db_contact.customer_id = contact.customer_id
         db_contact.telephone = contact.telephone
-        self.session.commit()
-        self._increment_version()
+        self.session.flush()
+        self._increment_version([("contacts", contact.contact_id, "upsert", self._contact_row(contact))])
         return db_contact
 
-    def bulk_update(self, masterdata: MasterData) -> None:
-        """Bulk update master data."""
+    def bulk_update(self, masterdata: MasterData) -> dict[str, dict[str, int]]:
+        """Sync master data to exactly the given rows (full replace, applied as a delta).
+
+        按主键与现有数据比对，仅对新增/变更行做批量 INSERT ... ON CONFLICT DO UPDATE，
+        对缺失行做批量 DELETE；全部在一个事务内完成，且只递增一次版本（无变化则不递增）。
+
+        Returns:
+            Per-table counts: {"customers": {"inserted": n, "updated": n, "deleted": n}, ...}
+        """
+        tables = [
+            (CompanyModel, "company_id", [c.model_dump() for c in masterdata.companys]),
+            (CustomerModel, "customer_id", [c.model_dump() for c in masterdata.customers]),
+            (ContactModel, "contact_id", [self._contact_row(c) for c in masterdata.contacts]),
+            (ProductModel, "product_id", [p.model_dump() for p in masterdata.products]),
+        ]
+        stats: dict[str, dict[str, int]] = {}
         try:
-            # Clear existing data (or implement merge logic)
-            self.session.execute(select(CustomerModel)).delete()
-            self.session.execute(select(ContactModel)).delete()
-            self.session.execute(select(CompanyModel)).delete()
-            self.session.execute(select(ProductModel)).delete()
-
-            # Insert new data
-            for customer in masterdata.customers:
-                self.session.add(self._customer_to_model(customer))
-            for contact in masterdata.contacts:
-                self.session.add(self._contact_to_model(contact))
-            for company in masterdata.companys:
-                self.session.add(self._company_to_model(company))
-            for product in masterdata.products:
-                self.session.add(self._product_to_model(product))
-
+            now = datetime.utcnow()
+            plans = []
+            changes: list[ChangeEntry] = []
+            for model, pk, rows in tables:
+                columns = self._business_columns(model)
+                current = {
+                    row[pk]: row
+                    for row in (
+                        dict(r._mapping)
+                        for r in self.session.execute(select(*(getattr(model, c) for c in columns)))
+                    )
+                }
+                incoming = {row[pk]: row for row in rows}
+                inserts, updates, delete_ids = diff_rows(current, incoming)
+                plans.append((model, pk, columns, inserts + updates, delete_ids))
+                table = model.__tablename__
+                changes.extend((table, row[pk], "upsert", row) for row in inserts + updates)
+                changes.extend((table, row_id, "delete", None) for row_id in delete_ids)
+                stats[model.__tablename__] = {
+                    "inserted": len(inserts),
+                    "updated": len(updates),
+                    "deleted": len(delete_ids),
+                }
+
+            # 先删后写，避免被删除行占用的唯一键（customer_num、email）与新行冲突
+            for model, pk, _, _, delete_ids in plans:
+                key = getattr(model, pk)
+                for i in range(0, len(delete_ids), _BULK_BATCH_SIZE):
+                    self.session.execute(delete(model).where(key.in_(delete_ids[i:i + _BULK_BATCH_SIZE])))
+
+            for model, pk, columns, upserts, _ in plans:
+                for i in range(0, len(upserts), _BULK_BATCH_SIZE):
+                    batch = [
+                        {**row, "created_at": now, "updated_at": now}
+                        for row in upserts[i:i + _BULK_BATCH_SIZE]
+                    ]
+                    stmt = pg_insert(model).values(batch)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[pk],
+                        set_={
+                            **{c: stmt.excluded[c] for c in columns if c != pk},
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                    self.session.execute(stmt)
+
+            if changes:
+                self._add_version(changes)
             self.session.commit()
-            self._increment_version()
+            return stats
         except Exception as e:
             self.session.rollback()
             raise ValueError(f"{DATABASE_ERROR}: {str(e)}") from e
 
+    @staticmethod
+    def _business_columns(model) -> list[str]:
+        """Columns synced by bulk_update (excludes timestamps)."""
+        return [c.name for c in model.__table__.columns if c.name not in ("created_at", "updated_at")]
+
     def get_version(self) -> int:
         """Get current master data version."""
         try:
@@ -190,14 +294,72 @@ class MasterDataRepo:
                 )
             raise
 
-    def _increment_version(self) -> None:
-        """Increment master data version."""
+    def _increment_version(self, changes: Sequence[ChangeEntry] = ()) -> int:
+        """Increment master data version, recording its row changes, and commit."""
+        version = self._add_version(changes)
+        self.session.commit()
+        return version
+
+    def _add_version(self, changes: Sequence[ChangeEntry] = ()) -> int:
+        """Add the next version row and its change-log entries to the current transaction (caller commits)."""
         current_version = self.get_version()
         new_version = MasterDataVersion(version=current_version + 1)
         self.session.add(new_version)
+        if changes:
+            now = datetime.utcnow()
+            self.session.execute(
+                insert(MasterDataChange),
+                [
+                    {
+                        "version": new_version.version,
+                        "table_name": table_name,
+                        "row_id": row_id,
+                        "op": op,
+                        "data": data,
+                        "created_at": now,
+                    }
+                    for table_name, row_id, op, data in changes
+                ],
+            )
+        return new_version.version
+
+    def get_changes(self, since_version: int) -> list[dict[str, Any]]:
+        """Get change-log entries after since_version, in apply order."""
+        stmt = (
+            select(MasterDataChange)
+            .where(MasterDataChange.version > since_version)
+            .order_by(MasterDataChange.id)
+        )
+        return [
+            {
+                "version": change.version,
+                "table": change.table_name,
+                "id": change.row_id,
+                "op": change.op,
+                "data": change.data,
+            }
+            for change in self.session.scalars(stmt)
+        ]
+
+    def get_oldest_change_version(self) -> Optional[int]:
+        """Get the oldest version still present in the change log."""
+        return self.session.scalar(select(func.min(MasterDataChange.version)))
+
+    def prune_changes(self, keep_versions: int) -> int:
+        """Delete change-log entries older than the last keep_versions versions."""
+        cutoff = self.get_version() - keep_versions
+        if cutoff <= 0:
+            return 0
+        result = self.session.execute(delete(MasterDataChange).where(MasterDataChange.version <= cutoff))
         self.session.commit()
+        return result.rowcount or 0
 
     # Conversion helpers
+    @staticmethod
+    def _contact_row(contact: Contact) -> dict[str, Any]:
+        """Contact as a table row (email normalized like the ORM writes)."""
+        return {**contact.model_dump(), "email": contact.email.lower().strip()}
+
     def _customer_to_contract(self, db_customer: CustomerModel) -> Customer:
         """Convert database model to contract."""
         return Customer(
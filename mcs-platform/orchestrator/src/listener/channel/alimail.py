@@ -1,13 +1,17 @@
 """Alimail email listener implementation."""
 
+import asyncio
+import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Any, Optional
-from uuid import UUID, uuid4
+from pathlib import Path
+from typing import Any, Iterable, Optional
+from uuid import uuid4
 
 from listener.clients.alimail_client import AlimailClient
-from listener.channel.base import BaseListener
+from listener.channel.base import BaseListener, track_retries
 from listener.repo import ListenerRepo
 from observability.logging import get_logger
+from tools.attachment_store import FILES_BASE_DIR
 from tools.file_server import FileServerClient
 
 logger = get_logger()
@@ -27,15 +31,48 @@ class AlimailListener(BaseListener):
         file_client: Optional[FileServerClient] = None,
         repo: Optional[ListenerRepo] = None,
         allow_from: Optional[list[str]] = None,
+        attachment_concurrency: int = 4,
+        download_concurrency: int = 8,
+        load_payloads: bool = True,
+        max_pages: int = 10,
+        overlap_seconds: int = 60,
+        max_attempts: int = 5,
     ):
-        """Initialize Alimail listener."""
+        """Initialize Alimail listener.
+
+        Args:
+            attachment_concurrency: Concurrent attachment downloads per message.
+            download_concurrency: Concurrent attachment downloads across all messages.
+            load_payloads: Keep attachment content in the fetched message. When False,
+                attachments stored on disk with a file_id carry no payload (reference mode).
+            max_pages: Query pages walked per poll; the rest resumes from the saved cursor.
+            overlap_seconds: Re-query this far before the checkpoint (late indexing, clock skew).
+            max_attempts: Polls a failing message is offered in before it is dead-lettered.
+        """
         self.client = AlimailClient(client_id, client_secret, email_account, base_url)
         self.folder_id = folder_id
         self.poll_size = poll_size
-        self._last_cursor: str = ""
         self.file_client = file_client
         self.repo = repo
         self.allow_from = allow_from or []
+        self.attachment_concurrency = max(1, attachment_concurrency)
+        self.load_payloads = load_payloads
+        # 进程内所有消息共享的下载并发上限（调度器会并发 fetch 多封邮件）
+        self._download_slots = asyncio.Semaphore(max(1, download_concurrency))
+        self.max_pages = max(1, max_pages)
+        self.overlap_seconds = overlap_seconds
+        self.max_attempts = max(1, max_attempts)
+        # 增量同步检查点（_sync_folder 为其所属文件夹）、重试 / 死信消息 → 失败次数，与本轮轮询结果
+        self._sync_folder: Optional[str] = None
+        self._watermark: Optional[datetime] = None
+        self._cursor: Optional[str] = None
+        self._retry_ids: dict[str, int] = {}
+        self._dead_ids: dict[str, int] = {}
+        self._pending_high: Optional[datetime] = None
+        self._next_cursor = ""
+        self._polled: dict[str, Optional[datetime]] = {}
+        # fetch_envelope 取到的邮件详情，供随后的 fetch_message 复用（每轮轮询清空）
+        self._envelopes: dict[str, dict[str, Any]] = {}
 
     @property
     def channel_type(self) -> str:
@@ -58,39 +95,150 @@ class AlimailListener(BaseListener):
         await self.client.close()
 
     async def poll_new_messages(self, folder_id: str | None = None) -> list[str]:
-        """Poll for new messages."""
+        """Poll for new messages received since the checkpoint.
+
+        文件夹、hasAttachments:true、发件人白名单与 after:<last_received_at - overlap> 均下推到
+        服务端查询（尚无检查点时以未读邮件为基线）；每轮最多翻 max_pages 页，未翻完的游标
+        经 commit_poll 保存，下一轮从该游标继续。之前处理失败的邮件按 ID 一并重新提供；死信邮件
+        （dead_ids）在重新入队前不再提供。
+        """
         target_folder = folder_id or self.folder_id
+        if self._sync_folder != target_folder:
+            state = None
+            if self.repo:
+                state = self.repo.get_sync_state("alimail", self.client.email_account, target_folder)
+            self._sync_folder = target_folder
+            self._watermark = state.last_received_at if state else None
+            self._cursor = state.cursor if state else None
+            self._retry_ids = dict(state.retry_ids) if state and state.retry_ids else {}
+            self._dead_ids = dict(state.dead_ids) if state and state.dead_ids else {}
+            self._pending_high = None
+
+        start_time = None
+        if self._watermark is not None:
+            start_time = _format_utc(self._watermark - timedelta(seconds=self.overlap_seconds))
+
         message_ids = []
-        cursor = ""
-        
+        self._polled = {}
+        self._envelopes = {}
+        cursor = self._cursor or ""
+        pages = 0
         while True:
             response = await self.client.query_messages(
                 folder_id=target_folder,
-                is_read=False,
+                is_read=False if self._watermark is None else None,
+                has_attachments=True,
+                from_emails=self.allow_from or None,
+                start_time=start_time,
                 cursor=cursor,
                 size=self.poll_size,
-                from_email='leon.zhao@smartcore-cloud.com'
             )
-            
-            messages = response.get("messages", [])
-            for msg in messages:
+
+            for msg in response.get("messages", []):
                 # Use 'id' as message_id (Alimail API returns 'id' field)
-                message_ids.append(msg.get("id", ""))
-            
+                message_id = msg.get("id", "")
+                if message_id and message_id not in self._dead_ids:
+                    message_ids.append(message_id)
+                    self._polled[message_id] = _parse_utc(msg.get("receivedDateTime"))
+
+            pages += 1
             has_more = response.get("hasMore", False)
             cursor = response.get("nextCursor", "")
-            
             if not has_more or not cursor:
+                cursor = ""
                 break
-        
+            if pages >= self.max_pages:
+                break
+
+        self._next_cursor = cursor
+        for message_id in self._retry_ids:
+            if message_id not in self._polled:
+                # 接收时间不参与检查点（已在之前的查询中计入）
+                message_ids.append(message_id)
+                self._polled[message_id] = None
         return message_ids
 
+    async def commit_poll(self, failed_ids: list[str], deferred_ids: Iterable[str] = ()) -> None:
+        """Advance the received-time checkpoint (or save the page cursor) after a poll.
+
+        查询翻完时检查点推进到本次查询的最晚接收时间（此前一直保留未读过滤）；没翻完时保持
+        查询起点并保存游标。失败的邮件记入重试列表单独重试，不回退检查点也不丢弃游标；失败
+        max_attempts 次后转入死信，经 ListenerRepo.requeue_dead_messages 重新入队。
+        """
+        if self._sync_folder is None:
+            return
+        polled, self._polled = self._polled, {}
+        track_retries(
+            self._retry_ids,
+            polled,
+            failed_ids,
+            self.max_attempts,
+            deferred=deferred_ids,
+            dead=self._dead_ids,
+            folder=self._sync_folder,
+        )
+        # 本次查询（含之前轮次已翻过的页）见到的接收时间
+        seen = [received for received in polled.values() if received is not None]
+        if self._pending_high is not None:
+            seen.append(self._pending_high)
+
+        if self._next_cursor:
+            self._cursor = self._next_cursor
+            self._pending_high = max(seen, default=None)
+        else:
+            if self._watermark is not None:
+                seen.append(self._watermark)
+            self._watermark = max(seen, default=None)
+            self._cursor = None
+            self._pending_high = None
+
+        if self.repo:
+            # 重新入队的死信回到重试列表，重新计数
+            account = self.client.email_account
+            requeued = self.repo.take_requeued_messages("alimail", account, self._sync_folder)
+            for message_id in requeued:
+                if self._dead_ids.pop(message_id, None) is not None:
+                    self._retry_ids[message_id] = 0
+            self.repo.save_sync_state(
+                "alimail",
+                account,
+                self._sync_folder,
+                last_received_at=self._watermark,
+                cursor=self._cursor,
+                retry_ids=dict(self._retry_ids),
+                dead_ids=dict(self._dead_ids),
+            )
+
+    async def fetch_envelope(self, message_id: str) -> dict[str, Any]:
+        """Fetch message details without downloading attachments."""
+        message = await self._get_message(message_id)
+        self._envelopes[message_id] = message
+        return {
+            **self._message_fields(message_id, message),
+            "has_attachments": bool(message.get("hasAttachments", False)),
+        }
+
     async def fetch_message(self, message_id: str) -> dict[str, Any]:
         """Fetch message content."""
-        # Get message details
+        # Get message details (reuse the envelope fetched in this poll)
+        message = self._envelopes.pop(message_id, None) or await self._get_message(message_id)
+        fields = self._message_fields(message_id, message)
+
+        # Get attachments if exists
+        attachments = []
+        if message.get("hasAttachments", False):
+            # Get message_id for file directory (use mailId if available, otherwise use message_id)
+            file_message_id = message.get("mailId") or message_id
+            attachments = await self._fetch_attachments(message_id, file_message_id)
+
+        return {**fields, "attachments": attachments}
+
+    async def _get_message(self, message_id: str) -> dict[str, Any]:
         message = await self.client.get_message(message_id)
+        return message['message'] if 'message' in message else message
 
-        message = message['message'] if 'message' in message else message
+    def _message_fields(self, message_id: str, message: dict[str, Any]) -> dict[str, Any]:
+        """Convert Alimail message details to the unified format (without attachments)."""
         # Convert Alimail format to unified format
         from_email = ""
         if message.get("from"):
@@ -139,76 +287,6 @@ class AlimailListener(BaseListener):
                 # If parsing fails, use as-is
                 pass
         
-        # Get attachments if exists
-        attachments = []
-        if message.get("hasAttachments", False):
-            attachment_list = await self.client.list_attachments(message_id)
-            # Get message_id for file directory (use mailId if available, otherwise use message_id)
-            file_message_id = message.get("mailId") or message_id
-            
-            for att in attachment_list:
-                attachment_id = att.get("id", "")
-                if attachment_id:
-                    try:
-                        # Download attachment
-                        payload = await self.client.download_attachment(message_id, attachment_id)
-                        
-                        # Validate file stream
-                        if not payload or len(payload) == 0:
-                            # Skip empty attachments
-                            continue
-                        
-                        filename = att.get("name", "")
-                        content_type = att.get("contentType", "application/octet-stream")
-                        
-                        # Save file if file_client is available
-                        file_id: Optional[UUID] = None
-                        if self.file_client:
-                            try:
-                                # Save file to public/files/{message_id}/
-                                base_dir = "public/files"
-                                file_path = await self.file_client.save_file(
-                                    file_bytes=payload,
-                                    filename=filename,
-                                    base_dir=base_dir,
-                                    sub_dir=file_message_id,
-                                )
-                                
-                                # Save to database if repo is available
-                                if self.repo:
-                                    file_id = uuid4()
-                                    self.repo.create_attachment_file(
-                                        file_id=file_id,
-                                        message_id=file_message_id,
-                                        file_path=file_path,
-                                    )
-                            except Exception as e:
-                                logger.error(
-                                    "Failed to save attachment",
-                                    extra={
-                                        "filename": filename,
-                                        "message_id": file_message_id,
-                                    },
-                                    exc_info=True,
-                                )
-                        
-                        attachments.append({
-                            "filename": filename,
-                            "content_type": content_type,
-                            "payload": payload,
-                            "file_id": str(file_id) if file_id else None,
-                        })
-                    except Exception as e:
-                        logger.error(
-                            "Failed to download attachment",
-                            extra={
-                                "attachment_name": att.get("name", "unknown"),
-                                "attachment_id": attachment_id,
-                                "message_id": message_id,
-                            },
-                            exc_info=True,
-                        )
-        
         # Return unified format (same as EmailListener.fetch_message)
         return {
             "uid": message_id,  # Use message_id as uid
@@ -219,14 +297,133 @@ class AlimailListener(BaseListener):
             "subject": message.get("subject", ""),
             "body": body_text,
             "body_html": body_html,  # Include HTML body for alimail
-            "attachments": attachments,
             "provider": "alimail",
             "account": self.client.email_account,
             "received_at": received_at,
         }
 
+    async def _fetch_attachments(self, message_id: str, file_message_id: str) -> list[dict[str, Any]]:
+        """Download all attachments of a message concurrently and record them in one batch.
+
+        每封邮件最多 attachment_concurrency 个、全进程最多 download_concurrency 个下载同时进行；
+        有 file_client 时内容按块流式写入 blob，不经内存缓冲。
+        """
+        attachment_list = await self.client.list_attachments(message_id)
+        per_message = asyncio.Semaphore(self.attachment_concurrency)
+
+        async def _download(att: dict[str, Any]) -> Optional[dict[str, Any]]:
+            # 固定先取单封、再取全局信号量，避免交叉持有
+            async with per_message, self._download_slots:
+                return await self._download_attachment(message_id, att)
+
+        results = await asyncio.gather(
+            *(_download(att) for att in attachment_list if att.get("id", ""))
+        )
+        attachments = [att for att in results if att is not None]
+
+        # 一次事务写入该邮件的全部附件记录
+        stored = [att for att in attachments if att["blob_path"]]
+        if self.repo and stored:
+            records = []
+            for att in stored:
+                file_id = uuid4()
+                att["file_id"] = str(file_id)
+                records.append(
+                    {
+                        "file_id": file_id,
+                        "message_id": file_message_id,
+                        "file_path": att["blob_path"],
+                        "sha256": att["sha256"],
+                        "filename": att["filename"],
+                        "content_type": att["content_type"],
+                        "size": att["size"],
+                    }
+                )
+            try:
+                self.repo.create_attachment_files(records)
+            except Exception:
+                self.repo.session.rollback()
+                for att in stored:
+                    att["file_id"] = None
+                logger.error(
+                    "Failed to save attachment records",
+                    extra={"message_id": file_message_id},
+                    exc_info=True,
+                )
+
+        # 没有 file_id 可引用（或要求内嵌内容）时从 blob 读回内容
+        for att in attachments:
+            blob_path = att.pop("blob_path")
+            if att["payload"] is None and (self.load_payloads or not att["file_id"]):
+                att["payload"] = await asyncio.to_thread((Path(FILES_BASE_DIR) / blob_path).read_bytes)
+
+        return attachments
+
+    async def _download_attachment(self, message_id: str, att: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """Download one attachment; stream it into a blob when a file_client is configured."""
+        attachment_id = att.get("id", "")
+        filename = att.get("name", "")
+        content_type = att.get("contentType", "application/octet-stream")
+        try:
+            payload: Optional[bytes] = None
+            blob_path: Optional[str] = None
+            if self.file_client:
+                # 按 sha256 存到 public/files/blobs/，相同内容的附件只存一份
+                async with self.client.stream_attachment(message_id, attachment_id) as response:
+                    blob_path, sha256, size = await self.file_client.save_blob_stream(
+                        response.aiter_bytes(), FILES_BASE_DIR
+                    )
+            else:
+                payload = await self.client.download_attachment(message_id, attachment_id)
+                sha256 = hashlib.sha256(payload).hexdigest() if payload else ""
+                size = len(payload) if payload else 0
+        except Exception:
+            logger.error(
+                "Failed to download attachment",
+                extra={
+                    "attachment_name": att.get("name", "unknown"),
+                    "attachment_id": attachment_id,
+                    "message_id": message_id,
+                },
+                exc_info=True,
+            )
+            return None
+
+        # Skip empty attachments
+        if size == 0:
+            return None
+
+        return {
+            "filename": filename,
+            "content_type": content_type,
+            "payload": payload,
+            "sha256": sha256,
+            "size": size,
+            "file_id": None,
+            # 内部字段（blob 相对路径），返回前移除
+            "blob_path": blob_path,
+        }
+
     async def mark_as_processed(self, message_id: str) -> None:
         """Mark message as processed."""
         # Alimail API doesn't have a direct "mark as read" endpoint
         # This is handled by the scheduler through database records
         pass
+
+
+def _parse_utc(value: Optional[str]) -> Optional[datetime]:
+    """Parse an Alimail ISO 8601 timestamp into naive UTC (as stored in the listener DB)."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _format_utc(value: datetime) -> str:
+    """Format naive UTC as the ISO 8601 form used in queryStr time filters."""
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -1,7 +1,13 @@
 """Base listener interface for communication channels."""
 
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Iterable, TypeVar
+
+from observability.logging import get_logger
+
+logger = get_logger()
+
+K = TypeVar("K")
 
 
 class BaseListener(ABC):
@@ -27,11 +33,35 @@ class BaseListener(ABC):
         """Fetch message content by ID."""
         pass
 
+    async def fetch_envelope(self, message_id: str) -> dict[str, Any]:
+        """Fetch the metadata used to filter a message before downloading its content.
+
+        Returns the cheap fetch_message fields (uid, message_id, from, received_at,
+        provider, account, ...) plus has_attachments.
+
+        Default implementation fetches the whole message; its result also carries
+        "attachments", so callers use it as is instead of calling fetch_message again.
+        Listeners with a cheaper metadata call override this.
+        """
+        message = await self.fetch_message(message_id)
+        return {**message, "has_attachments": bool(message.get("attachments"))}
+
     @abstractmethod
     async def mark_as_processed(self, message_id: str) -> None:
         """Mark message as processed."""
         pass
 
+    async def commit_poll(self, failed_ids: list[str], deferred_ids: Iterable[str] = ()) -> None:
+        """Record that the last poll was handled (failed_ids / deferred_ids are offered again).
+
+        deferred_ids failed only because a dependency was unavailable (open circuit, transport
+        error) and do not count as an attempt.
+
+        Default implementation does nothing; listeners with an incremental sync
+        checkpoint advance it here.
+        """
+        pass
+
     @property
     @abstractmethod
     def channel_type(self) -> str:
@@ -53,3 +83,39 @@ class BaseListener(ABC):
         """
         # Default: allow all (backward compatible)
         return True
+
+
+def track_retries(
+    retries: dict[K, int],
+    polled: Iterable[K],
+    failed: Iterable[K],
+    max_attempts: int,
+    *,
+    dead: dict[K, int],
+    deferred: Iterable[K] = (),
+    **log_extra: Any,
+) -> None:
+    """Update a listener's retry list (message id -> failed attempts) after a poll.
+
+    Handled ids leave the list; failed ids count one more attempt, deferred ids stay without
+    one. Once an id reaches max_attempts it moves to dead (kept until requeued) so one bad
+    message is not retried forever.
+    """
+    failed = set(failed)
+    deferred = set(deferred) - failed
+    for message_id in polled:
+        if message_id not in failed and message_id not in deferred:
+            retries.pop(message_id, None)
+    for message_id in deferred:
+        retries.setdefault(message_id, 0)
+    for message_id in failed:
+        attempts = retries.get(message_id, 0) + 1
+        if attempts >= max_attempts:
+            retries.pop(message_id, None)
+            dead[message_id] = attempts
+            logger.error(
+                "Message moved to dead letter after repeated failures",
+                extra={"message_id": str(message_id), "attempts": attempts, **log_extra},
+            )
+        else:
+            retries[message_id] = attempts
@@ -1,15 +1,50 @@
 """Email listener implementation."""
 
+import asyncio
+import contextlib
 import email
 import email.utils
 import imaplib
-from typing import Any, Optional
+import re
+import selectors
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
 
-from listener.channel.base import BaseListener
+from listener.channel.base import BaseListener, track_retries
+from listener.clients.imap_fetch import (
+    BodyPart,
+    decode_part,
+    parse_fetch_response,
+    uid_set,
+    walk_bodystructure,
+)
+from listener.repo import ListenerRepo
+from observability.logging import get_logger
+
+logger = get_logger()
+
+T = TypeVar("T")
+
+# IDLE 期间表示有新邮件的未经请求响应
+_NEW_MAIL_RE = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
 
 
 class EmailListener(BaseListener):
-    """Email listener for IMAP/Exchange/POP3."""
+    """Email listener for IMAP/Exchange/POP3.
+
+    IMAP 会话长期保持：所有 imaplib 调用在同一个专用线程上串行执行（imaplib 非线程安全），
+    不阻塞事件循环；会话断开时自动重连并重试一次。服务器支持 IDLE 时，wait_for_changes
+    在新邮件到达后立即返回，否则退化为按 poll_interval 轮询。
+
+    增量同步按 UID：检查点（UIDVALIDITY + 已轮询到的最大 UID）保存在 listener 库，每次只取
+    之后的新 UID；处理失败的 UID 记入重试列表，之后的轮询单独重试，不阻挡检查点；失败
+    max_attempts 次后转入死信列表（dead_ids），经 ListenerRepo.requeue_dead_messages 重新
+    入队。先批量 UID FETCH 头部与 BODYSTRUCTURE（fetch_envelope 直接由此给出），再按封只
+    下载正文与 PDF 附件分段。
+    """
 
     def __init__(
         self,
@@ -22,8 +57,21 @@ class EmailListener(BaseListener):
         exchange_client_id: str = "",
         exchange_client_secret: str = "",
         allow_from: Optional[list[str]] = None,
+        folder: str = "INBOX",
+        timeout: float = 30.0,
+        repo: Optional[ListenerRepo] = None,
+        fetch_batch_size: int = 200,
+        max_attempts: int = 5,
     ):
-        """Initialize email listener."""
+        """Initialize email listener.
+
+        Args:
+            folder: Mailbox to watch.
+            timeout: Socket timeout for IMAP commands (seconds).
+            repo: Listener repo persisting the UID checkpoint (in memory only when omitted).
+            fetch_batch_size: UIDs per BODYSTRUCTURE/header UID FETCH.
+            max_attempts: Polls a failing UID is offered in before it moves to the dead letter list.
+        """
         self.provider = provider
         self.host = host
         self.port = port
@@ -34,6 +82,26 @@ class EmailListener(BaseListener):
         self.exchange_client_secret = exchange_client_secret
         self.connection: Optional[imaplib.IMAP4_SSL] = None
         self.allow_from = allow_from or []
+        self.folder = folder
+        self.timeout = timeout
+        self.supports_idle = False
+        self._selected: Optional[str] = None
+        self._idling = False
+        # 并发的 _run 同时发现会话断开时只重连一次，不留下多余的 IMAP 会话
+        self._connect_lock = asyncio.Lock()
+        self.repo = repo
+        self.fetch_batch_size = max(1, fetch_batch_size)
+        self.max_attempts = max(1, max_attempts)
+        # UID 检查点（_sync_folder 为其所属文件夹）、待重试 / 死信 UID → 已失败次数，与本轮轮询结果
+        self._sync_folder: Optional[str] = None
+        self._uid_validity: Optional[int] = None
+        self._last_uid: Optional[int] = None
+        self._retry_uids: dict[int, int] = {}
+        self._dead_uids: dict[int, int] = {}
+        self._poll_high = 0
+        self._polled_uids: list[int] = []
+        self._structures: dict[str, tuple[bytes, list[BodyPart]]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imap")
 
     @property
     def channel_type(self) -> str:
@@ -53,11 +121,17 @@ class EmailListener(BaseListener):
         Note: For Alibaba Mail (imap.qiye.aliyun.com), you must use an 
         application password (三方客户端安全密码), not the regular email password.
         Get it from: 邮箱设置 → 账户与安全 → 三方客户端安全密码
+
+        已连接时直接返回（会话在多次轮询间复用）。
         """
         if self.provider == "imap":
+            if self.connection is not None:
+                return
             try:
-                self.connection = imaplib.IMAP4_SSL(self.host, self.port)
-                self.connection.login(self.user, self.password)
+                async with self._connect_lock:
+                    # 等锁期间可能已由其他协程连上
+                    if self.connection is None:
+                        await self._in_thread(self._connect_sync)
             except imaplib.IMAP4.error as e:
                 error_msg = str(e)
                 # 提供更详细的错误信息，特别是针对阿里企业邮箱
@@ -99,62 +173,342 @@ class EmailListener(BaseListener):
 
     async def disconnect(self) -> None:
         """Disconnect from email server."""
-        if self.connection:
+        connection = self.connection
+        if connection is None:
+            return
+        self.connection = None
+        self._selected = None
+        if self._idling:
+            # 打断阻塞在 IDLE 上的连接线程
             try:
-                self.connection.close()
-                self.connection.logout()
+                connection.shutdown()
             except Exception:
                 pass
-            finally:
-                self.connection = None
 
-    async def poll_new_messages(self, folder: str = "INBOX") -> list[str]:
-        """Poll for new emails."""
-        if not self.connection:
-            await self.connect()
+        def _logout() -> None:
+            try:
+                connection.close()
+                connection.logout()
+            except Exception:
+                pass
 
+        await self._in_thread(_logout)
+
+    async def poll_new_messages(self, folder: Optional[str] = None) -> list[str]:
+        """Poll for new emails (UIDs after the checkpoint; unseen mail when there is none yet)."""
         if self.provider == "imap":
-            self.connection.select(folder)
-            _, message_numbers = self.connection.search(None, "UNSEEN")
-            return message_numbers[0].split() if message_numbers[0] else []
+            folder = folder or self.folder
+            if self._sync_folder != folder:
+                state = self.repo.get_sync_state(self.provider, self.user, folder) if self.repo else None
+                self._sync_folder = folder
+                self._uid_validity = state.uid_validity if state else None
+                self._last_uid = state.last_uid if state else None
+                retry_ids = state.retry_ids if state and state.retry_ids else {}
+                self._retry_uids = {int(uid): attempts for uid, attempts in retry_ids.items()}
+                dead_ids = state.dead_ids if state and state.dead_ids else {}
+                self._dead_uids = {int(uid): attempts for uid, attempts in dead_ids.items()}
+            uids = await self._run(self._poll_uids_sync, folder)
+            return [str(uid) for uid in uids]
         else:
             raise NotImplementedError(f"Polling not implemented for provider: {self.provider}")
 
-    async def fetch_message(self, uid: str) -> dict[str, Any]:
-        """Fetch email content."""
-        if not self.connection:
-            await self.connect()
+    async def fetch_envelope(self, uid: str) -> dict[str, Any]:
+        """Header fields and has_attachments from the prefetched headers/BODYSTRUCTURE (no body content)."""
+        if self.provider == "imap":
+            headers, parts = await self._run(self._structure_sync, uid)
+            return {
+                **self._header_fields(uid, email.message_from_bytes(headers)),
+                "has_attachments": any(part.is_attachment for part in parts),
+            }
+        else:
+            raise NotImplementedError(f"Fetch not implemented for provider: {self.provider}")
 
+    async def fetch_message(self, uid: str) -> dict[str, Any]:
+        """Fetch email headers, text body and PDF attachments (other attachments as metadata only)."""
         if self.provider == "imap":
-            _, msg_data = self.connection.fetch(uid, "(RFC822)")
-            email_body = msg_data[0][1]
-            msg = email.message_from_bytes(email_body)
+            headers, parts, contents = await self._run(self._fetch_parts_sync, uid)
+            body_part, _ = _select_parts(parts)
+
+            attachments = []
+            for part in parts:
+                if not part.is_attachment:
+                    continue
+                payload = contents.get(part.section)
+                attachments.append({
+                    "filename": part.filename,
+                    "content_type": part.content_type,
+                    "payload": payload,
+                    "size": len(payload) if payload is not None else _decoded_size(part),
+                })
 
             return {
-                "uid": uid,
-                "message_id": msg.get("Message-ID", ""),
-                "from": msg.get("From", ""),
-                "to": msg.get("To", ""),
-                "subject": msg.get("Subject", ""),
-                "body": self._get_body(msg),
-                "attachments": self._get_attachments(msg),
-                "received_at": self._get_received_at(msg),
-                "provider": self.provider,
-                "account": self.user,
+                **self._header_fields(uid, email.message_from_bytes(headers)),
+                "body": _decode_text(contents.get(body_part.section), body_part) if body_part else "",
+                "attachments": attachments,
             }
         else:
             raise NotImplementedError(f"Fetch not implemented for provider: {self.provider}")
 
+    def _header_fields(self, uid: str, msg: email.message.Message) -> dict[str, Any]:
+        return {
+            "uid": uid,
+            "message_id": msg.get("Message-ID", ""),
+            "from": msg.get("From", ""),
+            "to": msg.get("To", ""),
+            "subject": msg.get("Subject", ""),
+            "received_at": self._get_received_at(msg),
+            "provider": self.provider,
+            "account": self.user,
+        }
+
+    async def commit_poll(self, failed_ids: list[str], deferred_ids: Iterable[str] = ()) -> None:
+        """Advance the UID checkpoint past the last poll; failed/deferred UIDs are retried separately."""
+        if self.provider != "imap" or self._sync_folder is None:
+            return
+        track_retries(
+            self._retry_uids,
+            self._polled_uids,
+            (int(uid) for uid in failed_ids),
+            self.max_attempts,
+            deferred=(int(uid) for uid in deferred_ids),
+            dead=self._dead_uids,
+            folder=self._sync_folder,
+        )
+        self._polled_uids = []
+        self._last_uid = max(self._poll_high, self._last_uid or 0)
+        if self.repo:
+            # 重新入队的死信 UID 回到重试列表，重新计数
+            requeued = self.repo.take_requeued_messages(self.provider, self.user, self._sync_folder)
+            for uid in requeued:
+                if self._dead_uids.pop(int(uid), None) is not None:
+                    self._retry_uids[int(uid)] = 0
+            self.repo.save_sync_state(
+                self.provider,
+                self.user,
+                self._sync_folder,
+                self._uid_validity,
+                self._last_uid,
+                retry_ids={str(uid): attempts for uid, attempts in self._retry_uids.items()},
+                dead_ids={str(uid): attempts for uid, attempts in self._dead_uids.items()},
+            )
+
     async def mark_as_processed(self, uid: str) -> None:
         """Mark email as read."""
         if not self.connection:
             return
 
         if self.provider == "imap":
-            self.connection.store(uid, "+FLAGS", "\\Seen")
+            await self._run(self._store_seen_sync, uid)
         else:
             raise NotImplementedError(f"Mark as processed not implemented for provider: {self.provider}")
 
+    async def wait_for_changes(self, timeout: float, poll_interval: float) -> bool:
+        """Wait until the mailbox may have new mail.
+
+        支持 IDLE 时在 IDLE 中等待，收到 EXISTS/RECENT 立即返回 True，超时返回 False；
+        不支持 IDLE 时等待 poll_interval 后返回 True。
+
+        Args:
+            timeout: Maximum time to stay in one IDLE command (seconds); keep it below
+                the server's ~30 minute inactivity logout.
+            poll_interval: Sleep used when the server lacks IDLE (seconds).
+        """
+        if self.provider != "imap":
+            raise NotImplementedError(f"Wait not implemented for provider: {self.provider}")
+        await self.connect()
+        if not self.supports_idle:
+            await asyncio.sleep(poll_interval)
+            return True
+        return await self._run(self._idle_sync, self.folder, timeout)
+
+    async def _in_thread(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a blocking call on the dedicated IMAP thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run an IMAP operation; reconnect and retry once if the session was dropped."""
+        for attempt in range(2):
+            await self.connect()
+            connection = self.connection
+            try:
+                return await self._in_thread(fn, connection, *args)
+            except (imaplib.IMAP4.abort, OSError):
+                # 其他协程可能已换上新会话，只断开出错的那个
+                if self.connection is connection:
+                    await self.disconnect()
+                if attempt:
+                    raise
+                logger.warning("IMAP session dropped, reconnecting", extra={"host": self.host})
+
+    def _connect_sync(self) -> None:
+        connection = imaplib.IMAP4_SSL(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.login(self.user, self.password)
+        except Exception:
+            connection.shutdown()
+            raise
+        self.connection = connection
+        self._selected = None
+        self.supports_idle = "IDLE" in connection.capabilities
+
+    def _select_sync(self, connection: imaplib.IMAP4, folder: str) -> None:
+        if self._selected != folder:
+            status, data = connection.select(folder)
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"SELECT {folder} failed: {data}")
+            self._selected = folder
+
+    def _poll_uids_sync(self, connection: imaplib.IMAP4, folder: str) -> list[int]:
+        # 每轮重新 SELECT 以获得最新的 UIDVALIDITY / UIDNEXT
+        status, data = connection.select(folder)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {folder} failed: {data}")
+        self._selected = folder
+        uid_validity = _untagged_int(connection, "UIDVALIDITY")
+        uid_next = _untagged_int(connection, "UIDNEXT")
+        self._structures.clear()
+
+        if self._last_uid is None or uid_validity != self._uid_validity:
+            # 无检查点或 UIDVALIDITY 变化（旧 UID 失效）：以当前未读邮件为基线
+            self._uid_validity = uid_validity
+            self._last_uid = None
+            self._retry_uids = {}
+            self._dead_uids = {}
+            _, data = connection.uid("SEARCH", None, "UNSEEN")
+            if uid_next is None:
+                uid_next = self._highest_uid_sync(connection) + 1
+        elif uid_next is not None and uid_next <= self._last_uid + 1:
+            # UIDNEXT 未变：没有新邮件，无需 SEARCH
+            data = [None]
+        else:
+            _, data = connection.uid("SEARCH", None, "UID", f"{self._last_uid + 1}:*")
+
+        uids = sorted(int(uid) for uid in data[0].split()) if data and data[0] else []
+        if self._last_uid is not None:
+            # "n:*" 在没有新邮件时也会返回当前最大 UID
+            uids = [uid for uid in uids if uid > self._last_uid]
+        self._poll_high = max([(uid_next or 1) - 1, self._last_uid or 0, *uids])
+        # 之前失败的 UID（均在检查点之前）与新 UID 一起重新提供
+        uids = sorted({*uids, *self._retry_uids})
+        self._polled_uids = uids
+
+        for start in range(0, len(uids), self.fetch_batch_size):
+            self._prefetch_sync(connection, uids[start:start + self.fetch_batch_size])
+        return uids
+
+    def _highest_uid_sync(self, connection: imaplib.IMAP4) -> int:
+        status, data = connection.uid("FETCH", "*", "(UID)")
+        if status != "OK":
+            return 0
+        return max((item.get("UID", 0) for item in parse_fetch_response(data)), default=0)
+
+    def _prefetch_sync(self, connection: imaplib.IMAP4, uids: list[int]) -> None:
+        """Batch UID FETCH of headers and BODYSTRUCTURE (no body content)."""
+        _, data = connection.uid("FETCH", uid_set(uids), "(UID BODYSTRUCTURE BODY.PEEK[HEADER])")
+        for item in parse_fetch_response(data):
+            if item.get("UID") is None or not item.get("BODYSTRUCTURE"):
+                continue
+            parts = list(walk_bodystructure(item["BODYSTRUCTURE"]))
+            self._structures[str(item["UID"])] = (item.get("BODY[HEADER]") or b"", parts)
+
+    def _structure_sync(self, connection: imaplib.IMAP4, uid: str) -> tuple[bytes, list[BodyPart]]:
+        self._select_sync(connection, self._selected or self.folder)
+        if uid not in self._structures:
+            self._prefetch_sync(connection, [int(uid)])
+        if uid not in self._structures:
+            raise ValueError(f"Message UID {uid} not found")
+        return self._structures[uid]
+
+    def _fetch_parts_sync(
+        self, connection: imaplib.IMAP4, uid: str
+    ) -> tuple[bytes, list[BodyPart], dict[str, bytes]]:
+        headers, parts = self._structure_sync(connection, uid)
+        self._structures.pop(uid)
+
+        body_part, pdf_parts = _select_parts(parts)
+        wanted = ([body_part] if body_part else []) + pdf_parts
+        contents: dict[str, bytes] = {}
+        if wanted:
+            # BODY.PEEK 不会隐式设置 \Seen（由 mark_as_processed 显式设置）
+            items = " ".join(f"BODY.PEEK[{part.section}]" for part in wanted)
+            _, data = connection.uid("FETCH", uid, f"({items})")
+            for item in parse_fetch_response(data):
+                for part in wanted:
+                    raw = item.get(f"BODY[{part.section}]")
+                    if raw is not None:
+                        contents[part.section] = decode_part(raw, part.encoding)
+        return headers, parts, contents
+
+    def _store_seen_sync(self, connection: imaplib.IMAP4, uid: str) -> None:
+        self._select_sync(connection, self._selected or self.folder)
+        connection.uid("STORE", uid, "+FLAGS", "(\\Seen)")
+
+    def _idle_sync(self, connection: imaplib.IMAP4, folder: str, timeout: float) -> bool:
+        """Run one IDLE command (RFC 2177) until new mail arrives or timeout elapses."""
+        self._select_sync(connection, folder)
+        with _command_tag(connection) as tag:
+            return self._idle_command(connection, tag, timeout)
+
+    def _idle_command(self, connection: imaplib.IMAP4, tag: bytes, timeout: float) -> bool:
+        connection.send(tag + b" IDLE\r\n")
+        while True:
+            line = connection.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed before IDLE")
+            if line.startswith(b"+"):
+                break
+            if line.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        self._idling = True
+        changed = False
+        deadline = time.monotonic() + timeout
+        # 在 socket 上用 selector 等待，readline 只在有数据时调用：socket 超时会让
+        # makefile 读端永久失效（cannot read from timed out object）
+        selector = selectors.DefaultSelector()
+        selector.register(connection.sock, selectors.EVENT_READ)
+        try:
+            while not changed:
+                if not self._response_pending(connection):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not selector.select(remaining):
+                        break
+                    continue
+                line = connection.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                # EXPUNGE / FETCH 等其他未经请求的响应忽略
+                changed = bool(_NEW_MAIL_RE.match(line))
+        finally:
+            selector.close()
+            self._idling = False
+
+        connection.send(b"DONE\r\n")
+        while True:
+            line = connection.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed after IDLE")
+            if line.startswith(tag + b" "):
+                if line.split()[1].upper() != b"OK":
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line.decode(errors='replace').strip()}")
+                return changed
+            if _NEW_MAIL_RE.match(line):
+                changed = True
+
+    def _response_pending(self, connection: imaplib.IMAP4) -> bool:
+        """Whether response bytes are readable now (buffered by imaplib / SSL, or on the socket)."""
+        connection.sock.settimeout(0.0)
+        try:
+            return bool(connection.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        except ValueError as e:
+            # disconnect() 已关闭连接
+            raise imaplib.IMAP4.abort("connection closed during IDLE") from e
+        finally:
+            connection.sock.settimeout(self.timeout)
+
     def _get_received_at(self, msg: email.message.Message) -> str:
         """Extract received time from the first Received header (RFC 5322)."""
         received = msg.get("Received")
@@ -170,29 +524,47 @@ class EmailListener(BaseListener):
         except (ValueError, TypeError):
             return ""
 
-    def _get_body(self, msg: email.message.Message) -> str:
-        """Extract email body."""
-        body = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                    break
-        else:
-            body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-        return body
-
-    def _get_attachments(self, msg: email.message.Message) -> list[dict[str, Any]]:
-        """Extract email attachments."""
-        attachments = []
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_disposition() == "attachment":
-                    filename = part.get_filename()
-                    if filename:
-                        attachments.append({
-                            "filename": filename,
-                            "content_type": part.get_content_type(),
-                            "payload": part.get_payload(decode=True),
-                        })
-        return attachments
+
+@contextlib.contextmanager
+def _command_tag(connection: imaplib.IMAP4) -> Iterator[bytes]:
+    """Reserve a tag for a command imaplib does not implement (IDLE).
+
+    imaplib 的私有接口只在此处使用：_new_tag 会在 tagged_commands 中登记该 tag，命令结束后
+    移除，长连接上反复 IDLE 不会让该字典无限增长。
+    """
+    tag = connection._new_tag()
+    try:
+        yield tag
+    finally:
+        connection.tagged_commands.pop(tag, None)
+
+
+def _untagged_int(connection: imaplib.IMAP4, name: str) -> Optional[int]:
+    """Read a numeric untagged SELECT response (e.g. UIDVALIDITY, UIDNEXT)."""
+    _, data = connection.response(name)
+    try:
+        return int(data[-1]) if data and data[-1] is not None else None
+    except ValueError:
+        return None
+
+
+def _select_parts(parts: list[BodyPart]) -> tuple[Optional[BodyPart], list[BodyPart]]:
+    """Pick the text body (first text/plain) and the PDF attachments to download."""
+    body_part = next(
+        (part for part in parts if part.content_type == "text/plain" and not part.is_attachment), None
+    )
+    return body_part, [part for part in parts if part.is_attachment and part.is_pdf]
+
+
+def _decode_text(content: Optional[bytes], part: BodyPart) -> str:
+    if not content:
+        return ""
+    try:
+        return content.decode(part.charset or "utf-8", errors="ignore")
+    except LookupError:
+        return content.decode("utf-8", errors="ignore")
+
+
+def _decoded_size(part: BodyPart) -> int:
+    """Approximate decoded size of a part that was not downloaded."""
+    return part.size * 3 // 4 if part.encoding == "base64" else part.size
@@ -1,6 +1,6 @@
 """WeChat Work (企业微信) listener implementation."""
 
-from typing import Any
+from typing import Any, Optional
 
 from listener.channel.base import BaseListener
 
@@ -1,8 +1,9 @@
 """Alimail REST API client."""
 
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, AsyncIterator
 from urllib.parse import urlencode
 
 import httpx
@@ -168,6 +169,47 @@ class AlimailClient:
         
         raise AlimailClientError("Unexpected error in request")
 
+    @asynccontextmanager
+    async def _stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Open a streaming request; token refresh and retries happen before any bytes are read."""
+        client = await self._get_client()
+        max_retries = 3
+        for attempt in range(max_retries):
+            token = await self.oauth_manager.get_token()
+            request = client.build_request(
+                method, url, headers={"Authorization": f"bearer {token}"}, **kwargs
+            )
+            try:
+                response = await client.send(request, stream=True)
+            except httpx.RequestError as e:
+                if attempt == max_retries - 1:
+                    raise AlimailClientError(f"Network error after {max_retries} attempts: {e}") from e
+                # Exponential backoff
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            try:
+                # Handle 401 Unauthorized (token expired)
+                if response.status_code == 401 and attempt < max_retries - 1:
+                    await self.oauth_manager.refresh_token()
+                    continue
+
+                if response.status_code >= 400:
+                    await response.aread()
+                    error_body = response.text[:500] if response.text else ""
+                    raise AlimailAPIError(
+                        f"API error: {response.status_code}",
+                        status_code=response.status_code,
+                        response_body=error_body,
+                    )
+
+                yield response
+                return
+            finally:
+                await response.aclose()
+
+        raise AlimailClientError("Unexpected error in request")
+
     async def get_access_token(self) -> str:
         """Get access token."""
         return await self.oauth_manager.get_token()
@@ -201,6 +243,7 @@ class AlimailClient:
         *,
         keyword: str | None = None,
         from_email: str | None = None,
+        from_emails: list[str] | None = None,
         folder_id: str | None = None,
         is_read: bool | None = None,
         has_attachments: bool | None = None,
@@ -221,6 +264,10 @@ class AlimailClient:
             parts.append(f"hasAttachments:{str(has_attachments).lower()}")
         if from_email:
             parts.append(f'from:"{from_email}"')
+        if from_emails:
+            # 发件人白名单下推到服务端：(from:"a" OR from:"b")
+            senders = " OR ".join(f'from:"{sender}"' for sender in from_emails)
+            parts.append(f"({senders})" if len(from_emails) > 1 else senders)
         if keyword:
             parts.append(f'"{keyword}"')
         if start_time:
@@ -235,6 +282,7 @@ class AlimailClient:
         *,
         keyword: str | None = None,
         from_email: str | None = None,
+        from_emails: list[str] | None = None,
         folder_id: str | None = None,
         is_read: bool | None = None,
         has_attachments: bool | None = None,
@@ -256,6 +304,7 @@ class AlimailClient:
                 When provided, other keyword args are ignored.
             keyword: Search keyword (subject/body).
             from_email: Filter by sender email.
+            from_emails: Filter by any of these sender emails (allow list).
             folder_id: Restrict search to this folder id.
             is_read: Filter by read state (True=read, False=unread).
             has_attachments: True=with attachments only.
@@ -273,6 +322,7 @@ class AlimailClient:
             query_str = self._build_query_str(
                 keyword=keyword,
                 from_email=from_email,
+                from_emails=from_emails,
                 folder_id=folder_id,
                 is_read=is_read,
                 has_attachments=has_attachments,
@@ -285,7 +335,7 @@ class AlimailClient:
                 "size": size,
             }
 
-        url = f"{self.base_url}/v2/users/{self.email_account}/messages/query?$select=internetMessageId"
+        url = f"{self.base_url}/v2/users/{self.email_account}/messages/query?$select=internetMessageId,receivedDateTime"
         response = await self._request("POST", url, json=payload)
         return response.json()
 
@@ -303,11 +353,23 @@ class AlimailClient:
         return data.get("attachments", [])
 
     async def download_attachment(self, message_id: str, attachment_id: str) -> bytes:
-        """Download attachment (streaming download)."""
+        """Download attachment into memory."""
         url = f"{self.base_url}/v2/users/{self.email_account}/messages/{message_id}/attachments/{attachment_id}/$value"
         response = await self._request("GET", url, retry_on_auth_error=True)
         return response.content
 
+    def stream_attachment(self, message_id: str, attachment_id: str):
+        """Stream attachment content.
+
+        Usage::
+
+            async with client.stream_attachment(message_id, attachment_id) as response:
+                async for chunk in response.aiter_bytes():
+                    ...
+        """
+        url = f"{self.base_url}/v2/users/{self.email_account}/messages/{message_id}/attachments/{attachment_id}/$value"
+        return self._stream("GET", url)
+
     async def close(self) -> None:
         """Close HTTP client."""
         if self._client:
@@ -0,0 +1,201 @@
+"""IMAP FETCH response helpers: parse BODYSTRUCTURE and pick the parts worth downloading."""
+
+import base64
+import email.utils
+import quopri
+import re
+from dataclasses import dataclass
+from email.header import decode_header, make_header
+from typing import Any, Iterable, Iterator, Optional
+
+_OPEN = object()
+_CLOSE = object()
+
+_TOKEN_RE = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|(?P<atom>[^\s()"\[]+(?:\[[^\]]*\][^\s()]*)?))'
+)
+_LITERAL_RE = re.compile(rb"\{\d+\}$")
+
+
+@dataclass
+class BodyPart:
+    """One leaf part of a message as described by BODYSTRUCTURE."""
+
+    section: str  # BODY[<section>]，如 "1"、"2.1"
+    content_type: str
+    encoding: str
+    size: int
+    charset: Optional[str] = None
+    disposition: Optional[str] = None
+    filename: Optional[str] = None
+
+    @property
+    def is_attachment(self) -> bool:
+        """Same rule as the RFC822 path: attachment disposition with a filename."""
+        return self.disposition == "attachment" and bool(self.filename)
+
+    @property
+    def is_pdf(self) -> bool:
+        """PDF attachments are the only ones the sales email graph reads."""
+        return self.content_type == "application/pdf" or (self.filename or "").lower().endswith(".pdf")
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    """Compress UIDs into an IMAP sequence set (e.g. "101:105,108")."""
+    ranges: list[str] = []
+    start = prev = None
+    for uid in sorted(set(uids)):
+        if prev is not None and uid == prev + 1:
+            prev = uid
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = uid
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def parse_fetch_response(data: list[Any]) -> list[dict[str, Any]]:
+    """Parse imaplib FETCH data into one {ITEM: value} dict per message.
+
+    Atoms become str (numbers int), quoted strings and literals bytes, NIL None,
+    parenthesized lists Python lists.
+    """
+    tokens = list(_tokenize(data))
+    results = []
+    pos = 0
+    while pos < len(tokens):
+        if tokens[pos] is _OPEN:
+            items, pos = _parse_list(tokens, pos + 1)
+            results.append(
+                {str(items[i]).upper(): items[i + 1] for i in range(0, len(items) - 1, 2)}
+            )
+        else:
+            pos += 1
+    return results
+
+
+def walk_bodystructure(body: list[Any], prefix: str = "") -> Iterator[BodyPart]:
+    """Yield the leaf parts of a BODYSTRUCTURE (attached messages are not descended into)."""
+    if body and isinstance(body[0], list):
+        index = 0
+        for child in body:
+            if not isinstance(child, list):
+                break
+            index += 1
+            yield from walk_bodystructure(child, f"{prefix}.{index}" if prefix else str(index))
+        return
+
+    content_type = f"{_text(body[0])}/{_text(body[1])}".lower()
+    params = _params(body[2])
+    # 扩展字段位置：text 多一个 lines，message/rfc822 多 envelope/body/lines
+    if content_type == "message/rfc822":
+        md5_index = 10
+    elif content_type.startswith("text/"):
+        md5_index = 8
+    else:
+        md5_index = 7
+    disposition = body[md5_index + 1] if len(body) > md5_index + 1 else None
+    disposition_type = None
+    disposition_params: dict[str, str] = {}
+    if isinstance(disposition, list) and disposition:
+        disposition_type = _text(disposition[0]).lower()
+        if len(disposition) > 1:
+            disposition_params = _params(disposition[1])
+
+    yield BodyPart(
+        section=prefix or "1",
+        content_type=content_type,
+        encoding=(_text(body[5]) or "7bit").lower(),
+        size=body[6] if isinstance(body[6], int) else 0,
+        charset=params.get("charset"),
+        disposition=disposition_type,
+        filename=disposition_params.get("filename") or params.get("name"),
+    )
+
+
+def decode_part(raw: bytes, encoding: str) -> bytes:
+    """Undo the content transfer encoding of a fetched part."""
+    if encoding == "base64":
+        return base64.b64decode(raw)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(raw)
+    return raw
+
+
+def _tokenize(data: list[Any]) -> Iterator[Any]:
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            head, literal = item
+            yield from _lex(_LITERAL_RE.sub(b"", head.rstrip()))
+            yield literal
+        else:
+            yield from _lex(item)
+
+
+def _lex(chunk: bytes) -> Iterator[Any]:
+    pos = 0
+    while pos < len(chunk):
+        match = _TOKEN_RE.match(chunk, pos)
+        if match is None or match.end() == pos:
+            break
+        pos = match.end()
+        if match.group("open"):
+            yield _OPEN
+        elif match.group("close"):
+            yield _CLOSE
+        elif match.group("quoted") is not None:
+            yield re.sub(rb"\\(.)", rb"\1", match.group("quoted"))
+        elif match.group("atom"):
+            atom = match.group("atom").decode("ascii", errors="replace")
+            if atom.upper() == "NIL":
+                yield None
+            elif atom.isdigit():
+                yield int(atom)
+            else:
+                yield atom
+
+
+def _parse_list(tokens: list[Any], pos: int) -> tuple[list[Any], int]:
+    items: list[Any] = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        if token is _CLOSE:
+            return items, pos + 1
+        if token is _OPEN:
+            child, pos = _parse_list(tokens, pos + 1)
+            items.append(child)
+            continue
+        items.append(token)
+        pos += 1
+    return items, pos
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _params(values: Any) -> dict[str, str]:
+    """Decode a body parameter list (RFC 2231 continuations/charsets, RFC 2047 words)."""
+    if not isinstance(values, list):
+        return {}
+    pairs = [("", "")] + [
+        (_text(values[i]).lower(), _text(values[i + 1])) for i in range(0, len(values) - 1, 2)
+    ]
+    decoded = {}
+    for name, value in email.utils.decode_params(pairs)[1:]:
+        value = email.utils.unquote(email.utils.collapse_rfc2231_value(value))
+        try:
+            value = str(make_header(decode_header(value)))
+        except (UnicodeDecodeError, LookupError, ValueError):
+            pass
+        decoded[name] = value
+    return decoded
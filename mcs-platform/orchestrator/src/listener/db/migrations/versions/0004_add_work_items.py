@@ -0,0 +1,47 @@
+"""Create work_items table (listener DB durable work queue).
+
+Revision ID: 0004_listener
+Revises: 0003_listener
+Create Date: 2026-10-17
+
+Table schema matches listener.db.models.WorkItem:
+fields: id (UUID), message_id, channel_type, record_id, payload, status, attempts,
+max_attempts, available_at, lease_owner, lease_expires_at, last_error, created_at, updated_at.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0004_listener"
+down_revision: Union[str, None] = "0003_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "work_items",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("message_id", sa.String(200), nullable=False),
+        sa.Column("channel_type", sa.String(50), nullable=False),
+        sa.Column("record_id", sa.String(100), nullable=True),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("available_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("lease_owner", sa.String(100), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint("channel_type", "message_id", name="uq_work_items_channel_message"),
+    )
+    op.create_index("ix_work_items_status_available", "work_items", ["status", "available_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_work_items_status_available", table_name="work_items")
+    op.drop_table("work_items")
@@ -0,0 +1,34 @@
+"""Add content-addressed blob columns to attachment_files (listener DB).
+
+Revision ID: 0005_listener
+Revises: 0004_listener
+Create Date: 2026-10-17
+
+Adds sha256, filename, content_type, size; file_path of new rows points to
+blobs/{sha[:2]}/{sha} shared by every attachment with the same content.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005_listener"
+down_revision: Union[str, None] = "0004_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("attachment_files", sa.Column("sha256", sa.String(64), nullable=True))
+    op.add_column("attachment_files", sa.Column("filename", sa.String(500), nullable=True))
+    op.add_column("attachment_files", sa.Column("content_type", sa.String(200), nullable=True))
+    op.add_column("attachment_files", sa.Column("size", sa.BigInteger(), nullable=True))
+    op.create_index("ix_attachment_files_sha256", "attachment_files", ["sha256"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attachment_files_sha256", table_name="attachment_files")
+    op.drop_column("attachment_files", "size")
+    op.drop_column("attachment_files", "content_type")
+    op.drop_column("attachment_files", "filename")
+    op.drop_column("attachment_files", "sha256")
@@ -0,0 +1,34 @@
+"""Add mailbox_sync_state table (listener DB).
+
+Revision ID: 0006_listener
+Revises: 0005_listener
+Create Date: 2026-10-17
+
+Per-folder incremental sync checkpoint: IMAP UIDVALIDITY and the last handled UID.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006_listener"
+down_revision: Union[str, None] = "0005_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mailbox_sync_state",
+        sa.Column("provider", sa.String(50), nullable=False),
+        sa.Column("account", sa.String(200), nullable=False),
+        sa.Column("folder", sa.String(200), nullable=False),
+        sa.Column("uid_validity", sa.BigInteger(), nullable=True),
+        sa.Column("last_uid", sa.BigInteger(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("provider", "account", "folder"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("mailbox_sync_state")
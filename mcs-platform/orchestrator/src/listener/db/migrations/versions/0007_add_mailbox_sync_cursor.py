@@ -0,0 +1,28 @@
+"""Add received-time watermark and query cursor to mailbox_sync_state (listener DB).
+
+Revision ID: 0007_listener
+Revises: 0006_listener
+Create Date: 2026-10-17
+
+Used by the Alimail listener: polls query messages received after last_received_at
+and resume an unfinished page walk from cursor.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0007_listener"
+down_revision: Union[str, None] = "0006_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("mailbox_sync_state", sa.Column("last_received_at", sa.DateTime(), nullable=True))
+    op.add_column("mailbox_sync_state", sa.Column("cursor", sa.String(1000), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("mailbox_sync_state", "cursor")
+    op.drop_column("mailbox_sync_state", "last_received_at")
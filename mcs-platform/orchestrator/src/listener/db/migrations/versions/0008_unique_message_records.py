@@ -0,0 +1,43 @@
+"""Make (channel_type, message_id) unique in message_records (listener DB).
+
+Revision ID: 0008_listener
+Revises: 0007_listener
+Create Date: 2026-10-17
+
+Needed by repo.resolve_message_records (bulk INSERT ... ON CONFLICT DO NOTHING).
+Existing duplicates are collapsed first: keep the processed row, else the oldest one.
+Replaces the non-unique index ix_message_records_channel_message.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0008_listener"
+down_revision: Union[str, None] = "0007_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DELETE FROM message_records a
+        USING message_records b
+        WHERE a.channel_type = b.channel_type
+          AND a.message_id = b.message_id
+          AND a.id <> b.id
+          AND (
+            (b.processed AND NOT a.processed)
+            OR (b.processed = a.processed AND (b.created_at, b.id) < (a.created_at, a.id))
+          )
+        """
+    )
+    op.drop_index("ix_message_records_channel_message", table_name="message_records")
+    op.create_unique_constraint(
+        "uq_message_records_channel_message", "message_records", ["channel_type", "message_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_message_records_channel_message", "message_records", type_="unique")
+    op.create_index("ix_message_records_channel_message", "message_records", ["channel_type", "message_id"])
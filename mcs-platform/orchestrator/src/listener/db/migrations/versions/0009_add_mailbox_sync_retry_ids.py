@@ -0,0 +1,26 @@
+"""Add retry_ids to mailbox_sync_state (listener DB).
+
+Revision ID: 0009_listener
+Revises: 0008_listener
+Create Date: 2026-10-17
+
+Failed messages are retried from this list (message id -> failed attempts) instead of
+holding the UID / received-time checkpoint back.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0009_listener"
+down_revision: Union[str, None] = "0008_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("mailbox_sync_state", sa.Column("retry_ids", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("mailbox_sync_state", "retry_ids")
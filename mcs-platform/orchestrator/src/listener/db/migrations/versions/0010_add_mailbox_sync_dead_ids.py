@@ -0,0 +1,28 @@
+"""Add dead_ids and requeue_ids to mailbox_sync_state (listener DB).
+
+Revision ID: 0010_listener
+Revises: 0009_listener
+Create Date: 2026-10-17
+
+Messages that fail max_attempts times move from retry_ids to dead_ids instead of being
+dropped; requeue_ids holds dead ids an operator asked to offer again.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0010_listener"
+down_revision: Union[str, None] = "0009_listener"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("mailbox_sync_state", sa.Column("dead_ids", sa.JSON(), nullable=True))
+    op.add_column("mailbox_sync_state", sa.Column("requeue_ids", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("mailbox_sync_state", "requeue_ids")
+    op.drop_column("mailbox_sync_state", "dead_ids")
@@ -3,7 +3,7 @@
 from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import DateTime, Index, String
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -34,24 +34,88 @@ class MessageRecord(Base):
     __table_args__ = (
         Index("ix_message_records_message_id", "message_id"),
         Index("ix_message_records_channel_type", "channel_type"),
-        Index("ix_message_records_channel_message", "channel_type", "message_id"),
+        UniqueConstraint("channel_type", "message_id", name="uq_message_records_channel_message"),
     )
 
 
 class AttachmentFile(Base):
-    """Attachment file record."""
+    """Attachment file record.
+
+    file_path 指向按 sha256 寻址的 blob（blobs/{sha[:2]}/{sha}），相同内容的附件共享同一文件；
+    旧记录仍为 {message_id}/{filename}。
+    """
 
     __tablename__ = "attachment_files"
 
     id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), primary_key=True)
     message_id: Mapped[str] = mapped_column(String(200), nullable=False, index=True)
     file_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    filename: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    content_type: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     __table_args__ = (
         Index("ix_attachment_files_message_id", "message_id"),
+        Index("ix_attachment_files_sha256", "sha256"),
     )
 
 
+class WorkItem(Base):
+    """Durable work queue item between listener and orchestrator.
+
+    status: pending -> leased -> done；失败重试回到 pending，超过 max_attempts 进入 dead（死信）。
+    Workers claim items with SELECT ... FOR UPDATE SKIP LOCKED and hold a lease until ack.
+    """
+
+    __tablename__ = "work_items"
+
+    id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), primary_key=True)
+    message_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    channel_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    record_id: Mapped[str | None] = mapped_column(String(100), nullable=True)  # message_records.id
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)  # EmailEvent.model_dump()
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("channel_type", "message_id", name="uq_work_items_channel_message"),
+        Index("ix_work_items_status_available", "status", "available_at"),
+    )
+
+
+class MailboxSyncState(Base):
+    """Incremental sync checkpoint per mailbox folder.
+
+    IMAP：UID 仅在 uid_validity 不变时有效，变化后重新建立基线；last_uid 及之前的消息均已处理。
+    Alimail：last_received_at 为已处理邮件的最晚接收时间（UTC），cursor 为未翻完的查询分页游标。
+    retry_ids：处理失败、下轮单独重试的消息 ID（IMAP 为 UID）→ 已失败次数，不阻挡检查点推进。
+    dead_ids：失败达到上限的消息 ID → 失败次数（死信），不再提供，直到重新入队。
+    requeue_ids：待重新入队的死信 ID，由 listener 在下次提交轮询时取走移回 retry_ids。
+    """
+
+    __tablename__ = "mailbox_sync_state"
+
+    provider: Mapped[str] = mapped_column(String(50), primary_key=True)
+    account: Mapped[str] = mapped_column(String(200), primary_key=True)
+    folder: Mapped[str] = mapped_column(String(200), primary_key=True)
+    uid_validity: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    last_uid: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    last_received_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    cursor: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    retry_ids: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    dead_ids: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    requeue_ids: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 # Backward compatibility alias
 EmailRecord = MessageRecord
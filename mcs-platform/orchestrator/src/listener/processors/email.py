@@ -12,6 +12,15 @@ from listener.utils import encode_special_data
 class EmailProcessor(BaseProcessor):
     """Email message processor."""
 
+    def __init__(self, inline_payloads: bool = True):
+        """Initialize email processor.
+
+        Args:
+            inline_payloads: Embed attachment content as base64. When False, attachments
+                already stored by the listener (file_id) are carried as references only.
+        """
+        self.inline_payloads = inline_payloads
+
     @property
     def channel_type(self) -> str:
         """Return channel type."""
@@ -22,21 +31,26 @@ class EmailProcessor(BaseProcessor):
         attachments = []
         for att_data in message_data.get("attachments", []):
             payload = att_data.get("payload")
-            sha256 = None
+            file_id = att_data.get("file_id")
+            sha256 = att_data.get("sha256")
             bytes_b64 = None
 
             if payload:
-                sha256 = hashlib.sha256(payload).hexdigest()
-                bytes_b64 = base64.b64encode(payload).decode()
+                sha256 = sha256 or hashlib.sha256(payload).hexdigest()
+                # 引用模式：已落盘的附件只带 file_id + sha256，节点按需从 attachment_files 读取
+                if self.inline_payloads or not file_id:
+                    bytes_b64 = base64.b64encode(payload).decode()
 
             attachments.append(
                 EmailAttachment(
                     attachment_id=att_data.get("filename", ""),
                     filename=att_data.get("filename", ""),
                     content_type=att_data.get("content_type", "application/octet-stream"),
-                    size=len(payload) if payload else 0,
+                    # 已落盘且未加载内容的附件由监听器给出 size
+                    size=len(payload) if payload else att_data.get("size", 0),
                     sha256=sha256,
                     bytes_b64=bytes_b64,
+                    file_id=file_id,
                 )
             )
 
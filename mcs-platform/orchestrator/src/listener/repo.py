@@ -1,13 +1,15 @@
 """Data access layer for listener."""
 
-from datetime import datetime
-from typing import Optional
-from uuid import UUID
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import UUID, uuid4
 
-from sqlalchemy import or_, select
+from sqlalchemy import String, and_, any_, bindparam, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from listener.db.models import AttachmentFile, MessageRecord
+from listener.db.models import AttachmentFile, MailboxSyncState, MessageRecord, WorkItem
 from listener.utils import normalize_message_id
 
 
@@ -34,12 +36,6 @@ class ListenerRepo:
         from_email: message source (email From / wechat from_userid).
         received_at: ISO timestamp from channel; stored as datetime; None if missing/invalid.
         """
-        received_dt: Optional[datetime] = None
-        if received_at:
-            try:
-                received_dt = datetime.fromisoformat(received_at.replace("Z", "+00:00"))
-            except (ValueError, TypeError):
-                pass
         canonical_id = normalize_message_id(message_id)
         record = MessageRecord(
             id=record_id,
@@ -49,7 +45,7 @@ class ListenerRepo:
             account=account,
             uid=uid,
             from_email=from_email or "",
-            received_at=received_dt,
+            received_at=_parse_received_at(received_at),
             processed=False,
         )
         self.session.add(record)
@@ -69,6 +65,85 @@ class ListenerRepo:
             stmt = stmt.where(MessageRecord.channel_type == channel_type)
         return self.session.scalar(stmt)
 
+    def resolve_message_records(
+        self, channel_type: str, messages: list[dict[str, Any]]
+    ) -> dict[str, MessageRecord]:
+        """Look up the records of one poll's messages and create the missing ones.
+
+        一次 message_id = ANY(...) 查询（同时匹配原始与去尖括号的 id）取出已有记录，
+        缺失的用一条 INSERT ... ON CONFLICT DO NOTHING 批量写入，整批只提交一次；
+        并发写入导致冲突的行再补查一次。
+
+        Args:
+            channel_type: Channel of all messages (email, wechat, ...).
+            messages: Keyword dicts with the create_message_record fields
+                (message_id, provider, account, uid, from_email, received_at).
+
+        Returns:
+            {message_id as given: MessageRecord}; callers skip records already processed.
+        """
+        if not messages:
+            return {}
+        canonical_ids = {m["message_id"]: normalize_message_id(m["message_id"]) for m in messages}
+        lookup_ids = list(set(canonical_ids) | set(canonical_ids.values()))
+
+        by_canonical: dict[str, MessageRecord] = {}
+        for record in self._find_message_records(channel_type, lookup_ids):
+            key = normalize_message_id(record.message_id)
+            # 历史数据可能同时存在原始 id 与规范 id 两条记录：优先取已处理的
+            if key not in by_canonical or (record.processed and not by_canonical[key].processed):
+                by_canonical[key] = record
+
+        rows: dict[str, dict[str, Any]] = {}
+        for message in messages:
+            canonical_id = canonical_ids[message["message_id"]]
+            if canonical_id in by_canonical or canonical_id in rows:
+                continue
+            rows[canonical_id] = {
+                "id": str(uuid4()),
+                "message_id": canonical_id,
+                "channel_type": channel_type,
+                "provider": message["provider"],
+                "account": message["account"],
+                "uid": message["uid"],
+                "from_email": message.get("from_email") or "",
+                "received_at": _parse_received_at(message.get("received_at")),
+                "processed": False,
+                "created_at": datetime.utcnow(),
+            }
+
+        try:
+            if rows:
+                stmt = (
+                    pg_insert(MessageRecord)
+                    .on_conflict_do_nothing(constraint="uq_message_records_channel_message")
+                    .returning(MessageRecord)
+                )
+                for record in self.session.scalars(stmt, list(rows.values())):
+                    by_canonical[record.message_id] = record
+                lost = [canonical_id for canonical_id in rows if canonical_id not in by_canonical]
+                if lost:
+                    for record in self._find_message_records(channel_type, lost):
+                        by_canonical[record.message_id] = record
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        return {
+            message_id: by_canonical[canonical_id]
+            for message_id, canonical_id in canonical_ids.items()
+            if canonical_id in by_canonical
+        }
+
+    def _find_message_records(self, channel_type: str, message_ids: list[str]) -> list[MessageRecord]:
+        """Fetch the records of several message_ids with a single array parameter."""
+        stmt = select(MessageRecord).where(
+            MessageRecord.channel_type == channel_type,
+            MessageRecord.message_id == any_(bindparam("message_ids", message_ids, type_=ARRAY(String))),
+        )
+        return list(self.session.scalars(stmt).all())
+
     def mark_as_processed(self, record_id: str) -> None:
         """Mark message record as processed."""
         record = self.session.get(MessageRecord, record_id)
@@ -93,13 +168,21 @@ class ListenerRepo:
         file_id: UUID,
         message_id: str,
         file_path: str,
+        sha256: Optional[str] = None,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        size: Optional[int] = None,
     ) -> AttachmentFile:
         """Create a new attachment file record.
         
         Args:
             file_id: UUID for the attachment file record.
             message_id: Email message ID.
-            file_path: Relative file path (format: {message_id}/{filename}).
+            file_path: Relative file path (blobs/{sha[:2]}/{sha}, or legacy {message_id}/{filename}).
+            sha256: SHA256 of the content.
+            filename: Original attachment filename.
+            content_type: MIME content type.
+            size: Size in bytes.
             
         Returns:
             AttachmentFile object.
@@ -108,7 +191,260 @@ class ListenerRepo:
             id=file_id,
             message_id=message_id,
             file_path=file_path,
+            sha256=sha256,
+            filename=filename,
+            content_type=content_type,
+            size=size,
         )
         self.session.add(record)
         self.session.commit()
         return record
+
+    def create_attachment_files(self, records: list[dict[str, Any]]) -> list[AttachmentFile]:
+        """Create several attachment file records in one transaction.
+
+        Args:
+            records: Keyword dicts with the create_attachment_file fields
+                (file_id, message_id, file_path, sha256, filename, content_type, size).
+
+        Returns:
+            AttachmentFile objects.
+        """
+        rows = [
+            AttachmentFile(
+                id=record["file_id"],
+                message_id=record["message_id"],
+                file_path=record["file_path"],
+                sha256=record.get("sha256"),
+                filename=record.get("filename"),
+                content_type=record.get("content_type"),
+                size=record.get("size"),
+            )
+            for record in records
+        ]
+        self.session.add_all(rows)
+        self.session.commit()
+        return rows
+
+    # ---- Durable work queue (work_items) ----
+
+    def enqueue_work(
+        self,
+        message_id: str,
+        channel_type: str,
+        payload: dict[str, Any],
+        record_id: Optional[str] = None,
+        max_attempts: int = 5,
+    ) -> bool:
+        """Enqueue a work item; no-op if the message is already queued.
+
+        Returns:
+            True if a new item was inserted, False if (channel_type, message_id) already exists.
+        """
+        now = datetime.utcnow()
+        stmt = (
+            pg_insert(WorkItem)
+            .values(
+                id=uuid4(),
+                message_id=message_id,
+                channel_type=channel_type,
+                record_id=record_id,
+                payload=payload,
+                status="pending",
+                attempts=0,
+                max_attempts=max_attempts,
+                available_at=now,
+                created_at=now,
+                updated_at=now,
+            )
+            .on_conflict_do_nothing(constraint="uq_work_items_channel_message")
+        )
+        result = self.session.execute(stmt)
+        self.session.commit()
+        return result.rowcount > 0
+
+    def claim_work(self, worker_id: str, lease_seconds: int, limit: int = 1) -> list[WorkItem]:
+        """Claim ready work items with FOR UPDATE SKIP LOCKED and lease them to worker_id.
+
+        Ready = pending and available, or leased with an expired lease (crashed worker).
+        Items whose lease expired on their last attempt go to dead instead of being reclaimed,
+        so a message that crashes or hangs the worker cannot be retried forever.
+        """
+        now = datetime.utcnow()
+        lease_expired = and_(WorkItem.status == "leased", WorkItem.lease_expires_at < now)
+        dead_stmt = (
+            update(WorkItem)
+            .where(lease_expired, WorkItem.attempts >= WorkItem.max_attempts)
+            .values(
+                status="dead",
+                lease_owner=None,
+                lease_expires_at=None,
+                last_error="lease expired",
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        stmt = (
+            select(WorkItem)
+            .where(
+                or_(
+                    and_(WorkItem.status == "pending", WorkItem.available_at <= now),
+                    and_(lease_expired, WorkItem.attempts < WorkItem.max_attempts),
+                )
+            )
+            .order_by(WorkItem.available_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        try:
+            self.session.execute(dead_stmt)
+            items = list(self.session.scalars(stmt).all())
+            for item in items:
+                item.status = "leased"
+                item.lease_owner = worker_id
+                item.lease_expires_at = now + timedelta(seconds=lease_seconds)
+                item.attempts += 1
+            self.session.commit()
+            return items
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def ack_work(self, item_id: UUID, worker_id: str) -> bool:
+        """Mark a leased item done. Returns False if the lease was lost to another worker."""
+        item = self.session.get(WorkItem, item_id)
+        if not item or item.lease_owner != worker_id or item.status != "leased":
+            return False
+        item.status = "done"
+        item.lease_expires_at = None
+        item.last_error = None
+        self.session.commit()
+        return True
+
+    def fail_work(self, item_id: UUID, worker_id: str, error: str, retry_delay_seconds: int) -> str:
+        """Record a failed attempt: back to pending with delay, or dead after max_attempts.
+
+        Returns:
+            New status ("pending"/"dead"), or "" if the lease was lost.
+        """
+        item = self.session.get(WorkItem, item_id)
+        if not item or item.lease_owner != worker_id or item.status != "leased":
+            return ""
+        item.last_error = error[:2000]
+        item.lease_owner = None
+        item.lease_expires_at = None
+        if item.attempts >= item.max_attempts:
+            item.status = "dead"
+        else:
+            item.status = "pending"
+            item.available_at = datetime.utcnow() + timedelta(seconds=retry_delay_seconds)
+        self.session.commit()
+        return item.status
+
+    def defer_work(self, item_id: UUID, worker_id: str, error: str, delay_seconds: int) -> bool:
+        """Put a leased item back to pending after delay without consuming an attempt.
+
+        用于依赖熔断期间暂存任务：不是任务本身失败，不计入 max_attempts，不会进入死信。
+        """
+        item = self.session.get(WorkItem, item_id)
+        if not item or item.lease_owner != worker_id or item.status != "leased":
+            return False
+        item.last_error = error[:2000]
+        item.lease_owner = None
+        item.lease_expires_at = None
+        item.status = "pending"
+        item.attempts = max(item.attempts - 1, 0)
+        item.available_at = datetime.utcnow() + timedelta(seconds=delay_seconds)
+        self.session.commit()
+        return True
+
+    def requeue_dead_work(self, item_id: UUID) -> bool:
+        """Move a dead-letter item back to pending with a fresh attempt budget."""
+        item = self.session.get(WorkItem, item_id)
+        if not item or item.status != "dead":
+            return False
+        item.status = "pending"
+        item.attempts = 0
+        item.available_at = datetime.utcnow()
+        self.session.commit()
+        return True
+
+    def get_sync_state(self, provider: str, account: str, folder: str) -> Optional[MailboxSyncState]:
+        """Get the incremental sync checkpoint of a mailbox folder."""
+        return self.session.get(MailboxSyncState, (provider, account, folder))
+
+    def save_sync_state(
+        self,
+        provider: str,
+        account: str,
+        folder: str,
+        uid_validity: Optional[int] = None,
+        last_uid: Optional[int] = None,
+        last_received_at: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        retry_ids: Optional[dict[str, int]] = None,
+        dead_ids: Optional[dict[str, int]] = None,
+    ) -> None:
+        """Insert or update the incremental sync checkpoint of a mailbox folder.
+
+        requeue_ids is left alone (written by requeue_dead_messages only).
+        """
+        now = datetime.utcnow()
+        fields = {
+            "uid_validity": uid_validity,
+            "last_uid": last_uid,
+            "last_received_at": last_received_at,
+            "cursor": cursor,
+            "retry_ids": retry_ids or None,
+            "dead_ids": dead_ids or None,
+            "updated_at": now,
+        }
+        stmt = pg_insert(MailboxSyncState).values(
+            provider=provider, account=account, folder=folder, **fields
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["provider", "account", "folder"],
+            set_=fields,
+        )
+        self.session.execute(stmt)
+        self.session.commit()
+
+    def requeue_dead_messages(
+        self, provider: str, account: str, folder: str, message_ids: Optional[list[str]] = None
+    ) -> list[str]:
+        """Ask the listener to offer dead-letter messages again (all when message_ids is None).
+
+        Returns:
+            The dead ids that were queued; the listener moves them back to its retry list
+            with a fresh attempt budget when it next commits a poll.
+        """
+        state = self.session.get(
+            MailboxSyncState, (provider, account, folder), with_for_update=True
+        )
+        dead_ids = state.dead_ids if state and state.dead_ids else {}
+        queued = [message_id for message_id in (message_ids or dead_ids) if message_id in dead_ids]
+        if queued:
+            state.requeue_ids = list(dict.fromkeys([*(state.requeue_ids or []), *queued]))
+        self.session.commit()
+        return queued
+
+    def take_requeued_messages(self, provider: str, account: str, folder: str) -> list[str]:
+        """Return and clear the dead ids queued by requeue_dead_messages."""
+        state = self.session.get(
+            MailboxSyncState, (provider, account, folder), with_for_update=True
+        )
+        requeued = list(state.requeue_ids or []) if state else []
+        if requeued:
+            state.requeue_ids = None
+        self.session.commit()
+        return requeued
+
+
+def _parse_received_at(received_at: Optional[str]) -> Optional[datetime]:
+    """Parse a channel ISO timestamp; None if missing/invalid."""
+    if not received_at:
+        return None
+    try:
+        return datetime.fromisoformat(received_at.replace("Z", "+00:00"))
+    except (ValueError, TypeError):
+        return None
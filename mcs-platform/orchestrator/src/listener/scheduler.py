@@ -1,18 +1,23 @@
 """Unified scheduler for all communication channels."""
 
 import asyncio
+import imaplib
+import random
 from typing import Optional
 from uuid import uuid4
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from mcs_contracts import EmailEvent
 
 from listener.channel.email import EmailListener
 from listener.channel.wechat import WeChatListener
+from listener.db.models import MessageRecord
 from listener.processors.email import EmailProcessor
 from listener.processors.wechat import WeChatProcessor
 from listener.repo import ListenerRepo
 from observability.logging import get_logger
+from observability.retry import CircuitOpenError, is_dependency_failure
 from settings import Settings
 from tools.file_server import FileServerClient
 
@@ -30,6 +35,7 @@ class UnifiedScheduler:
         self.listeners: dict[str, any] = {}
         self.processors: dict[str, any] = {}
         self._orchestration_service = None  # Will be injected by ListenerService
+        self._email_watch_task: Optional[asyncio.Task] = None
 
     def set_orchestration_service(self, orchestration_service):
         """Set orchestration service for in-process triggering."""
@@ -65,6 +71,12 @@ class UnifiedScheduler:
                     file_client=file_client,
                     repo=self.repo,
                     allow_from=email_allow_list,
+                    attachment_concurrency=self.settings.alimail_attachment_concurrency,
+                    download_concurrency=self.settings.alimail_download_concurrency,
+                    load_payloads=self.settings.attachment_payload_mode == "inline",
+                    max_pages=self.settings.alimail_max_pages_per_poll,
+                    overlap_seconds=self.settings.alimail_sync_overlap_seconds,
+                    max_attempts=self.settings.listener_max_message_attempts,
                 )
             else:
                 email_listener = EmailListener(
@@ -77,18 +89,27 @@ class UnifiedScheduler:
                     exchange_client_id=self.settings.exchange_client_id,
                     exchange_client_secret=self.settings.exchange_client_secret,
                     allow_from=email_allow_list,
+                    repo=self.repo,
+                    fetch_batch_size=self.settings.imap_fetch_batch_size,
+                    max_attempts=self.settings.listener_max_message_attempts,
                 )
             self.listeners["email"] = email_listener
-            self.processors["email"] = EmailProcessor()
-
-            # Schedule email polling
-            self.scheduler.add_job(
-                self._poll_email,
-                trigger=IntervalTrigger(seconds=self.settings.poll_interval_seconds),
-                id="poll_email",
-                replace_existing=True,
+            self.processors["email"] = EmailProcessor(
+                inline_payloads=self.settings.attachment_payload_mode == "inline"
             )
 
+            if self.settings.email_provider == "imap" and self.settings.imap_idle_enabled:
+                # 长连接 + IDLE 推送（服务器不支持 IDLE 时在同一会话上按间隔轮询）
+                self._email_watch_task = asyncio.create_task(self._watch_email())
+            else:
+                # Schedule email polling
+                self.scheduler.add_job(
+                    self._poll_email,
+                    trigger=IntervalTrigger(seconds=self.settings.poll_interval_seconds),
+                    id="poll_email",
+                    replace_existing=True,
+                )
+
         # Initialize WeChat listener
         if "wechat" in enabled:
             # Get allow list for wechat channel
@@ -115,7 +136,13 @@ class UnifiedScheduler:
         self.scheduler.start()
 
     async def _poll_email(self) -> None:
-        """Poll emails and trigger orchestrator."""
+        """Poll emails and trigger orchestrator.
+
+        Messages are processed concurrently, bounded by settings.listener_max_in_flight.
+        Each message runs envelope -> filter/dedup -> fetch -> orchestrate -> mark_as_processed in order;
+        the dedup step is one batched DB call for the whole poll.
+        The listener session is kept between polls and only dropped after a failure.
+        """
         listener = self.listeners.get("email")
         processor = self.processors.get("email")
 
@@ -123,86 +150,213 @@ class UnifiedScheduler:
             return
 
         try:
-            await listener.connect()
-            uids = await listener.poll_new_messages()
-
-            for uid in uids:
-                record_id = None
-                try:
-                    message_data = await listener.fetch_message(uid)
-                    email_event = processor.parse_to_event(message_data)
-
-                    # Check access control
-                    if not listener.is_allowed(email_event.from_email):
-                        logger.warning(
-                            "Sender not allowed",
-                            extra={
-                                "from_email": email_event.from_email,
-                                "channel": "email",
-                                "message_id": email_event.message_id,
-                            },
-                        )
-                        continue
-
-                    # Check if already processed
-                    if self.repo:
-                        existing = self.repo.find_message_by_id(
-                            email_event.message_id, channel_type="email"
-                        )
-                        if existing and existing.processed:
-                            continue
-
-                        # Create record
-                        if existing is None:
-                            record_id = str(uuid4())
-                            self.repo.create_message_record(
-                                record_id=record_id,
-                                message_id=email_event.message_id,
-                                channel_type="email",
-                                provider=email_event.provider,
-                                account=email_event.account,
-                                uid=email_event.uid,
-                                from_email=email_event.from_email,
-                                received_at=email_event.received_at,
-                            )
-                        else:
-                            record_id = existing.id
-
-                    #没有附件不进行处理
-                    if email_event.attachments is None or len(email_event.attachments) <= 0 or (existing and existing.processed):
-                        continue
-
-                    # Trigger orchestrator (in-process via OrchestrationService)
-                    if self._orchestration_service:
-                        await self._orchestration_service.run_sales_email(email_event)
-                    else:
-                        raise RuntimeError("OrchestrationService not set in scheduler")
-
-                    # Mark as processed
-                    await listener.mark_as_processed(uid)
-                    if self.repo and record_id:
-                        self.repo.mark_as_processed(record_id)
-
-                except Exception as e:
-                    logger.error(
-                        "Failed to process email",
-                        extra={
-                            "uid": uid,
-                            "message_id": email_event.message_id if "email_event" in locals() else None,
-                            "channel": "email",
-                        },
-                        exc_info=True,
-                    )
-
+            await self._poll_email_once(listener, processor)
         except Exception as e:
             logger.error(
                 "Failed to poll emails",
                 extra={"channel": "email"},
                 exc_info=True,
             )
-        finally:
             await listener.disconnect()
 
+    async def _poll_email_once(self, listener, processor) -> None:
+        """Process all new emails, then let the listener checkpoint (connection/poll errors propagate).
+
+        两阶段拉取：先并发取本轮全部邮件的信封（发件人、Message-ID、是否有附件）并过滤，
+        再用一次批量查询/插入确定哪些尚未处理；只对剩下的邮件拉取正文与附件并处理。
+        因依赖不可用（熔断、传输错误）失败的邮件作为 deferred 交给 commit_poll，不计失败次数。
+        """
+        await listener.connect()
+        uids = await listener.poll_new_messages()
+
+        semaphore = asyncio.Semaphore(max(1, self.settings.listener_max_in_flight))
+        envelopes = await asyncio.gather(
+            *(self._fetch_email_envelope(listener, processor, uid, semaphore) for uid in uids)
+        )
+
+        # Same message under several UIDs in one poll: only the first one proceeds
+        events = {}
+        for envelope in envelopes:
+            if isinstance(envelope, tuple):
+                events.setdefault(envelope[1].message_id, envelope[1])
+        records = self._resolve_email_records(list(events.values()))
+
+        async def process(uid: str, envelope) -> Optional[bool]:
+            if not isinstance(envelope, tuple):
+                return envelope
+            envelope_data, header_event = envelope
+            if events[header_event.message_id] is not header_event:
+                return True
+            return await self._process_email_uid(
+                listener,
+                processor,
+                uid,
+                envelope_data,
+                records.get(header_event.message_id),
+                semaphore,
+            )
+
+        handled = await asyncio.gather(
+            *(process(uid, envelope) for uid, envelope in zip(uids, envelopes))
+        )
+        await listener.commit_poll(
+            [uid for uid, ok in zip(uids, handled) if ok is False],
+            [uid for uid, ok in zip(uids, handled) if ok is None],
+        )
+
+    async def _fetch_email_envelope(
+        self, listener, processor, uid: str, semaphore: asyncio.Semaphore
+    ) -> tuple[dict, EmailEvent] | bool | None:
+        """Fetch the envelope of one email UID and apply the cheap filters.
+
+        Returns:
+            (envelope, EmailEvent parsed from it) if the message should be fetched;
+            True if it is skipped (sender not allowed, no attachments);
+            False if fetching failed and the message should be offered again;
+            None if a dependency was unavailable (offered again without counting an attempt).
+        """
+        async with semaphore:
+            try:
+                envelope = await listener.fetch_envelope(uid)
+                header_event = processor.parse_to_event(envelope)
+            except Exception as e:
+                logger.error(
+                    "Failed to fetch email envelope",
+                    extra={"uid": uid, "channel": "email"},
+                    exc_info=True,
+                )
+                return None if _is_transient_failure(e) else False
+
+        # Check access control
+        if not listener.is_allowed(header_event.from_email):
+            logger.warning(
+                "Sender not allowed",
+                extra={
+                    "from_email": header_event.from_email,
+                    "channel": "email",
+                    "message_id": header_event.message_id,
+                },
+            )
+            return True
+
+        #没有附件不进行处理
+        if not envelope.get("has_attachments"):
+            return True
+        return envelope, header_event
+
+    def _resolve_email_records(self, email_events: list[EmailEvent]) -> dict[str, MessageRecord]:
+        """Look up / create the message records of one poll in a single batch."""
+        if not self.repo or not email_events:
+            return {}
+        return self.repo.resolve_message_records(
+            "email",
+            [
+                {
+                    "message_id": email_event.message_id,
+                    "provider": email_event.provider,
+                    "account": email_event.account,
+                    "uid": email_event.uid,
+                    "from_email": email_event.from_email,
+                    "received_at": email_event.received_at,
+                }
+                for email_event in email_events
+            ],
+        )
+
+    async def _watch_email(self) -> None:
+        """Process new emails as soon as the server signals them, reconnecting with backoff.
+
+        每轮先处理全部未读邮件，再在 IDLE 中等待下一封（IDLE 超时也会补一次轮询）；
+        连接或轮询失败时断开会话，按指数退避（带抖动）重连。
+        """
+        listener = self.listeners["email"]
+        processor = self.processors["email"]
+        delay = 1.0
+        while True:
+            try:
+                await self._poll_email_once(listener, processor)
+                delay = 1.0
+                await listener.wait_for_changes(
+                    timeout=self.settings.imap_idle_timeout_seconds,
+                    poll_interval=self.settings.poll_interval_seconds,
+                )
+            except Exception:
+                logger.error(
+                    "Email watch failed, reconnecting",
+                    extra={"channel": "email", "retry_in_seconds": delay},
+                    exc_info=True,
+                )
+                await listener.disconnect()
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, self.settings.imap_reconnect_max_seconds)
+
+    async def _process_email_uid(
+        self,
+        listener,
+        processor,
+        uid: str,
+        envelope: dict,
+        record: Optional[MessageRecord],
+        semaphore: asyncio.Semaphore,
+    ) -> Optional[bool]:
+        """Fetch and process one email UID that passed the envelope filters (a _poll_email worker slot).
+
+        Returns:
+            False if processing failed and the message should be offered again;
+            None if a dependency was unavailable (offered again without counting an attempt).
+        """
+        # Already processed
+        if record is not None and record.processed:
+            return True
+        record_id = record.id if record is not None else None
+
+        async with semaphore:
+            email_event = None
+            try:
+                # 默认实现的信封已是完整邮件，无需再次拉取
+                message_data = envelope if "attachments" in envelope else await listener.fetch_message(uid)
+                email_event = processor.parse_to_event(message_data)
+
+                #没有附件不进行处理
+                if not email_event.attachments:
+                    return True
+
+                # Durable queue mode: hand off to orchestration workers, which mark the record processed
+                if self.settings.work_queue_enabled and self.repo:
+                    self.repo.enqueue_work(
+                        message_id=email_event.message_id,
+                        channel_type="email",
+                        payload=email_event.model_dump(mode="json"),
+                        record_id=record_id,
+                        max_attempts=self.settings.work_queue_max_attempts,
+                    )
+                    await listener.mark_as_processed(uid)
+                    return True
+
+                # Trigger orchestrator (in-process via OrchestrationService)
+                if self._orchestration_service:
+                    await self._orchestration_service.run_sales_email(email_event)
+                else:
+                    raise RuntimeError("OrchestrationService not set in scheduler")
+
+                # Mark as processed
+                await listener.mark_as_processed(uid)
+                if self.repo and record_id:
+                    self.repo.mark_as_processed(record_id)
+                return True
+
+            except Exception as e:
+                logger.error(
+                    "Failed to process email",
+                    extra={
+                        "uid": uid,
+                        "message_id": email_event.message_id if email_event else None,
+                        "channel": "email",
+                    },
+                    exc_info=True,
+                )
+                return None if _is_transient_failure(e) else False
+
     async def _poll_wechat(self) -> None:
         """Poll WeChat messages and trigger orchestrator."""
         listener = self.listeners.get("wechat")
@@ -291,8 +445,23 @@ class UnifiedScheduler:
         if self.scheduler:
             self.scheduler.shutdown()
 
+        if self._email_watch_task:
+            self._email_watch_task.cancel()
+            try:
+                await self._email_watch_task
+            except asyncio.CancelledError:
+                pass
+            self._email_watch_task = None
+
         for listener in self.listeners.values():
             await listener.disconnect()
 
         self.listeners.clear()
         self.processors.clear()
+
+
+def _is_transient_failure(error: Exception) -> bool:
+    """Whether a message failed only because a dependency was unavailable (open circuit, transport)."""
+    if isinstance(error, (CircuitOpenError, imaplib.IMAP4.abort, OSError)):
+        return True
+    return is_dependency_failure(error)
@@ -0,0 +1,133 @@
+"""Orchestration workers consuming the durable work queue (work_items)."""
+
+import asyncio
+import math
+import os
+import random
+import socket
+from typing import Callable, Optional
+
+from mcs_contracts import EmailEvent
+from listener.repo import ListenerRepo
+from observability.logging import get_logger
+from observability.retry import CircuitOpenError
+from settings import Settings
+
+logger = get_logger()
+
+# 重试退避上限（秒）
+_MAX_RETRY_DELAY_SECONDS = 3600
+
+
+class OrchestrationWorkerPool:
+    """N workers that claim queued EmailEvents and run them through OrchestrationService.
+
+    每个 worker 独占一个 ListenerRepo（独立 DB session），通过 SKIP LOCKED 领取任务并持有租约；
+    进程崩溃后租约过期，任务会被其他 worker/节点重新领取。
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        repo_factory: Callable[[], ListenerRepo],
+        orchestration_service,
+    ):
+        """Initialize worker pool."""
+        self.settings = settings
+        self.repo_factory = repo_factory
+        self.orchestration_service = orchestration_service
+        self._tasks: list[asyncio.Task] = []
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Start worker tasks."""
+        if self._tasks:
+            return
+        self._stopping = asyncio.Event()
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(max(1, self.settings.work_queue_workers)):
+            worker_id = f"{host}:{index}"
+            self._tasks.append(asyncio.create_task(self._run(worker_id), name=f"work-queue-{index}"))
+        logger.info("Work queue workers started", extra={"workers": len(self._tasks)})
+
+    async def stop(self) -> None:
+        """Stop worker tasks; in-flight items keep their lease and are reclaimed after expiry."""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, worker_id: str) -> None:
+        """Worker loop: claim -> run -> ack/fail; sleep when the queue is empty."""
+        repo = self.repo_factory()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    items = repo.claim_work(worker_id, self.settings.work_queue_lease_seconds)
+                except Exception:
+                    logger.error("Failed to claim work", extra={"worker_id": worker_id}, exc_info=True)
+                    items = []
+
+                if not items:
+                    try:
+                        await asyncio.wait_for(
+                            self._stopping.wait(), timeout=self.settings.work_queue_idle_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                for item in items:
+                    await self._process(repo, worker_id, item)
+        finally:
+            repo.session.close()
+
+    async def _process(self, repo: ListenerRepo, worker_id: str, item) -> None:
+        """Run one work item and record the outcome."""
+        try:
+            email_event = EmailEvent.model_validate(item.payload)
+            await self.orchestration_service.run_sales_email(email_event)
+        except CircuitOpenError as e:
+            # 依赖熔断：任务暂存到熔断预计恢复之后（加抖动避免同时涌回），不消耗重试次数
+            delay = math.ceil(e.retry_in_seconds) + random.randint(1, 10)
+            repo.defer_work(item.id, worker_id, f"{type(e).__name__}: {e}", delay)
+            logger.warning(
+                "Work item parked while dependency circuit is open",
+                extra={
+                    "work_item_id": str(item.id),
+                    "message_id": item.message_id,
+                    "circuit": e.name,
+                    "retry_in_seconds": delay,
+                },
+            )
+            return
+        except Exception as e:
+            delay = min(
+                self.settings.work_queue_retry_base_seconds * 2 ** max(item.attempts - 1, 0),
+                _MAX_RETRY_DELAY_SECONDS,
+            )
+            status = repo.fail_work(item.id, worker_id, f"{type(e).__name__}: {e}", delay)
+            log = logger.error if status == "dead" else logger.warning
+            log(
+                "Work item moved to dead letter" if status == "dead" else "Work item failed, will retry",
+                extra={
+                    "work_item_id": str(item.id),
+                    "message_id": item.message_id,
+                    "attempts": item.attempts,
+                    "retry_in_seconds": delay if status == "pending" else None,
+                },
+                exc_info=True,
+            )
+            return
+
+        if repo.ack_work(item.id, worker_id):
+            if item.record_id:
+                repo.mark_as_processed(item.record_id)
+        else:
+            logger.warning(
+                "Work item lease lost before ack",
+                extra={"work_item_id": str(item.id), "message_id": item.message_id},
+            )
@@ -1,6 +1,6 @@
 """Prometheus metrics."""
 
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 # Orchestrator metrics
 orchestrator_runs_total = Counter(
@@ -29,6 +29,83 @@ dify_calls_total = Counter(
     ["app_key", "status"],
 )
 
+dify_result_cache_total = Counter(
+    "dify_result_cache_total",
+    "Dify result cache lookups",
+    ["app", "result"],  # result: hit / miss
+)
+
+dify_stream_chunk_seconds = Histogram(
+    "dify_stream_chunk_seconds",
+    "Latency between Dify streaming answer chunks in seconds",
+    ["app_key", "chunk"],  # chunk: first（首个分片，相对请求发起）/ next
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+)
+
+dify_stream_early_stops_total = Counter(
+    "dify_stream_early_stops_total",
+    "Dify streaming calls closed as soon as a complete JSON answer arrived",
+    ["app_key"],
+)
+
+# File server metrics
+file_upload_dedup_total = Counter(
+    "file_upload_dedup_total",
+    "File server uploads resolved through the sha256 index",
+    ["result"],  # result: hit（复用已上传 file_url）/ miss
+)
+
+file_upload_bytes_total = Counter(
+    "file_upload_bytes_total",
+    "Bytes of file content streamed to the file server",
+)
+
+file_upload_duration_seconds = Histogram(
+    "file_upload_duration_seconds",
+    "File server upload duration in seconds (including retries)",
+    ["status"],
+    buckets=[0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0],
+)
+
+# Outbound rate limit metrics (observability.rate_limit)
+outbound_rate_limit_rate = Gauge(
+    "outbound_rate_limit_rate",
+    "Current adaptive rate limit in requests per second",
+    ["target"],
+)
+
+outbound_rate_limit_wait_seconds = Histogram(
+    "outbound_rate_limit_wait_seconds",
+    "Time spent queued in the outbound rate limiter",
+    ["target"],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0],
+)
+
+outbound_in_flight = Gauge(
+    "outbound_in_flight",
+    "Outbound requests currently in flight",
+    ["target"],
+)
+
+outbound_throttled_total = Counter(
+    "outbound_throttled_total",
+    "Outbound responses signalling overload (429/503)",
+    ["target"],
+)
+
+# Circuit breaker metrics (observability.retry.CircuitBreaker)
+circuit_breaker_state = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0=closed, 1=half_open, 2=open)",
+    ["name"],
+)
+
+circuit_breaker_rejections_total = Counter(
+    "circuit_breaker_rejections_total",
+    "Calls rejected because the circuit was open",
+    ["name"],
+)
+
 # ERP metrics
 erp_calls_total = Counter(
     "erp_calls_total",
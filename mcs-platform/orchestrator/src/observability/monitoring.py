@@ -7,6 +7,7 @@ from prometheus_client import generate_latest
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from observability.retry import circuit_breakers
 from settings import Settings
 
 
@@ -40,6 +41,9 @@ async def check_health(settings: Settings, db_session: Session) -> dict[str, Any
         except Exception as e:
             health_status["checks"]["dify"] = f"error: {str(e)}"
 
+    # Circuit breakers (open = dependency failing fast)
+    health_status["checks"]["circuits"] = circuit_breakers.states()
+
     return health_status
 
 
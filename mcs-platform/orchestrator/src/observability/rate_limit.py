@@ -0,0 +1,199 @@
+"""Adaptive (AIMD token bucket) rate limiter for outbound calls."""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+import redis.asyncio as redis
+from redis.asyncio import Redis
+
+from observability.logging import get_logger
+from observability.metrics import (
+    outbound_in_flight,
+    outbound_rate_limit_rate,
+    outbound_rate_limit_wait_seconds,
+    outbound_throttled_total,
+)
+
+logger = get_logger()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate adapts with AIMD, plus an in-flight cap.
+
+    调用方先按到达顺序（FIFO）获取并发槽位，再排队领取令牌，保证公平；成功响应使速率
+    线性增加，429/503 使速率减半并按 Retry-After 暂停整个桶（同一拥塞窗口内只减一次）。
+    配置 redis_url 后，每秒请求数与 Retry-After 暂停在各进程间共享（Redis 不可用时退化为进程内限流）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 5.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        max_in_flight: int = 8,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+        redis_url: Optional[str] = None,
+        redis_key: Optional[str] = None,
+    ):
+        """Initialize limiter.
+
+        Args:
+            name: Metrics label (e.g. truncated app key)
+            rate: Initial rate in requests per second
+            min_rate: Lower bound for the adaptive rate
+            max_rate: Upper bound for the adaptive rate (also the bucket burst size)
+            max_in_flight: Maximum concurrent requests
+            increase: Rate added per successful response
+            decrease: Factor applied to the rate on throttling
+            redis_url: Share the budget across processes through Redis
+            redis_key: Redis key prefix (defaults to name)
+        """
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.max_in_flight = max(1, max_in_flight)
+        self.increase = increase
+        self.decrease = decrease
+        self.redis_url = redis_url
+        self.redis_key = f"ratelimit:{redis_key or name}"
+        self._burst = max(1.0, self.max_rate)
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease_at = 0.0
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._queue = asyncio.Lock()
+        self._redis: Optional[Redis] = None
+        outbound_rate_limit_rate.labels(target=self.name).set(self.rate)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for an in-flight slot and a token; hold the slot for the duration of the call."""
+        started = time.monotonic()
+        await self._slots.acquire()
+        try:
+            await self._take_token()
+            outbound_rate_limit_wait_seconds.labels(target=self.name).observe(time.monotonic() - started)
+            outbound_in_flight.labels(target=self.name).inc()
+            try:
+                yield
+            finally:
+                outbound_in_flight.labels(target=self.name).dec()
+        finally:
+            self._slots.release()
+
+    def on_success(self) -> None:
+        """Additive increase after a successful response."""
+        self.rate = min(self.max_rate, self.rate + self.increase)
+        outbound_rate_limit_rate.labels(target=self.name).set(self.rate)
+
+    async def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease and pause the bucket after a 429/503."""
+        now = time.monotonic()
+        outbound_throttled_total.labels(target=self.name).inc()
+        # 并发请求同时收到 429 属于同一次拥塞，只减速一次
+        if now - self._last_decrease_at >= 1.0 / self.rate:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_decrease_at = now
+            outbound_rate_limit_rate.labels(target=self.name).set(self.rate)
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._blocked_until = max(self._blocked_until, now + pause)
+        self._tokens = 0.0
+
+        if self.redis_url and pause > 0:
+            client = self._get_redis()
+            try:
+                await client.set(
+                    f"{self.redis_key}:blocked", str(time.time() + pause), px=max(1, int(pause * 1000))
+                )
+            except Exception as e:
+                logger.warning(
+                    "Failed to share rate limit pause",
+                    extra={"limiter": self.name, "error": str(e), "error_type": type(e).__name__},
+                )
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def _take_token(self) -> None:
+        # 持锁等待：后到的调用方在锁上按 FIFO 排队
+        async with self._queue:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        break
+                    wait = (1.0 - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+
+            if self.redis_url:
+                await self._take_shared_token()
+
+    async def _take_shared_token(self) -> None:
+        """Respect the cross-process pause and per-second budget kept in Redis."""
+        client = self._get_redis()
+        try:
+            while True:
+                blocked = await client.get(f"{self.redis_key}:blocked")
+                if blocked is not None:
+                    wait = float(blocked) - time.time()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                        continue
+
+                now = time.time()
+                window = int(now)
+                key = f"{self.redis_key}:{window}"
+                pipe = client.pipeline()
+                pipe.incr(key)
+                pipe.expire(key, 2)
+                count, _ = await pipe.execute()
+                if count <= math.ceil(self.rate):
+                    return
+                await asyncio.sleep(window + 1 - now)
+        except Exception as e:
+            logger.warning(
+                "Shared rate limit unavailable, using local limit only",
+                extra={"limiter": self.name, "error": str(e), "error_type": type(e).__name__},
+            )
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def aclose(self) -> None:
+        """Close the Redis client if one was created."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
@@ -1,9 +1,17 @@
-"""Retry decorator with exponential backoff."""
+"""Retry decorator with exponential backoff, and circuit breaker."""
 
 import asyncio
+import contextlib
 import functools
+import threading
 import time
-from typing import Any, Callable, TypeVar
+from collections import deque
+from typing import Any, Callable, Iterator, TypeVar
+
+import httpx
+
+from observability.metrics import circuit_breaker_rejections_total, circuit_breaker_state
+from settings import Settings
 
 T = TypeVar("T")
 
@@ -13,7 +21,7 @@ def retry_with_backoff(
     backoff_factor: float = 2.0,
     retry_on: tuple[type[Exception], ...] = (Exception,),
 ):
-    """Retry decorator with exponential backoff."""
+    """Retry decorator with exponential backoff (CircuitOpenError is never retried)."""
 
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
         @functools.wraps(func)
@@ -22,6 +30,9 @@ def retry_with_backoff(
             for attempt in range(max_retries):
                 try:
                     return await func(*args, **kwargs)
+                except CircuitOpenError:
+                    # 熔断期间重试没有意义，直接交给调用方
+                    raise
                 except retry_on as e:
                     last_exception = e
                     if attempt < max_retries - 1:
@@ -37,6 +48,9 @@ def retry_with_backoff(
             for attempt in range(max_retries):
                 try:
                     return func(*args, **kwargs)
+                except CircuitOpenError:
+                    # 熔断期间重试没有意义，直接交给调用方
+                    raise
                 except retry_on as e:
                     last_exception = e
                     if attempt < max_retries - 1:
@@ -54,3 +68,220 @@ def retry_with_backoff(
 
     return decorator
 
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_in_seconds: float):
+        """Initialize error."""
+        self.name = name
+        self.retry_in_seconds = retry_in_seconds
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in_seconds:.0f}s")
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Whether an error means the dependency is unhealthy (transport errors / 5xx).
+
+    4xx 及业务错误说明依赖本身可用，不计入熔断失败率。
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker over a sliding failure-rate window.
+
+    closed：统计最近 window_seconds 内的调用，调用数达到 minimum_calls 且失败率达到
+    failure_rate_threshold 时断开；open：open_seconds 内直接抛 CircuitOpenError；
+    half_open：放行 half_open_max_calls 个探测调用，成功则闭合，失败则重新断开。
+    线程安全，同步与异步调用方可共用（with breaker.guard(): ...）。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 5,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        enabled: bool = True,
+        is_failure: Callable[[BaseException], bool] = is_dependency_failure,
+    ):
+        """Initialize circuit breaker."""
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.enabled = enabled
+        self.is_failure = is_failure
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+        self._set_state(self.CLOSED)
+
+    @property
+    def state(self) -> str:
+        """Current state (open turns into half_open once open_seconds elapsed)."""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError."""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == self.OPEN:
+                retry_in = self._opened_at + self.open_seconds - now
+            elif (
+                self._state == self.HALF_OPEN
+                and self._half_open_calls >= self.half_open_max_calls
+            ):
+                retry_in = self.open_seconds
+            else:
+                if self._state == self.HALF_OPEN:
+                    self._half_open_calls += 1
+                return
+        circuit_breaker_rejections_total.labels(name=self.name).inc()
+        raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        self._record(ok=True)
+
+    def record_failure(self) -> None:
+        """Record a failed call."""
+        self._record(ok=False)
+
+    def release(self) -> None:
+        """Give back an admitted call's half-open slot without recording an outcome."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Admit one call and record its outcome (errors are re-raised).
+
+        只有依赖真正应答（正常返回或 4xx）才记成功；取消、内层熔断及与依赖无关的错误
+        （如内容校验失败）不记任何结果，仅归还 half-open 探测名额。
+        """
+        self.before_call()
+        try:
+            yield
+        except CircuitOpenError:
+            self.release()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            elif isinstance(e, httpx.HTTPStatusError):
+                self.record_success()
+            else:
+                self.release()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def _record(self, ok: bool) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._half_open_calls = max(0, self._half_open_calls - 1)
+                if ok:
+                    self._calls.clear()
+                    self._set_state(self.CLOSED)
+                else:
+                    self._open(now)
+                return
+            if self._state == self.OPEN:
+                return
+
+            self._calls.append((now, ok))
+            while self._calls and self._calls[0][0] < now - self.window_seconds:
+                self._calls.popleft()
+            failures = sum(1 for _, call_ok in self._calls if not call_ok)
+            if (
+                len(self._calls) >= self.minimum_calls
+                and failures / len(self._calls) >= self.failure_rate_threshold
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._half_open_calls = 0
+        self._calls.clear()
+        self._set_state(self.OPEN)
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._half_open_calls = 0
+            self._set_state(self.HALF_OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        circuit_breaker_state.labels(name=self.name).set(self._STATE_VALUES[state])
+
+
+class CircuitBreakerRegistry:
+    """Process-wide circuit breakers, one per dependency name (e.g. "erp", "dify:<host>")."""
+
+    def __init__(self):
+        """Initialize registry with default breaker options."""
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._options: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, settings: Settings) -> None:
+        """Apply breaker settings to existing and future breakers."""
+        with self._lock:
+            self._options = {
+                "enabled": settings.circuit_breaker_enabled,
+                "failure_rate_threshold": settings.circuit_breaker_failure_rate,
+                "minimum_calls": settings.circuit_breaker_minimum_calls,
+                "window_seconds": settings.circuit_breaker_window_seconds,
+                "open_seconds": settings.circuit_breaker_open_seconds,
+            }
+            for breaker in self._breakers.values():
+                for key, value in self._options.items():
+                    setattr(breaker, key, value)
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Get the shared breaker for name."""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self._options)
+                self._breakers[name] = breaker
+            return breaker
+
+    def states(self) -> dict[str, str]:
+        """Current state of every breaker (for health checks)."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state for breaker in breakers}
+
+
+# 进程级共享实例
+circuit_breakers = CircuitBreakerRegistry()
@@ -1,12 +1,13 @@
 """Listener service for message listening and polling."""
 
-from typing import Optional
+from typing import Callable, Optional
 
 from mcs_contracts import EmailEvent
 from listener.processors.email import EmailProcessor
 from listener.processors.wechat import WeChatProcessor
 from listener.repo import ListenerRepo
 from listener.scheduler import UnifiedScheduler
+from listener.worker import OrchestrationWorkerPool
 from services.orchestration_service import OrchestrationService
 from settings import Settings
 
@@ -19,12 +20,18 @@ class ListenerService:
         settings: Settings,
         repo: Optional[ListenerRepo] = None,
         orchestration_service: Optional[OrchestrationService] = None,
+        repo_factory: Optional[Callable[[], ListenerRepo]] = None,
     ):
-        """Initialize listener service."""
+        """Initialize listener service.
+
+        repo_factory: creates a ListenerRepo with its own session per work queue worker.
+        """
         self.settings = settings
         self.repo = repo
         self.orchestration_service = orchestration_service
+        self.repo_factory = repo_factory
         self.scheduler: Optional[UnifiedScheduler] = None
+        self.workers: Optional[OrchestrationWorkerPool] = None
 
     async def start_scheduler(self) -> None:
         """Start scheduler for all enabled listeners."""
@@ -42,6 +49,24 @@ class ListenerService:
             await self.scheduler.stop()
             self.scheduler = None
 
+    async def start_workers(self) -> None:
+        """Start work queue workers (only when WORK_QUEUE_ENABLED)."""
+        if self.workers or not self.settings.work_queue_enabled:
+            return
+        if not self.repo_factory or not self.orchestration_service:
+            raise RuntimeError("Work queue workers need repo_factory and OrchestrationService")
+
+        self.workers = OrchestrationWorkerPool(
+            self.settings, self.repo_factory, self.orchestration_service
+        )
+        await self.workers.start()
+
+    async def stop_workers(self) -> None:
+        """Stop work queue workers."""
+        if self.workers:
+            await self.workers.stop()
+            self.workers = None
+
     async def trigger_poll(self) -> None:
         """Manually trigger polling for all enabled listeners."""
         if not self.scheduler:
@@ -80,4 +105,5 @@ class ListenerService:
             "service": "orchestrator-listener",
             "enabled_channels": self.settings.get_enabled_listeners(),
             "scheduler_running": self.scheduler is not None,
+            "work_queue_workers_running": self.workers is not None,
         }
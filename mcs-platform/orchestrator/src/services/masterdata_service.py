@@ -1,60 +1,131 @@
 """Masterdata service for master data operations."""
 
-from typing import Optional
+import asyncio
+import json
+from typing import Callable, Iterator, Optional, Sequence, TypeVar
 
 from mcs_contracts import Company, Contact, Customer, MasterData, Product
 from internal.cache.memory_cache import MemoryCache
 from internal.cache.redis_cache import RedisCache
+from internal.cache.single_flight import SingleFlight
+from internal.cache.snapshot_store import MasterDataSnapshotStore, masterdata_snapshots
+from internal.cache.version_memo import VersionMemo, masterdata_version_memo
 from internal.repo import MasterDataRepo
+from observability.logging import get_logger
 from settings import Settings
 
+logger = get_logger()
+
+T = TypeVar("T")
+
+# 进程级：同一版本的并发缓存未命中只触发一次 DB 加载
+_db_loads = SingleFlight()
+# 流式导出支持的表（MasterData 字段名）
+EXPORT_TABLES = ("customers", "contacts", "companys", "products")
+
+# 失效广播为后台任务，持有引用避免被提前回收
+_background_tasks: set[asyncio.Task] = set()
+
 
 class MasterDataService:
-    """Service for master data operations."""
+    """Service for master data operations.
+
+    读取路径：进程内 MemoryCache -> RedisCache（异步路径）-> 数据库。
+    写入后递增版本并通过 Redis pub/sub 广播，各副本收到后清理进程内缓存。
+    """
 
-    def __init__(self, repo: MasterDataRepo, settings: Optional[Settings] = None):
-        """Initialize masterdata service."""
+    def __init__(
+        self,
+        repo: MasterDataRepo,
+        settings: Optional[Settings] = None,
+        snapshots: Optional[MasterDataSnapshotStore] = None,
+        memory_cache: Optional[MemoryCache] = None,
+        redis_cache: Optional[RedisCache] = None,
+        version_memo: Optional[VersionMemo] = None,
+        repo_factory: Optional[Callable[[], MasterDataRepo]] = None,
+    ):
+        """Initialize masterdata service.
+
+        memory_cache / redis_cache 由 app lifespan 创建后在请求间共享；未传入时按 settings 新建。
+        version_memo 同样由 lifespan 按 settings 配置后共享；未传入时使用进程级默认实例。
+
+        Args:
+            repo_factory: Creates a MasterDataRepo with its own session for each DB call the
+                async path runs on a worker thread (Session is not thread-safe). Without it
+                those calls run on the event loop thread against repo.
+        """
         self.repo = repo
+        self.repo_factory = repo_factory
         self.settings = settings
-        # Initialize cache if Redis URL is provided
-        if settings and settings.redis_url and settings.redis_url != "redis://localhost:6379/0":
-            self.cache: Optional[RedisCache] = RedisCache(settings.redis_url, settings.cache_ttl_seconds)
+        self.snapshots = snapshots if snapshots is not None else masterdata_snapshots
+        self.version_memo = version_memo if version_memo is not None else masterdata_version_memo
+        ttl_seconds = settings.cache_ttl_seconds if settings else 300
+        self.cache: MemoryCache = memory_cache if memory_cache is not None else MemoryCache(ttl_seconds)
+        # Redis tier only if Redis URL is provided
+        if redis_cache is not None:
+            self.redis_cache: Optional[RedisCache] = redis_cache
+        elif settings and settings.redis_url and settings.redis_url != "redis://localhost:6379/0":
+            self.redis_cache = RedisCache(settings.redis_url, settings.cache_ttl_seconds)
         else:
-            self.cache: Optional[MemoryCache] = MemoryCache(settings.cache_ttl_seconds if settings else 300)
+            self.redis_cache = None
+        self._invalidation_task: Optional[asyncio.Task] = None
 
     def get_all(self) -> MasterData:
         """Get all master data (with caching)."""
+        return self.load_snapshot()[1]
+
+    async def get_all_async(self) -> MasterData:
+        """Get all master data via memory -> Redis -> DB."""
+        return (await self.load_snapshot_async())[1]
+
+    def _current_version(self, repo: Optional[MasterDataRepo] = None) -> int:
+        """Get current version (memoized for a short TTL), falling back to 0 if the lookup fails."""
+        version = self.version_memo.get()
+        if version is not None:
+            return version
         try:
-            version = self.repo.get_version()
+            version = (repo or self.repo).get_version()
         except Exception as e:
             # 如果获取版本失败，记录错误并尝试继续（使用版本0）
-            from observability.logging import get_logger
-            logger = get_logger()
             logger.warning(
                 "Failed to get masterdata version, using version 0",
                 extra={"error": str(e), "error_type": type(e).__name__}
             )
-            version = 0
-
-        # Try cache first
-        if isinstance(self.cache, RedisCache):
-            # Redis cache is async, but we're in sync context
-            # For now, skip Redis cache in sync context, or make this method async
-            # For simplicity, we'll use MemoryCache only in sync context
-            cached_data = None
-        else:
-            cached_data = self.cache.get_all(version) if self.cache else None
+            return 0
+        self.version_memo.set(version)
+        return version
 
-        if cached_data:
-            return cached_data
+    async def _current_version_async(self) -> int:
+        """Async _current_version; a memo hit costs no DB round-trip or thread hop."""
+        version = self.version_memo.get()
+        if version is not None:
+            return version
+        return await self._run_db(self._current_version)
 
-        # Cache miss, load from DB
+    async def _run_db(self, fn: Callable[[MasterDataRepo], T]) -> T:
+        """Run fn(repo) for the async path.
+
+        有 repo_factory 时在工作线程上使用独立的短生命周期 session，用完即关闭；
+        否则在事件循环线程上直接使用 self.repo（共享 session 不能跨线程并发使用）。
+        """
+        if self.repo_factory is None:
+            return fn(self.repo)
+
+        def _call() -> T:
+            repo = self.repo_factory()
+            try:
+                return fn(repo)
+            finally:
+                repo.session.close()
+
+        return await asyncio.to_thread(_call)
+
+    def _load_from_db(self, version: int, repo: Optional[MasterDataRepo] = None) -> MasterData:
+        """Load all master data from the database."""
         try:
-            masterdata = self.repo.get_all_masterdata()
+            return (repo or self.repo).get_all_masterdata()
         except Exception as e:
             # 如果加载失败，记录详细错误并重新抛出
-            from observability.logging import get_logger
-            logger = get_logger()
             logger.error(
                 "Failed to load masterdata from database",
                 extra={
@@ -66,15 +137,266 @@ class MasterDataService:
             )
             raise
 
-        # Update cache
-        if isinstance(self.cache, MemoryCache):
-            self.cache.set_all(masterdata, version)
+    def load_snapshot(self) -> tuple[int, MasterData]:
+        """Load current master data and register it in the snapshot store.
+
+        同步路径只使用进程内缓存（Redis 客户端为异步，见 load_snapshot_async）。
 
+        Returns:
+            (version, masterdata): graph state keeps only the version; nodes resolve
+            the data via get_snapshot(version).
+        """
+        version = self._current_version()
+
+        cached_data = self.snapshots.get(version) or self.cache.get_all(version)
+        if cached_data:
+            return version, self.snapshots.put(version, cached_data)
+
+        # Cache miss, load from DB
+        masterdata = self._load_from_db(version)
+        self.cache.set_all(masterdata, version)
+        return version, self.snapshots.put(version, masterdata)
+
+    async def load_snapshot_async(self) -> tuple[int, MasterData]:
+        """Async load_snapshot with a Redis tier and single-flight DB loading."""
+        version = await self._current_version_async()
+
+        cached_data = self.snapshots.get(version) or self.cache.get_all(version)
+        if cached_data:
+            return version, self.snapshots.put(version, cached_data)
+
+        masterdata = await _db_loads.do(version, lambda: self._load_tiered(version))
+        self.cache.set_all(masterdata, version)
+        return version, self.snapshots.put(version, masterdata)
+
+    async def _load_tiered(self, version: int) -> MasterData:
+        """Load from Redis, falling back to the DB and back-filling Redis."""
+        if self.redis_cache:
+            try:
+                cached_data = await self.redis_cache.get_all(version)
+                if cached_data:
+                    return cached_data
+            except Exception as e:
+                logger.warning(
+                    "Masterdata Redis cache read failed, falling back to DB",
+                    extra={"error": str(e), "error_type": type(e).__name__},
+                )
+
+        masterdata = await self._run_db(lambda repo: self._load_from_db(version, repo))
+
+        if self.redis_cache:
+            try:
+                await self.redis_cache.set_all(masterdata, version)
+            except Exception as e:
+                logger.warning(
+                    "Masterdata Redis cache write failed",
+                    extra={"error": str(e), "error_type": type(e).__name__},
+                )
+        return masterdata
+
+    def get_snapshot(self, version: Optional[int] = None) -> MasterData:
+        """Get master data snapshot by version (None for current).
+
+        快照已被淘汰时回退加载当前版本（运行将基于较新的主数据继续）。
+        """
+        if version is not None:
+            masterdata = self.snapshots.get(version)
+            if masterdata is not None:
+                return masterdata
+
+        current_version, masterdata = self.load_snapshot()
+        self._warn_if_evicted(version, current_version)
         return masterdata
 
-    def get_version(self) -> int:
-        """Get current master data version."""
-        return self.repo.get_version()
+    async def get_snapshot_async(self, version: Optional[int] = None) -> MasterData:
+        """Async get_snapshot (memory -> Redis -> DB on miss)."""
+        if version is not None:
+            masterdata = self.snapshots.get(version)
+            if masterdata is not None:
+                return masterdata
+
+        current_version, masterdata = await self.load_snapshot_async()
+        self._warn_if_evicted(version, current_version)
+        return masterdata
+
+    def _warn_if_evicted(self, version: Optional[int], current_version: int) -> None:
+        """Log when a run's snapshot version is no longer available."""
+        if version is not None and current_version != version:
+            logger.warning(
+                "Masterdata snapshot evicted, using current version",
+                extra={"requested_version": version, "current_version": current_version},
+            )
+
+    async def start_invalidation_listener(self) -> None:
+        """Subscribe to version bumps from other replicas (no-op without Redis)."""
+        if not self.redis_cache or self._invalidation_task:
+            return
+        self._invalidation_task = asyncio.create_task(
+            self._listen_invalidations(), name="masterdata-invalidation"
+        )
+
+    async def stop_invalidation_listener(self) -> None:
+        """Stop the invalidation subscriber and close the Redis client."""
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
+            await asyncio.gather(self._invalidation_task, return_exceptions=True)
+            self._invalidation_task = None
+        if self.redis_cache:
+            await self.redis_cache.close()
+
+    async def _listen_invalidations(self) -> None:
+        """Keep the pub/sub subscription alive, reconnecting on errors."""
+        while True:
+            try:
+                await self.redis_cache.listen_invalidations(self._on_version_bump)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "Masterdata invalidation subscription lost, retrying",
+                    extra={"error": str(e), "error_type": type(e).__name__},
+                )
+                await asyncio.sleep(5)
+
+    async def _on_version_bump(self, version: int) -> None:
+        """Drop the in-process cache when another replica bumps the version."""
+        self.version_memo.set(version)
+        self.cache.invalidate()
+        logger.info("Masterdata cache invalidated", extra={"version": version})
+
+    def _after_write(self) -> None:
+        """Invalidate local cache and broadcast the new version to other replicas."""
+        self.cache.invalidate()
+        self.version_memo.invalidate()
+        self._prune_change_log()
+        if not self.redis_cache:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        # 版本在请求内同步读取（请求结束后 session 会被关闭），广播异步进行
+        version = self._current_version()
+        task = loop.create_task(self._publish_version(version))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    def _prune_change_log(self) -> None:
+        """Trim the change log to the configured number of versions."""
+        keep_versions = self.settings.masterdata_change_log_retention_versions if self.settings else 1000
+        try:
+            self.repo.prune_changes(keep_versions)
+        except Exception as e:
+            logger.warning(
+                "Failed to prune masterdata change log",
+                extra={"error": str(e), "error_type": type(e).__name__},
+            )
+
+    async def _publish_version(self, version: int) -> None:
+        """Publish version on the invalidation channel."""
+        try:
+            await self.redis_cache.publish_invalidation(version)
+        except Exception as e:
+            logger.warning(
+                "Failed to publish masterdata invalidation",
+                extra={"error": str(e), "error_type": type(e).__name__},
+            )
+
+    def get_version(self, repo: Optional[MasterDataRepo] = None) -> int:
+        """Get current master data version (authoritative DB read; refreshes the memo)."""
+        version = (repo or self.repo).get_version()
+        self.version_memo.set(version)
+        return version
+
+    def export_ndjson(
+        self,
+        tables: Sequence[str] = EXPORT_TABLES,
+        since_version: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """Stream master data as NDJSON lines, reading tables with server-side cursors.
+
+        行格式：
+            {"type": "meta", "version": V, "since_version": S, "full": bool}
+            {"type": "row", "table": "customers", "data": {...}}   # 每行一条
+            {"type": "delete", "table": "customers", "id": "..."}  # 仅增量：该版本之后删除的行
+            {"type": "end", "version": V, "count": N}
+
+        since_version 给定且可识别时只输出该版本之后新增/变更的行，以及变更日志中之后被删除的行
+        （full=false）；版本未知或变更日志已不覆盖该版本时回退为全量（full=true）。
+        版本号在读取数据前获取，增量消费不会漏行。
+
+        流式响应在请求依赖清理之后才读取：有 repo_factory 时使用自己的 session，读完（或客户端
+        断开、生成器关闭）即关闭，不依赖请求作用域的 session。
+        """
+        if self.repo_factory is None:
+            yield from self._export_ndjson(self.repo, tables, since_version)
+            return
+        repo = self.repo_factory()
+        try:
+            yield from self._export_ndjson(repo, tables, since_version)
+        finally:
+            repo.session.close()
+
+    def _export_ndjson(
+        self,
+        repo: MasterDataRepo,
+        tables: Sequence[str],
+        since_version: Optional[int],
+    ) -> Iterator[bytes]:
+        version = self.get_version(repo)
+        since = None
+        deleted: list[tuple[str, str]] = []
+        up_to_date = since_version is not None and since_version >= version
+        if since_version is not None and not up_to_date:
+            oldest = repo.get_oldest_change_version()
+            # 变更日志不覆盖 (since_version, version] 时无法给出删除行，只能全量
+            if oldest is not None and since_version >= oldest - 1:
+                since = repo.get_version_updated_at(since_version)
+            if since is not None:
+                deleted = self._deleted_since(repo, since_version, tables)
+        full = since is None and not up_to_date
+
+        yield _ndjson_line(
+            {"type": "meta", "version": version, "since_version": since_version, "full": full}
+        )
+        count = 0
+        if not up_to_date:
+            for table in tables:
+                for row in repo.iter_table(table, since=since):
+                    count += 1
+                    yield _ndjson_line(
+                        {"type": "row", "table": table, "data": row.model_dump(mode="json")}
+                    )
+            for table, row_id in deleted:
+                count += 1
+                yield _ndjson_line({"type": "delete", "table": table, "id": row_id})
+        yield _ndjson_line({"type": "end", "version": version, "count": count})
+
+    def _deleted_since(
+        self, repo: MasterDataRepo, since_version: int, tables: Sequence[str]
+    ) -> list[tuple[str, str]]:
+        """Rows whose last change after since_version is a delete (re-created rows are kept)."""
+        last_op: dict[tuple[str, str], str] = {}
+        for change in repo.get_changes(since_version):
+            if change["table"] in tables:
+                last_op[(change["table"], change["id"])] = change["op"]
+        return [key for key, op in last_op.items() if op == "delete"]
+
+    def get_changes(self, since_version: int) -> dict:
+        """Get row changes after since_version for incremental client sync.
+
+        truncated=True 表示变更日志已不覆盖 (since_version, version]，客户端需回退全量快照。
+        """
+        version = self.get_version()
+        if since_version >= version:
+            return {"version": version, "since_version": since_version, "truncated": False, "changes": []}
+
+        oldest = self.repo.get_oldest_change_version()
+        truncated = oldest is None or since_version < oldest - 1
+        changes = [] if truncated else self.repo.get_changes(since_version)
+        # 读取版本后可能有新写入，返回的版本号以实际包含的变更为准
+        version = max([version] + [change["version"] for change in changes])
+        return {"version": version, "since_version": since_version, "truncated": truncated, "changes": changes}
 
     def get_customer(self, customer_id: str) -> Optional[Customer]:
         """Get customer by ID."""
@@ -95,33 +417,35 @@ class MasterDataService:
     def create_customer(self, customer: Customer) -> Customer:
         """Create a new customer."""
         self.repo.create_customer(customer)
-        if isinstance(self.cache, MemoryCache):
-            self.cache.invalidate()
+        self._after_write()
         return customer
 
     def create_contact(self, contact: Contact) -> Contact:
         """Create a new contact."""
         self.repo.create_contact(contact)
-        if isinstance(self.cache, MemoryCache):
-            self.cache.invalidate()
+        self._after_write()
         return contact
 
     def update_customer(self, customer: Customer) -> Customer:
         """Update an existing customer."""
         self.repo.update_customer(customer)
-        if isinstance(self.cache, MemoryCache):
-            self.cache.invalidate()
+        self._after_write()
         return customer
 
     def update_contact(self, contact: Contact) -> Contact:
         """Update an existing contact."""
         self.repo.update_contact(contact)
-        if isinstance(self.cache, MemoryCache):
-            self.cache.invalidate()
+        self._after_write()
         return contact
 
-    def bulk_update(self, masterdata: MasterData) -> None:
-        """Bulk update master data."""
-        self.repo.bulk_update(masterdata)
-        if isinstance(self.cache, MemoryCache):
-            self.cache.invalidate()
+    def bulk_update(self, masterdata: MasterData) -> dict[str, dict[str, int]]:
+        """Bulk update master data (delta sync, single version bump)."""
+        stats = self.repo.bulk_update(masterdata)
+        logger.info("Masterdata bulk update applied", extra={"stats": stats})
+        self._after_write()
+        return stats
+
+
+def _ndjson_line(record: dict) -> bytes:
+    """Encode one NDJSON record."""
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
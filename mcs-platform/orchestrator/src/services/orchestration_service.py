@@ -1,12 +1,12 @@
 """Orchestration service for sales email workflows."""
 
+from typing import Any, Optional
 from uuid import uuid4
 
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from api.schemas import ManualReviewRequest, ManualReviewResponse, ReplayRequest, RunRequest, RunResponse
-from db.checkpoint.redis_checkpoint import RedisCheckpointStore
 from db.repo import OrchestratorRepo
 from errors import (
     INVALID_DECISION,
@@ -14,7 +14,8 @@ from errors import (
     RUN_NOT_IN_MANUAL_REVIEW,
     OrchestratorError,
 )
-from graphs.sales_email.graph import build_sales_email_graph
+from graphs.registry import graph_registry
+from graphs.sales_email.graph import SALES_EMAIL_GRAPH_NAME, SalesEmailDeps, build_run_config
 from graphs.sales_email.resume import determine_resume_node, resume_from_node
 from graphs.sales_email.state import SalesEmailState
 from mcs_contracts import EmailEvent, ManualReviewSubmitResponse, OrchestratorRunResult, StatusEnum, now_iso
@@ -24,6 +25,7 @@ from services.gateway_service import GatewayService
 from services.masterdata_service import MasterDataService
 from settings import Settings
 from tools.dify_client import DifyClient
+from tools.attachment_store import AttachmentStore
 from tools.file_server import FileServerClient
 from tools.mailer import Mailer
 
@@ -43,8 +45,15 @@ class OrchestrationService:
         dify_order_client: DifyClient,
         mailer: Mailer,
         gateway_service: GatewayService,
+        checkpointer: Any,
+        attachment_store: Optional[AttachmentStore] = None,
     ):
-        """Initialize orchestration service."""
+        """Initialize orchestration service.
+
+        checkpointer: process-wide checkpointer created (and closed) by the app lifespan,
+        see db.checkpoint.factory.create_checkpointer; compiled graphs are cached against it.
+        attachment_store: resolves attachment references (file_id) when events carry no bytes.
+        """
         self.settings = settings
         self.repo = repo
         self.masterdata_service = masterdata_service
@@ -53,6 +62,29 @@ class OrchestrationService:
         self.dify_order_client = dify_order_client
         self.mailer = mailer
         self.gateway_service = gateway_service
+        if checkpointer is None:
+            # 每个实例自建 checkpointer 会泄漏 Redis 连接，并在 graph_registry 中重复编译图
+            raise ValueError("OrchestrationService requires the process-wide checkpointer")
+        self.checkpointer = checkpointer
+        self.attachment_store = attachment_store
+
+    async def _get_graph(self) -> Any:
+        """Get the process-wide compiled sales_email graph."""
+        return graph_registry.get_compiled(SALES_EMAIL_GRAPH_NAME, checkpointer=self.checkpointer)
+
+    def _graph_deps(self) -> SalesEmailDeps:
+        """Node dependencies passed to the graph through the run config."""
+        return SalesEmailDeps(
+            settings=self.settings,
+            db_repo=self.repo,
+            masterdata_service=self.masterdata_service,
+            file_server=self.file_server,
+            dify_contract_client=self.dify_contract_client,
+            dify_order_client=self.dify_order_client,
+            mailer=self.mailer,
+            gateway_service=self.gateway_service,
+            attachment_store=self.attachment_store,
+        )
 
     async def run_sales_email(self, email_event: EmailEvent | RunRequest) -> OrchestratorRunResult:
         """Run sales email orchestration."""
@@ -80,26 +112,8 @@ class OrchestrationService:
                 started_at=started_at,
             )
 
-            # Build graph（checkpoint_backend=memory 时用 MemorySaver，无需 Redis JSON；redis 时需 Redis Stack/RedisJSON）
-            if self.settings.checkpoint_backend == "memory":
-                from langgraph.checkpoint.memory import MemorySaver
-                checkpointer = MemorySaver()
-            else:
-                checkpoint_store = RedisCheckpointStore(self.settings)
-                await checkpoint_store.initialize()
-                checkpointer = checkpoint_store.get_checkpoint_saver_sync()
-
-            graph = build_sales_email_graph(
-                settings=self.settings,
-                db_repo=self.repo,
-                checkpointer=checkpointer,
-                masterdata_service=self.masterdata_service,
-                file_server=self.file_server,
-                dify_contract_client=self.dify_contract_client,
-                dify_order_client=self.dify_order_client,
-                mailer=self.mailer,
-                gateway_service=self.gateway_service,
-            )
+            # Compiled graph is shared per process; dependencies travel in the run config
+            graph = await self._get_graph()
 
             # Initialize state（run_id 写入 state，finalize 用其更新 DB，不依赖 config 传递）
             initial_state = SalesEmailState(
@@ -111,7 +125,7 @@ class OrchestrationService:
             # Run graph
             result = await graph.ainvoke(
                 initial_state.model_dump(),
-                {"configurable": {"thread_id": run_id}},
+                build_run_config(run_id, self._graph_deps()),
             )
             final_state = SalesEmailState(**result)
 
@@ -335,30 +349,12 @@ class OrchestrationService:
                 run_id=request.run_id,
             )
 
-        # RESUME action - resume from appropriate node（须与 run 时相同 checkpoint_backend）
+        # RESUME action - resume from appropriate node（须与 run 时相同 checkpointer）
         try:
-            if self.settings.checkpoint_backend == "memory":
-                from langgraph.checkpoint.memory import MemorySaver
-                checkpointer = MemorySaver()
-            else:
-                checkpoint_store = RedisCheckpointStore(self.settings)
-                await checkpoint_store.initialize()
-                checkpointer = checkpoint_store.get_checkpoint_saver_sync()
-
-            graph = build_sales_email_graph(
-                settings=self.settings,
-                db_repo=self.repo,
-                checkpointer=checkpointer,
-                masterdata_service=self.masterdata_service,
-                file_server=self.file_server,
-                dify_contract_client=self.dify_contract_client,
-                dify_order_client=self.dify_order_client,
-                mailer=self.mailer,
-                gateway_service=self.gateway_service,
-            )
+            graph = await self._get_graph()
 
             # Get current state from checkpoint
-            config = {"configurable": {"thread_id": request.run_id}}
+            config = build_run_config(request.run_id, self._graph_deps())
             current_state_dict = await graph.aget_state(config)
             if not current_state_dict or not current_state_dict.values:
                 return ManualReviewSubmitResponse(
@@ -381,7 +377,7 @@ class OrchestrationService:
             resume_node = determine_resume_node(state, patch)
 
             # Apply patch and resume
-            masterdata = self.masterdata_service.get_all()
+            masterdata = await self.masterdata_service.get_snapshot_async(state.masterdata_version)
             patched_state = await resume_from_node(state, resume_node, patch, self.repo, masterdata)
 
             # Update run status to RUNNING
@@ -36,6 +36,31 @@ class Settings(BaseSettings):
     dify_base_url: str = "https://api.dify.ai"
     dify_contract_app_key: str = ""
     dify_order_app_key: str = ""
+    # Dify HTTP 连接池（进程内按 base_url 共享，见 tools.dify_client.DifyClientRegistry）
+    dify_timeout_seconds: int = 120
+    dify_max_connections: int = 20
+    dify_max_keepalive_connections: int = 10
+    dify_keepalive_expiry_seconds: float = 30.0
+    dify_http2: bool = True  # 需安装 h2（httpx[http2]），否则回退 HTTP/1.1
+    # streaming：SSE 增量解析，答案中出现完整 JSON 对象即提前结束；blocking：等待完整答案
+    dify_response_mode: str = "streaming"
+    # Dify 出站限流（每个应用一个 AIMD 令牌桶 + 并发上限，进程内共享；429/503 时减速并遵守 Retry-After）
+    dify_rate_limit_enabled: bool = True
+    dify_rate_limit_per_second: float = 5.0  # 初始速率，随成功响应线性增长
+    dify_rate_limit_min_per_second: float = 0.2
+    dify_rate_limit_max_per_second: float = 20.0
+    dify_max_in_flight: int = 8
+    dify_rate_limit_shared: bool = False  # 通过 REDIS_URL 在多进程/多副本间共享每秒预算与 Retry-After
+    # 熔断（Dify / ERP / 文件服务各一个，进程内共享；断开期间调用直接失败，队列任务延后重试）
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_failure_rate: float = 0.5  # 窗口内失败率达到该值时断开
+    circuit_breaker_minimum_calls: int = 5  # 窗口内至少这么多次调用才判断失败率
+    circuit_breaker_window_seconds: float = 60.0
+    circuit_breaker_open_seconds: float = 30.0  # 断开后多久进入半开探测
+    # Dify 合同识别结果缓存（按 PDF sha256 + customer_id + 应用/版本 寻址，存于编排库 dify_result_cache）
+    dify_contract_cache_enabled: bool = True
+    dify_contract_cache_ttl_seconds: int = 30 * 24 * 3600
+    dify_contract_cache_version: str = "1"  # chatflow 变更时递增，使旧结果全部失效
     # Dify 专用接口配置（.env: DIFY_CONF，JSON 格式字符串）
     # 键名规则：{目录名}-{文件名}，如 sales_email-call_dify_contract
     # 值格式：{"url": "服务器域名", "path": "接口路径", "token": "访问ID"}
@@ -44,6 +69,8 @@ class Settings(BaseSettings):
     # File Server（.env: FILE_SERVER_BASE_URL, FILE_SERVER_API_KEY）
     file_server_base_url: str = "http://localhost:8001"
     file_server_api_key: str = ""
+    file_server_timeout_seconds: float = 60.0
+    file_server_max_connections: int = 10  # 进程内共享的上传连接池大小
 
     # SMTP（.env: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS）
     smtp_host: str = "smtp.example.com"
@@ -80,6 +107,11 @@ class Settings(BaseSettings):
     imap_port: int = 993
     imap_user: str = ""
     imap_pass: str = ""
+    # IMAP IDLE：支持时新邮件到达即处理（否则按 poll_interval_seconds 轮询），会话长期保持
+    imap_idle_enabled: bool = True
+    imap_idle_timeout_seconds: int = 600  # 单次 IDLE 最长时长，超时后补一次轮询再重新 IDLE
+    imap_reconnect_max_seconds: int = 300  # 断线重连指数退避上限
+    imap_fetch_batch_size: int = 200  # 每次 UID FETCH（头部 + BODYSTRUCTURE）的 UID 数
     # Exchange
     exchange_tenant_id: str = ""
     exchange_client_id: str = ""
@@ -91,21 +123,48 @@ class Settings(BaseSettings):
     alimail_api_base_url: str = "https://alimail-cn.aliyuncs.com"
     alimail_folder_id: str = "2"
     alimail_poll_size: int = 100
+    # 附件下载并发：单封邮件内 / 整个监听进程内
+    alimail_attachment_concurrency: int = 4
+    alimail_download_concurrency: int = 8
+    # 增量轮询：每轮最多翻页数（剩余页下轮按游标继续）；按接收时间检查点重查的重叠秒数
+    alimail_max_pages_per_poll: int = 10
+    alimail_sync_overlap_seconds: int = 60
     # WeChat Work（企业微信）
     wechat_corp_id: str = ""
     wechat_corp_secret: str = ""
     wechat_agent_id: str = ""
     wechat_webhook_url: str = ""
-    # Polling
+    # Polling（.env: POLL_INTERVAL_SECONDS, LISTENER_MAX_IN_FLIGHT）
     poll_interval_seconds: int = 60
+    # 单次轮询内并发处理的消息数上限（fetch + parse + 编排），1 表示串行
+    listener_max_in_flight: int = 4
+    # 处理失败的邮件在之后的轮询中单独重试，不阻挡检查点；失败这么多次后转入死信
+    # （mailbox_sync_state.dead_ids，可用 ListenerRepo.requeue_dead_messages 重新入队）；
+    # 依赖不可用（熔断、传输错误）导致的失败不计次数
+    listener_max_message_attempts: int = 5
+    # Durable work queue（.env: WORK_QUEUE_ENABLED, WORK_QUEUE_WORKERS, WORK_QUEUE_*）
+    # 启用后 _poll_email 只把 EmailEvent 写入 listener DB 的 work_items，由 worker 领取编排；
+    # 仅运行 worker 的节点可设置 ENABLED_LISTENERS= 关闭轮询
+    work_queue_enabled: bool = False
+    work_queue_workers: int = 2
+    work_queue_lease_seconds: int = 900  # 需大于单次编排最长耗时
+    work_queue_max_attempts: int = 5  # 超过后进入死信（status=dead）
+    work_queue_retry_base_seconds: int = 30  # 失败重试指数退避基数
+    work_queue_idle_seconds: float = 2.0  # 队列为空时的轮询间隔
     # Channel access control (whitelist)
     # Format: JSON string mapping channel type to list of allowed sender IDs
     # Example: '{"email": ["user@example.com"], "wechat": ["user_id"]}'
     channel_allow_from: str = "{}"  # JSON string, empty dict means allow all
 
+    # 附件在 EmailEvent 中的携带方式：reference = 已落盘附件只带 file_id + sha256（节点按需读取）；
+    # inline = 附件内容 base64 内嵌（事件、工作队列与 checkpoint 随附件大小增长）
+    attachment_payload_mode: str = "reference"
+
     # Cache（.env: REDIS_URL, CACHE_TTL_SECONDS）
     redis_url: str = "redis://localhost:6379/0"
     cache_ttl_seconds: int = 300
+    masterdata_change_log_retention_versions: int = 1000  # 变更日志保留的版本数，超出后客户端需全量同步
+    masterdata_version_ttl_seconds: float = 5.0  # 主数据版本号进程内缓存时长（秒），0 表示每次查询
 
     # Checkpoint（.env: CHECKPOINT_BACKEND）
     # redis = 使用 Redis（需 Redis Stack / RedisJSON 模块，否则会报 unknown command JSON.SET）
@@ -0,0 +1,45 @@
+"""Attachment store: resolve attachment references to content saved by the listener."""
+
+from pathlib import Path
+from typing import Callable
+from uuid import UUID
+
+from listener.repo import ListenerRepo
+
+# listener 附件落盘目录（AlimailListener 写入，api.routes.file 与 AttachmentStore 读取）
+FILES_BASE_DIR = "public/files"
+
+
+class AttachmentStore:
+    """Resolve attachment files by file_id from the listener's attachment_files store.
+
+    引用模式下 EmailEvent 只携带 file_id + sha256，节点需要内容时才经此取得文件路径，
+    由 FileServerClient 按块流式上传并校验 sha256，图状态与 checkpoint 大小不随附件大小增长。
+    """
+
+    def __init__(
+        self,
+        repo_factory: Callable[[], ListenerRepo],
+        base_dir: str = FILES_BASE_DIR,
+    ):
+        """Initialize attachment store."""
+        self.repo_factory = repo_factory
+        self.base_dir = base_dir
+
+    def resolve(self, file_id: str) -> Path:
+        """Get the local path of a stored attachment.
+
+        Raises:
+            FileNotFoundError: If the record or the file does not exist.
+        """
+        repo = self.repo_factory()
+        try:
+            record = repo.get_attachment_file(UUID(file_id))
+        finally:
+            repo.session.close()
+        if record is None:
+            raise FileNotFoundError(f"Attachment file not found: {file_id}")
+        path = Path(self.base_dir) / record.file_path
+        if not path.exists():
+            raise FileNotFoundError(f"Attachment file not found on disk: {path}")
+        return path
@@ -1,20 +1,43 @@
 """Dify client for chatflow calls."""
 
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
 import json
+import time
 from typing import Any, Optional
+from urllib.parse import urlparse
 
 import httpx
 
 from mcs_contracts import ErrorInfo
-from observability.metrics import dify_calls_total
-from observability.retry import retry_with_backoff
+from observability.metrics import dify_calls_total, dify_stream_chunk_seconds, dify_stream_early_stops_total
+from observability.rate_limit import AdaptiveRateLimiter, parse_retry_after
+from observability.retry import CircuitBreaker, CircuitOpenError, circuit_breakers, retry_with_backoff
 from settings import Settings
+from tools.chatflow_templates import build_chatflow_payload
+
+
+class DifyStreamError(Exception):
+    """Error event received on a Dify streaming response."""
 
 
 class DifyClient:
     """Client for Dify chatflow API."""
 
-    def __init__(self, base_url: str, app_key: str, api_path: str = "/v1/chat-messages", timeout: int = 120, retries: int = 3):
+    def __init__(
+        self,
+        base_url: str,
+        app_key: str,
+        api_path: str = "/v1/chat-messages",
+        timeout: int = 120,
+        retries: int = 3,
+        http_client: Optional[httpx.AsyncClient] = None,
+        response_mode: str = "blocking",
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
         """Initialize Dify client.
         
         Args:
@@ -23,12 +46,57 @@ class DifyClient:
             api_path: API endpoint path (default: "/v1/chat-messages")
             timeout: Request timeout in seconds
             retries: Number of retries
+            http_client: Shared pooled client (see DifyClientRegistry); if omitted the
+                instance lazily creates and owns a long-lived one
+            response_mode: "blocking" waits for the full answer; "streaming" parses SSE
+                chunks and stops as soon as the answer contains a complete JSON object
+            limiter: Per-app rate limiter shared by all clients of the same Dify app
+            breaker: Circuit breaker shared by all clients of the same Dify host; when open,
+                calls raise CircuitOpenError instead of returning a failed answer
         """
         self.base_url = base_url.rstrip("/")
         self.app_key = app_key
         self.api_path = api_path
         self.timeout = timeout
         self.retries = retries
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
+        self.response_mode = response_mode
+        self.limiter = limiter
+        self.breaker = breaker
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the long-lived pooled HTTP client."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=self.timeout)
+        return self._http_client
+
+    def _guard(self) -> contextlib.AbstractContextManager:
+        """Circuit breaker guard for one attempt (no-op without a breaker)."""
+        if self.breaker is None:
+            return contextlib.nullcontext()
+        return self.breaker.guard()
+
+    def _slot(self) -> contextlib.AbstractAsyncContextManager:
+        """Rate limiter slot for one attempt (no-op without a limiter)."""
+        if self.limiter is None:
+            return contextlib.nullcontext()
+        return self.limiter.slot()
+
+    async def _record_response(self, response: httpx.Response) -> None:
+        """Feed the response status back into the limiter (AIMD)."""
+        if self.limiter is None:
+            return
+        if response.status_code in (429, 503):
+            await self.limiter.on_throttled(parse_retry_after(response.headers.get("Retry-After")))
+        elif response.status_code < 500:
+            self.limiter.on_success()
+
+    async def aclose(self) -> None:
+        """Close the HTTP client if this instance owns it."""
+        if self._http_client is not None and self._owns_http_client:
+            await self._http_client.aclose()
+            self._http_client = None
 
     async def chatflow_async(
         self,
@@ -44,32 +112,29 @@ class DifyClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "inputs": inputs,
-            "query": query,
-            "user": user,
-            "response_mode": "blocking",
-        }
-
-        if files:
-            payload["files"] = files
+        payload = build_chatflow_payload(query, user, inputs, files, response_mode=self.response_mode)
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await self._call_with_retry(client, url, headers, payload)
-                result = response.json()
+            if self.response_mode == "streaming":
+                answer = await self._stream_with_retry(self._get_http_client(), url, headers, payload)
+            else:
+                response = await self._call_with_retry(self._get_http_client(), url, headers, payload)
+                answer = response.json().get("answer", "")
 
-                # Parse answer
-                answer = result.get("answer", "")
-                answer_json = self._parse_json_answer(answer)
+            # Parse answer
+            answer_json = self._parse_json_answer(answer)
 
-                if answer_json.get("ok", False):
-                    dify_calls_total.labels(app_key=self.app_key[:10], status="success").inc()
-                else:
-                    dify_calls_total.labels(app_key=self.app_key[:10], status="failed").inc()
+            if answer_json.get("ok", False):
+                dify_calls_total.labels(app_key=self.app_key[:10], status="success").inc()
+            else:
+                dify_calls_total.labels(app_key=self.app_key[:10], status="failed").inc()
 
-                return answer_json
+            return answer_json
 
+        except CircuitOpenError:
+            # 熔断期间快速失败，由调用方（工作队列）延后重试
+            dify_calls_total.labels(app_key=self.app_key[:10], status="circuit_open").inc()
+            raise
         except Exception as e:
             dify_calls_total.labels(app_key=self.app_key[:10], status="error").inc()
             return {
@@ -87,13 +152,88 @@ class DifyClient:
         payload: dict,
     ) -> httpx.Response:
         """Call Dify API with retry."""
-        response = await client.post(url, headers=headers, json=payload)
-        if response.status_code == 429:
-            # Rate limit, retry
-            raise httpx.HTTPStatusError("Rate limited", request=response.request, response=response)
-        response.raise_for_status()
+        with self._guard():
+            async with self._slot():
+                response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+                await self._record_response(response)
+            if response.status_code == 429:
+                # Rate limit, retry
+                raise httpx.HTTPStatusError("Rate limited", request=response.request, response=response)
+            response.raise_for_status()
         return response
 
+    @retry_with_backoff(max_retries=3, retry_on=(httpx.HTTPError, httpx.TimeoutException))
+    async def _stream_with_retry(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict,
+        payload: dict,
+    ) -> str:
+        """Call Dify API in streaming mode with retry; return the answer text.
+
+        逐个解析 SSE 的 message / agent_message 事件并拼接 answer；一旦拼接结果中出现
+        完整的 JSON 对象即关闭流返回（不再等待 message_end），超时按分片间隔计算。
+        """
+        with self._guard():
+            return await self._stream_answer(client, url, headers, payload)
+
+    async def _stream_answer(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict,
+        payload: dict,
+    ) -> str:
+        """Read one streaming response (see _stream_with_retry)."""
+        app_key = self.app_key[:10]
+        scanner = JsonObjectScanner()
+        parts: list[str] = []
+        first = True
+
+        async with self._slot():
+            # 首个分片延迟从请求发出算起，不含限流排队时间
+            last_chunk_at = time.monotonic()
+            async with client.stream(
+                "POST", url, headers=headers, json=payload, timeout=self.timeout
+            ) as response:
+                await self._record_response(response)
+                if response.status_code == 429:
+                    # Rate limit, retry
+                    raise httpx.HTTPStatusError("Rate limited", request=response.request, response=response)
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[5:])
+                    except json.JSONDecodeError:
+                        continue
+
+                    kind = event.get("event")
+                    if kind in ("message", "agent_message"):
+                        now = time.monotonic()
+                        dify_stream_chunk_seconds.labels(
+                            app_key=app_key, chunk="first" if first else "next"
+                        ).observe(now - last_chunk_at)
+                        last_chunk_at = now
+                        first = False
+
+                        chunk = event.get("answer") or ""
+                        parts.append(chunk)
+                        if scanner.feed(chunk) is not None:
+                            dify_stream_early_stops_total.labels(app_key=app_key).inc()
+                            return scanner.result_text
+                    elif kind == "message_end":
+                        break
+                    elif kind == "error":
+                        raise DifyStreamError(
+                            f"{event.get('code', 'error')}: {event.get('message', 'Dify stream error')}"
+                        )
+
+        return "".join(parts)
+
     def chatflow_blocking(
         self,
         query: str,
@@ -102,7 +242,6 @@ class DifyClient:
         files: Optional[list[dict[str, Any]]] = None,
     ) -> dict[str, Any]:
         """Call Dify chatflow synchronously (wrapper around async)."""
-        import asyncio
         import sys
         import selectors
 
@@ -129,7 +268,22 @@ class DifyClient:
                 loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
 
-        return loop.run_until_complete(self.chatflow_async(query, user, inputs, files))
+        async def _call_once() -> dict[str, Any]:
+            # 池化连接绑定创建它的事件循环，同步调用使用一次性客户端
+            client = DifyClient(
+                self.base_url,
+                self.app_key,
+                self.api_path,
+                self.timeout,
+                self.retries,
+                response_mode=self.response_mode,
+            )
+            try:
+                return await client.chatflow_async(query, user, inputs, files)
+            finally:
+                await client.aclose()
+
+        return loop.run_until_complete(_call_once())
 
     def _parse_json_answer(self, answer: str) -> dict[str, Any]:
         """Parse JSON answer from Dify, with fallback."""
@@ -164,3 +318,168 @@ class DifyClient:
                 "raw_answer": answer,
             }
 
+
+class JsonObjectScanner:
+    """Incrementally find the first complete top-level JSON object in streamed text.
+
+    跟踪花括号深度（忽略字符串内的括号与转义）；括号闭合但内容不是合法 JSON 时，
+    从该起点之后继续查找，因此答案前的说明文字或 ```json 代码块包裹都不影响结果。
+    """
+
+    def __init__(self):
+        """Initialize scanner."""
+        self._text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.result: Optional[dict[str, Any]] = None
+        self.result_text: Optional[str] = None
+
+    def feed(self, chunk: str) -> Optional[dict[str, Any]]:
+        """Append chunk; return the parsed object once one is complete, else None."""
+        if self.result is not None:
+            return self.result
+        self._text += chunk
+        text = self._text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._start < 0:
+                if ch == "{":
+                    self._start = self._pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start : self._pos + 1]
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        parsed = None
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        self.result_text = candidate
+                        return parsed
+                    # 不是合法 JSON：从起点之后重新查找
+                    self._pos = self._start
+                    self._start = -1
+            self._pos += 1
+        return None
+
+
+class DifyClientRegistry:
+    """Process-wide DifyClient instances sharing pooled keep-alive connections.
+
+    DifyClient 按 (base_url, token, api_path) 复用；同一 base_url 的客户端共享一个
+    httpx.AsyncClient 连接池（可用时启用 HTTP/2），在 app lifespan 关闭时统一释放。
+    """
+
+    def __init__(self):
+        """Initialize registry with default pool limits."""
+        self._clients: dict[tuple[str, str, str], DifyClient] = {}
+        self._pools: dict[str, httpx.AsyncClient] = {}
+        self._limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+        self._http2 = True
+        self._timeout = 120
+        self._response_mode = "streaming"
+        self._limiters: dict[tuple[str, str], AdaptiveRateLimiter] = {}
+        self._settings: Optional[Settings] = None
+
+    def configure(self, settings: Settings) -> None:
+        """Apply pool settings (affects pools created afterwards)."""
+        self._limits = httpx.Limits(
+            max_connections=settings.dify_max_connections,
+            max_keepalive_connections=settings.dify_max_keepalive_connections,
+            keepalive_expiry=settings.dify_keepalive_expiry_seconds,
+        )
+        self._http2 = settings.dify_http2
+        self._timeout = settings.dify_timeout_seconds
+        self._response_mode = settings.dify_response_mode
+        self._settings = settings
+
+    def get(self, base_url: str, app_key: str, api_path: str = "/v1/chat-messages") -> DifyClient:
+        """Get the shared DifyClient for (base_url, app_key, api_path)."""
+        base_url = base_url.rstrip("/")
+        key = (base_url, app_key, api_path)
+        client = self._clients.get(key)
+        if client is None:
+            client = DifyClient(
+                base_url,
+                app_key,
+                api_path=api_path,
+                timeout=self._timeout,
+                http_client=self._get_pool(base_url),
+                response_mode=self._response_mode,
+                limiter=self._get_limiter(base_url, app_key),
+                breaker=circuit_breakers.get(f"dify:{urlparse(base_url).netloc or base_url}"),
+            )
+            self._clients[key] = client
+        return client
+
+    def _get_pool(self, base_url: str) -> httpx.AsyncClient:
+        """Get or create the connection pool for base_url."""
+        pool = self._pools.get(base_url)
+        if pool is None:
+            pool = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                http2=self._http2 and _HTTP2_AVAILABLE,
+            )
+            self._pools[base_url] = pool
+        return pool
+
+    def _get_limiter(self, base_url: str, app_key: str) -> Optional[AdaptiveRateLimiter]:
+        """Get the rate limiter shared by every client of one Dify app."""
+        settings = self._settings
+        if settings is not None and not settings.dify_rate_limit_enabled:
+            return None
+        key = (base_url, app_key)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            if settings is None:
+                limiter = AdaptiveRateLimiter(app_key[:10])
+            else:
+                limiter = AdaptiveRateLimiter(
+                    app_key[:10],
+                    rate=settings.dify_rate_limit_per_second,
+                    min_rate=settings.dify_rate_limit_min_per_second,
+                    max_rate=settings.dify_rate_limit_max_per_second,
+                    max_in_flight=settings.dify_max_in_flight,
+                    redis_url=settings.redis_url if settings.dify_rate_limit_shared else None,
+                    # Redis 键不含明文 token
+                    redis_key="dify:" + hashlib.sha256(f"{base_url}|{app_key}".encode()).hexdigest()[:16],
+                )
+            self._limiters[key] = limiter
+        return limiter
+
+    async def aclose(self) -> None:
+        """Close all pools and limiters, and forget clients."""
+        pools = list(self._pools.values())
+        limiters = list(self._limiters.values())
+        self._pools.clear()
+        self._limiters.clear()
+        self._clients.clear()
+        await asyncio.gather(
+            *(pool.aclose() for pool in pools),
+            *(limiter.aclose() for limiter in limiters),
+            return_exceptions=True,
+        )
+
+
+# HTTP/2 需要可选依赖 h2（httpx[http2]），未安装时回退 HTTP/1.1 keep-alive
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 进程级共享实例
+dify_clients = DifyClientRegistry()
@@ -2,24 +2,187 @@
 
 import asyncio
 import hashlib
+import json
+import os
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Callable, Optional, Union
+from uuid import uuid4
 
 import httpx
 
 from mcs_contracts import ErrorInfo, FileUploadResult
 from errors import FILE_UPLOAD_FAILED, OrchestratorError
+from observability.metrics import file_upload_bytes_total, file_upload_duration_seconds
+from observability.retry import circuit_breakers, retry_with_backoff
 from settings import Settings
 
+# 上传内容：内存数据（bytes / memoryview，按切片发送不整体复制）或本地文件路径（按块读取）
+UploadSource = Union[bytes, bytearray, memoryview, Path]
+
+_UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class FileServerUnavailable(httpx.HTTPStatusError):
+    """File server answered 5xx (retried; counts as a circuit breaker failure)."""
+
+
+class FileContentMismatch(ValueError):
+    """Streamed file content does not match the expected sha256 (never retried)."""
+
 
 class FileServerClient:
     """Client for file server."""
 
-    def __init__(self, base_url: str, api_key: str):
-        """Initialize file server client."""
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+        timeout: float = 60.0,
+        max_connections: int = 10,
+    ):
+        """Initialize file server client.
+
+        Args:
+            base_url: File server base URL
+            api_key: API key (X-API-Key)
+            http_client: Shared pooled client; if omitted one is created lazily and owned
+            timeout: Per-request timeout in seconds
+            max_connections: Pool size of the owned client
+        """
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
+        # 进程内共享；断开期间上传直接抛 CircuitOpenError（不返回 ok=False），由工作队列延后重试
+        self.breaker = circuit_breakers.get("file_server")
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the long-lived pooled HTTP client."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Close the HTTP client if this instance owns it."""
+        if self._http_client is not None and self._owns_http_client:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def upload_file_async(
+        self,
+        source: UploadSource,
+        filename: str,
+        content_type: str,
+        metadata: Optional[dict] = None,
+        sha256: Optional[str] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> FileUploadResult:
+        """Upload file to file server without blocking the event loop.
+
+        The multipart body is streamed: bytes/memoryview sources are sent in slices, Path
+        sources are read chunk by chunk, so the file is never copied into one request body.
+        Transport errors and 5xx responses are retried.
+
+        Args:
+            source: File content (bytes / memoryview) or local file path
+            filename: Filename sent to the file server
+            content_type: MIME content type
+            metadata: Optional metadata form field (JSON encoded)
+            sha256: SHA256 of the content (computed for in-memory sources if omitted;
+                file sources are verified against it while streaming)
+            on_progress: Optional callback(sent_bytes, total_bytes) per chunk
+        """
+        if isinstance(source, Path):
+            size = (await asyncio.to_thread(source.stat)).st_size
+        else:
+            source = memoryview(source)
+            size = source.nbytes
+            if not sha256:
+                sha256 = hashlib.sha256(source).hexdigest()
+
+        started = time.monotonic()
+        try:
+            result = await self._post_multipart(
+                source, size, filename, content_type, metadata, on_progress, sha256
+            )
+        except FileContentMismatch as e:
+            file_upload_duration_seconds.labels(status="error").observe(time.monotonic() - started)
+            return FileUploadResult(
+                ok=False,
+                errors=[
+                    ErrorInfo(
+                        code=FILE_UPLOAD_FAILED,
+                        reason=str(e),
+                        details={"filename": filename, "sha256": sha256},
+                    )
+                ],
+            )
+        except httpx.HTTPError as e:
+            file_upload_duration_seconds.labels(status="error").observe(time.monotonic() - started)
+            return FileUploadResult(
+                ok=False,
+                errors=[
+                    ErrorInfo(
+                        code=FILE_UPLOAD_FAILED,
+                        reason=f"File upload failed: {str(e)}",
+                        details={"filename": filename},
+                    )
+                ],
+            )
+
+        file_upload_duration_seconds.labels(status="success").observe(time.monotonic() - started)
+        return FileUploadResult(
+            ok=True,
+            file_url=result.get("file_url"),
+            file_id=result.get("file_id"),
+            sha256=sha256,
+        )
+
+    @retry_with_backoff(max_retries=3, retry_on=(httpx.TransportError, FileServerUnavailable))
+    async def _post_multipart(
+        self,
+        source: Union[memoryview, Path],
+        size: int,
+        filename: str,
+        content_type: str,
+        metadata: Optional[dict],
+        on_progress: Optional[Callable[[int, int], None]],
+        sha256: Optional[str] = None,
+    ) -> dict:
+        """POST one streamed multipart upload attempt."""
+        boundary = uuid4().hex
+        head, tail = _multipart_envelope(boundary, filename, content_type, metadata)
+        headers = {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(len(head) + size + len(tail)),
+        }
+        if self.api_key:
+            headers["X-API-Key"] = self.api_key
+
+        with self.breaker.guard():
+            response = await self._get_http_client().post(
+                f"{self.base_url}/v1/files/upload",
+                headers=headers,
+                content=_iter_multipart(head, source, size, tail, on_progress, sha256),
+                timeout=self.timeout,
+            )
+            if response.status_code >= 500:
+                raise FileServerUnavailable(
+                    f"File server error {response.status_code}", request=response.request, response=response
+                )
+            response.raise_for_status()
+        return response.json()
 
     def upload_file(
         self,
@@ -29,7 +192,7 @@ class FileServerClient:
         metadata: Optional[dict] = None,
         sha256: Optional[str] = None,
     ) -> FileUploadResult:
-        """Upload file to file server."""
+        """Upload file to file server (blocking; async callers use upload_file_async)."""
         # Calculate SHA256 if not provided
         if not sha256:
             sha256 = hashlib.sha256(file_bytes).hexdigest()
@@ -40,14 +203,15 @@ class FileServerClient:
                 files = {"file": (filename, file_bytes, content_type)}
                 data = {"metadata": metadata} if metadata else {}
 
-                response = client.post(
-                    f"{self.base_url}/v1/files/upload",
-                    headers=headers,
-                    files=files,
-                    data=data,
-                    timeout=60.0,
-                )
-                response.raise_for_status()
+                with self.breaker.guard():
+                    response = client.post(
+                        f"{self.base_url}/v1/files/upload",
+                        headers=headers,
+                        files=files,
+                        data=data,
+                        timeout=60.0,
+                    )
+                    response.raise_for_status()
                 result = response.json()
 
                 return FileUploadResult(
@@ -112,6 +276,101 @@ class FileServerClient:
         # Return relative path
         return f"{sub_dir}/{filename}"
 
+    async def save_blob(
+        self,
+        file_bytes: bytes,
+        base_dir: str,
+        sha256: Optional[str] = None,
+    ) -> str:
+        """Save content-addressed blob to local filesystem (written once per sha256).
+
+        Args:
+            file_bytes: File content as bytes.
+            base_dir: Base directory path (e.g., 'public/files').
+            sha256: SHA256 of file_bytes (computed if omitted).
+
+        Returns:
+            Relative file path string (format: blobs/{sha256[:2]}/{sha256}).
+
+        Raises:
+            OSError: If file system operations fail.
+        """
+        if not sha256:
+            sha256 = hashlib.sha256(file_bytes).hexdigest()
+        relative_path = f"blobs/{sha256[:2]}/{sha256}"
+        full_path = Path(base_dir) / relative_path
+
+        # 内容相同即同一文件：已存在则不再写入
+        if full_path.exists():
+            return relative_path
+
+        def _write() -> None:
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，并发写同一 blob 时读方不会看到半个文件
+            tmp_path = full_path.with_name(f"{full_path.name}.{uuid4().hex}.tmp")
+            tmp_path.write_bytes(file_bytes)
+            os.replace(tmp_path, full_path)
+
+        await asyncio.to_thread(_write)
+        return relative_path
+
+    async def save_blob_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        base_dir: str,
+    ) -> tuple[str, str, int]:
+        """Stream content into a content-addressed blob, hashing while writing.
+
+        内容先按块写入 blobs/tmp/ 下的临时文件（同时计算 sha256），完成后原子移动到
+        blobs/{sha[:2]}/{sha}；blob 已存在时丢弃临时文件。全程不在内存中保留整个文件。
+
+        Args:
+            chunks: Async iterable of content chunks.
+            base_dir: Base directory path (e.g., 'public/files').
+
+        Returns:
+            (relative file path, sha256, size in bytes).
+
+        Raises:
+            OSError: If file system operations fail.
+        """
+        tmp_dir = Path(base_dir) / "blobs" / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+
+        def _write(f: BinaryIO, chunk: bytes) -> None:
+            digest.update(chunk)
+            f.write(chunk)
+
+        try:
+            f = await asyncio.to_thread(tmp_path.open, "wb")
+            try:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    await asyncio.to_thread(_write, f, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+            sha256 = digest.hexdigest()
+            relative_path = f"blobs/{sha256[:2]}/{sha256}"
+            full_path = Path(base_dir) / relative_path
+
+            def _commit() -> None:
+                # 内容相同即同一文件：已存在则丢弃临时文件
+                if full_path.exists():
+                    tmp_path.unlink()
+                    return
+                full_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, full_path)
+
+            await asyncio.to_thread(_commit)
+        except BaseException:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+            raise
+        return relative_path, sha256, size
+
     async def read_file(self, base_dir: str, file_path: str) -> bytes:
         """Read file from local filesystem.
 
@@ -130,3 +389,67 @@ class FileServerClient:
             raise FileNotFoundError(f"File not found: {full_path}")
         return await asyncio.to_thread(full_path.read_bytes)
 
+
+def _multipart_envelope(
+    boundary: str,
+    filename: str,
+    content_type: str,
+    metadata: Optional[dict],
+) -> tuple[bytes, bytes]:
+    """Build the multipart bytes before and after the file content."""
+    head = b""
+    if metadata:
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="metadata"\r\n\r\n'
+            f"{json.dumps(metadata, ensure_ascii=False)}\r\n"
+        ).encode()
+    # 与 httpx 一致：文件名按 UTF-8 原样发送，仅转义引号与反斜杠
+    quoted = filename.replace("\\", "\\\\").replace('"', "%22")
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    return head, tail
+
+
+async def _iter_multipart(
+    head: bytes,
+    source: Union[memoryview, Path],
+    size: int,
+    tail: bytes,
+    on_progress: Optional[Callable[[int, int], None]],
+    sha256: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the multipart body, streaming the file content chunk by chunk."""
+    yield head
+    sent = 0
+    async for chunk in _iter_source(source, sha256):
+        yield chunk
+        sent += len(chunk)
+        file_upload_bytes_total.inc(len(chunk))
+        if on_progress:
+            on_progress(sent, size)
+    yield tail
+
+
+async def _iter_source(source: Union[memoryview, Path], sha256: Optional[str] = None) -> AsyncIterator[bytes]:
+    if isinstance(source, Path):
+        # 落盘文件可能被改写或损坏：边读边算 sha256，不一致时在发送结束边界前中止请求
+        digest = hashlib.sha256()
+        f = await asyncio.to_thread(source.open, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, _UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                yield chunk
+        finally:
+            f.close()
+        if sha256 and digest.hexdigest() != sha256:
+            raise FileContentMismatch(f"File content does not match sha256: {source.name}")
+    else:
+        for offset in range(0, source.nbytes, _UPLOAD_CHUNK_SIZE):
+            # 单个分片转为 bytes 交给传输层，整体内容不做复制
+            yield source[offset : offset + _UPLOAD_CHUNK_SIZE].tobytes()
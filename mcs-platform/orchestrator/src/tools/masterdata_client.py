@@ -1,66 +1,139 @@
 """Master data service client."""
 
+import asyncio
+import json
 import time
-from typing import Optional
+from typing import Any, Optional
 
 import httpx
 
-from mcs_contracts import MasterData
+from mcs_contracts import Company, Contact, Customer, MasterData, Product
 from settings import Settings
 
+# 变更日志表名 -> (MasterData 字段, 主键字段, 契约类型)
+_TABLES: dict[str, tuple[str, str, type]] = {
+    "customers": ("customers", "customer_id", Customer),
+    "contacts": ("contacts", "contact_id", Contact),
+    "companys": ("companys", "company_id", Company),
+    "products": ("products", "product_id", Product),
+}
+
 
 class MasterDataClient:
-    """Client for master data service."""
+    """Client for master data service.
+
+    本地保留一份带索引的 MasterData 副本；缓存过期后通过 /changes?since=<version> 增量同步，
+    仅在变更日志被截断（或首次加载）时拉取全量快照。共享一个连接池化的 httpx.AsyncClient。
+    """
 
-    def __init__(self, base_url: str, api_key: str, cache_ttl: int = 300):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        cache_ttl: int = 300,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
         """Initialize master data client."""
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.cache_ttl = cache_ttl
-        self._cache: Optional[tuple[MasterData, int, float]] = None  # (data, version, expiry)
-
-    def get_all(self) -> MasterData:
-        """Get all master data (with caching)."""
-        # Check cache
-        if self._cache:
-            data, version, expiry = self._cache
-            if time.time() < expiry:
-                # Check version
-                current_version = self._get_version()
-                if current_version == version:
-                    return data
-                # Version mismatch, clear cache
-                self._cache = None
-
-        # Cache miss or version mismatch, fetch from API
-        with httpx.Client() as client:
+        self._client = client
+        self._owns_client = client is None
+        self._masterdata: Optional[MasterData] = None
+        self._version: Optional[int] = None
+        self._expiry = 0.0
+        self._lock = asyncio.Lock()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get or create the pooled HTTP client."""
+        if self._client is None:
             headers = {"X-API-Key": self.api_key} if self.api_key else {}
-            response = client.get(f"{self.base_url}/v1/masterdata/all", headers=headers, timeout=30.0)
-            response.raise_for_status()
-            masterdata = MasterData(**response.json())
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=30.0)
+        return self._client
 
-            # Update cache
-            version = self._get_version()
-            expiry = time.time() + self.cache_ttl
-            self._cache = (masterdata, version, expiry)
+    async def get_all(self) -> MasterData:
+        """Get all master data (local copy, synced incrementally after cache_ttl)."""
+        if self._masterdata is not None and time.time() < self._expiry:
+            return self._masterdata
 
-            return masterdata
+        async with self._lock:
+            if self._masterdata is None or time.time() >= self._expiry:
+                await self._sync()
+                self._expiry = time.time() + self.cache_ttl
+            return self._masterdata
 
-    def get_customer(self, customer_id: str):
+    async def get_customer(self, customer_id: str):
         """Get customer by ID."""
-        masterdata = self.get_all()
+        masterdata = await self.get_all()
         return masterdata.get_customer_by_id(customer_id)
 
-    def get_contact_by_email(self, email: str):
+    async def get_contact_by_email(self, email: str):
         """Get contact by email."""
-        masterdata = self.get_all()
+        masterdata = await self.get_all()
         return masterdata.get_contact_by_email(email)
 
-    def _get_version(self) -> int:
-        """Get current master data version."""
-        with httpx.Client() as client:
-            headers = {"X-API-Key": self.api_key} if self.api_key else {}
-            response = client.get(f"{self.base_url}/v1/masterdata/version", headers=headers, timeout=10.0)
+    async def close(self) -> None:
+        """Close the HTTP client if this instance created it."""
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _sync(self) -> None:
+        """Apply changes since the local version, or load a full snapshot."""
+        if self._masterdata is None or self._version is None:
+            await self._load_snapshot()
+            return
+
+        response = await self._get_client().get("/v1/masterdata/changes", params={"since": self._version})
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get("truncated"):
+            await self._load_snapshot()
+            return
+
+        if payload["changes"]:
+            self._masterdata = apply_changes(self._masterdata, payload["changes"])
+        self._version = payload["version"]
+
+    async def _load_snapshot(self) -> None:
+        """Load a full snapshot via the streaming NDJSON export (version comes with the data)."""
+        rows: dict[str, list[dict[str, Any]]] = {field: [] for field, _, _ in _TABLES.values()}
+        version = None
+        async with self._get_client().stream(
+            "GET", "/v1/masterdata/all", params={"stream": "true"}, timeout=120.0
+        ) as response:
             response.raise_for_status()
-            return response.json()["version"]
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record["type"] == "meta":
+                    version = record["version"]
+                elif record["type"] == "row":
+                    rows[_TABLES[record["table"]][0]].append(record["data"])
+
+        self._masterdata = MasterData(**rows)
+        self._version = version
+
+
+def apply_changes(masterdata: MasterData, changes: list[dict[str, Any]]) -> MasterData:
+    """Apply change-log entries to a copy of masterdata (the input is left untouched)."""
+    tables: dict[str, dict[str, Any]] = {}
+    for change in changes:
+        spec = _TABLES.get(change["table"])
+        if spec is None:
+            continue
+        field, pk, model = spec
+        if field not in tables:
+            tables[field] = {getattr(row, pk): row for row in getattr(masterdata, field)}
+        if change["op"] == "delete":
+            tables[field].pop(change["id"], None)
+        else:
+            tables[field][change["id"]] = model(**change["data"])
 
+    return MasterData.model_construct(
+        **{
+            field: list(tables[field].values()) if field in tables else getattr(masterdata, field)
+            for field, _, _ in _TABLES.values()
+        }
+    )
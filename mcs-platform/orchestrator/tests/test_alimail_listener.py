@@ -0,0 +1,251 @@
+"""Test AlimailListener attachment ingestion."""
+
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from listener.channel.alimail import AlimailListener
+from listener.clients.alimail_client import AlimailClient
+from tools.file_server import FileServerClient
+
+CONTENTS = {
+    "a1": b"%PDF-1.4 scan one" * 1000,
+    "a2": b"%PDF-1.4 scan two" * 1000,
+    "a3": b"%PDF-1.4 scan one" * 1000,  # 与 a1 内容相同
+    "a4": b"",
+    "a5": b"%PDF-1.4 scan five",
+}
+
+
+def _listener(repo, load_payloads: bool = False) -> tuple[AlimailListener, dict]:
+    listener = AlimailListener(
+        client_id="id",
+        client_secret="secret",
+        email_account="sales@example.com",
+        file_client=FileServerClient(base_url="http://files", api_key=""),
+        repo=repo,
+        attachment_concurrency=2,
+        load_payloads=load_payloads,
+    )
+    stats = {"active": 0, "peak": 0}
+
+    @asynccontextmanager
+    async def stream_attachment(message_id, attachment_id):
+        async def aiter_bytes():
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+            try:
+                content = CONTENTS[attachment_id]
+                for i in range(0, len(content), 4096):
+                    await asyncio.sleep(0.01)
+                    yield content[i:i + 4096]
+            finally:
+                stats["active"] -= 1
+
+        response = MagicMock()
+        response.aiter_bytes = aiter_bytes
+        yield response
+
+    listener.client = MagicMock()
+    listener.client.email_account = "sales@example.com"
+    listener.client.get_message = AsyncMock(
+        return_value={"message": {"mailId": "<m1@example.com>", "hasAttachments": True, "subject": "扫描件"}}
+    )
+    listener.client.list_attachments = AsyncMock(
+        return_value=[
+            {"id": att_id, "name": f"{att_id}.pdf", "contentType": "application/pdf"} for att_id in CONTENTS
+        ]
+    )
+    listener.client.stream_attachment = stream_attachment
+    return listener, stats
+
+
+@pytest.mark.asyncio
+async def test_fetch_message_streams_attachments_concurrently(tmp_path, monkeypatch):
+    """Attachments download in parallel (bounded), stream to blobs and are recorded in one batch."""
+    monkeypatch.chdir(tmp_path)
+    repo = MagicMock()
+    listener, stats = _listener(repo)
+
+    message = await listener.fetch_message("m1")
+
+    assert stats["peak"] == 2
+    attachments = message["attachments"]
+    assert [att["filename"] for att in attachments] == ["a1.pdf", "a2.pdf", "a3.pdf", "a5.pdf"]
+    repo.create_attachment_files.assert_called_once()
+    records = repo.create_attachment_files.call_args.args[0]
+    assert len(records) == 4
+    assert all(record["message_id"] == "<m1@example.com>" for record in records)
+
+    for att in attachments:
+        sha256 = hashlib.sha256(CONTENTS[att["filename"][:2]]).hexdigest()
+        assert att["sha256"] == sha256
+        assert att["size"] == len(CONTENTS[att["filename"][:2]])
+        assert att["payload"] is None
+        assert att["file_id"] is not None
+        assert (tmp_path / "public/files/blobs" / sha256[:2] / sha256).read_bytes() == CONTENTS[att["filename"][:2]]
+    assert list((tmp_path / "public/files/blobs/tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_message_loads_payload_when_records_fail(tmp_path, monkeypatch):
+    """Without a file_id to reference, attachment content is read back from the blob."""
+    monkeypatch.chdir(tmp_path)
+    repo = MagicMock()
+    repo.create_attachment_files.side_effect = RuntimeError("db down")
+    listener, _ = _listener(repo)
+
+    message = await listener.fetch_message("m1")
+
+    repo.session.rollback.assert_called_once()
+    for att in message["attachments"]:
+        assert att["file_id"] is None
+        assert att["payload"] == CONTENTS[att["filename"][:2]]
+
+
+@pytest.mark.asyncio
+async def test_fetch_envelope_skips_attachments_and_is_reused(tmp_path, monkeypatch):
+    """The envelope costs one get_message; fetch_message reuses it and only then lists attachments."""
+    monkeypatch.chdir(tmp_path)
+    listener, _ = _listener(MagicMock())
+
+    envelope = await listener.fetch_envelope("m1")
+    assert envelope["message_id"] == "<m1@example.com>"
+    assert envelope["has_attachments"] is True
+    listener.client.list_attachments.assert_not_awaited()
+
+    message = await listener.fetch_message("m1")
+    listener.client.get_message.assert_awaited_once()
+    assert len(message["attachments"]) == 4
+
+
+def test_query_str_pushes_down_allow_list_and_attachments():
+    """Sender allow list and hasAttachments are part of the server-side query."""
+    client = AlimailClient("id", "secret", "sales@example.com")
+    query = client._build_query_str(
+        folder_id="2",
+        has_attachments=True,
+        from_emails=["a@example.com", "b@example.com"],
+        start_time="2026-10-17T08:00:00Z",
+    )
+    assert query == (
+        'folderId:2 AND hasAttachments:true AND (from:"a@example.com" OR from:"b@example.com")'
+        " AND after:2026-10-17T08:00:00Z"
+    )
+
+
+@pytest.mark.asyncio
+async def test_poll_resumes_cursor_and_advances_received_checkpoint():
+    """Unfinished page walks resume from the saved cursor; the checkpoint feeds start_time."""
+    repo = MagicMock()
+    repo.get_sync_state.return_value = None
+    listener = AlimailListener(
+        client_id="id",
+        client_secret="secret",
+        email_account="sales@example.com",
+        repo=repo,
+        allow_from=["customer@example.com"],
+        max_pages=1,
+    )
+    pages = {
+        "": {"messages": [{"id": "m1", "receivedDateTime": "2026-10-17T08:00:00Z"}], "hasMore": True, "nextCursor": "c1"},
+        "c1": {"messages": [{"id": "m2", "receivedDateTime": "2026-10-17T09:30:00Z"}], "hasMore": False},
+    }
+    listener.client.query_messages = AsyncMock(side_effect=lambda **kwargs: pages[kwargs["cursor"]])
+
+    # 首轮：无检查点，以未读为基线；只翻一页，保存游标；失败的邮件不丢弃游标
+    assert await listener.poll_new_messages() == ["m1"]
+    kwargs = listener.client.query_messages.call_args.kwargs
+    assert kwargs["is_read"] is False
+    assert kwargs["has_attachments"] is True
+    assert kwargs["from_emails"] == ["customer@example.com"]
+    await listener.commit_poll(["m1"])
+    repo.save_sync_state.assert_called_with(
+        "alimail",
+        "sales@example.com",
+        "2",
+        last_received_at=None,
+        cursor="c1",
+        retry_ids={"m1": 1},
+        dead_ids={},
+    )
+
+    # 第二轮：仍按未读从游标继续并重试 m1，翻完后检查点推进到最晚接收时间
+    assert await listener.poll_new_messages() == ["m2", "m1"]
+    kwargs = listener.client.query_messages.call_args.kwargs
+    assert kwargs["is_read"] is False
+    assert kwargs["cursor"] == "c1"
+    await listener.commit_poll([])
+    repo.save_sync_state.assert_called_with(
+        "alimail",
+        "sales@example.com",
+        "2",
+        last_received_at=datetime(2026, 10, 17, 9, 30),
+        cursor=None,
+        retry_ids={},
+        dead_ids={},
+    )
+
+    # 第三轮：按检查点（减去重叠时间）查询；失败的邮件单独重试，检查点照常推进
+    pages[""] = {"messages": [{"id": "m3", "receivedDateTime": "2026-10-17T10:00:00Z"}], "hasMore": False}
+    assert await listener.poll_new_messages() == ["m3"]
+    kwargs = listener.client.query_messages.call_args.kwargs
+    assert kwargs["start_time"] == "2026-10-17T09:29:00Z"
+    assert kwargs["is_read"] is None
+    await listener.commit_poll(["m3"])
+    repo.save_sync_state.assert_called_with(
+        "alimail",
+        "sales@example.com",
+        "2",
+        last_received_at=datetime(2026, 10, 17, 10, 0),
+        cursor=None,
+        retry_ids={"m3": 1},
+        dead_ids={},
+    )
+
+
+@pytest.mark.asyncio
+async def test_failing_message_is_dead_lettered_until_requeued():
+    """Deferred failures keep the attempt count; exhausted messages are no longer offered."""
+    repo = MagicMock()
+    repo.get_sync_state.return_value = MagicMock(
+        last_received_at=datetime(2026, 10, 17, 8, 0),
+        cursor=None,
+        retry_ids={"m1": 1},
+        dead_ids=None,
+    )
+    repo.take_requeued_messages.return_value = []
+    listener = AlimailListener(
+        client_id="id",
+        client_secret="secret",
+        email_account="sales@example.com",
+        repo=repo,
+        max_attempts=2,
+    )
+    message = {"id": "m1", "receivedDateTime": "2026-10-17T08:00:00Z"}
+    listener.client.query_messages = AsyncMock(
+        return_value={"messages": [message], "hasMore": False}
+    )
+
+    # 熔断等依赖不可用：不计失败次数
+    assert await listener.poll_new_messages() == ["m1"]
+    await listener.commit_poll([], ["m1"])
+    assert repo.save_sync_state.call_args.kwargs["retry_ids"] == {"m1": 1}
+
+    assert await listener.poll_new_messages() == ["m1"]
+    await listener.commit_poll(["m1"])
+    assert repo.save_sync_state.call_args.kwargs["retry_ids"] == {}
+    assert repo.save_sync_state.call_args.kwargs["dead_ids"] == {"m1": 2}
+
+    # 重叠查询再次返回死信邮件时不再提供，重新入队后回到重试列表
+    assert await listener.poll_new_messages() == []
+    repo.take_requeued_messages.return_value = ["m1"]
+    await listener.commit_poll([])
+    repo.take_requeued_messages.assert_called_with("alimail", "sales@example.com", "2")
+    assert repo.save_sync_state.call_args.kwargs["retry_ids"] == {"m1": 0}
+    assert repo.save_sync_state.call_args.kwargs["dead_ids"] == {}
+    assert await listener.poll_new_messages() == ["m1"]
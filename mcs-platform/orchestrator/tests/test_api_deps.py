@@ -0,0 +1,33 @@
+"""Test FastAPI dependency lifetimes."""
+
+from unittest.mock import AsyncMock, patch
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from api.deps import get_file_server, get_settings
+from settings import Settings
+from tools.file_server import FileServerClient
+
+
+def test_file_server_fallback_is_closed_after_the_request():
+    """Without the lifespan instance a per-request client is created and its pool closed."""
+    app = FastAPI()
+    app.dependency_overrides[get_settings] = lambda: Settings()
+    seen = []
+
+    @app.get("/probe")
+    async def probe(file_server: FileServerClient = Depends(get_file_server)):
+        seen.append(file_server)
+        return {}
+
+    with patch.object(FileServerClient, "aclose", AsyncMock()) as aclose:
+        assert TestClient(app).get("/probe").status_code == 200
+    aclose.assert_awaited_once()
+
+    shared = FileServerClient("https://files.example.com", "")
+    app.state.file_server = shared
+    with patch.object(FileServerClient, "aclose", AsyncMock()) as aclose:
+        TestClient(app).get("/probe")
+    assert seen[-1] is shared
+    aclose.assert_not_awaited()
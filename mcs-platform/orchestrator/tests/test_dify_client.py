@@ -0,0 +1,120 @@
+"""Test pooled Dify clients."""
+
+import json
+
+import httpx
+import pytest
+
+from tools.dify_client import DifyClient, DifyClientRegistry, JsonObjectScanner
+
+
+def test_registry_reuses_clients_and_pools():
+    """Same (base_url, token, path) yields one client; one pool per base_url."""
+    registry = DifyClientRegistry()
+
+    a = registry.get("https://dify.example.com/", "token-a")
+    assert registry.get("https://dify.example.com", "token-a") is a
+
+    b = registry.get("https://dify.example.com", "token-b")
+    assert b is not a
+    assert b._get_http_client() is a._get_http_client()
+
+    other = registry.get("https://other.example.com", "token-a")
+    assert other._get_http_client() is not a._get_http_client()
+
+
+@pytest.mark.asyncio
+async def test_chatflow_reuses_one_http_client_across_calls():
+    """Consecutive calls go through the same shared AsyncClient."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.headers["Authorization"])
+        return httpx.Response(200, json={"answer": json.dumps({"ok": True})})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = DifyClient("https://dify.example.com", "token-a", http_client=http_client)
+
+    for _ in range(3):
+        assert (await client.chatflow_async(query="q", user="u", inputs={}))["ok"] is True
+
+    assert calls == ["Bearer token-a"] * 3
+    # Shared pools are closed by the registry, not by individual clients
+    await client.aclose()
+    assert not http_client.is_closed
+    await http_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_registry_aclose_closes_pools():
+    """Shutdown closes every pool and drops cached clients."""
+    registry = DifyClientRegistry()
+    client = registry.get("https://dify.example.com", "token-a")
+    pool = client._get_http_client()
+
+    await registry.aclose()
+
+    assert pool.is_closed
+    assert registry.get("https://dify.example.com", "token-a") is not client
+
+
+def _sse(*events: dict) -> list[bytes]:
+    return [f"data: {json.dumps(event)}\n\n".encode() for event in events]
+
+
+def test_json_object_scanner_handles_fences_and_braces_in_strings():
+    """Scanner skips non-JSON brace spans and ignores braces inside strings."""
+    scanner = JsonObjectScanner()
+    assert scanner.feed("Note {draft}. ```json\n{\"ok\": true, ") is None
+    assert scanner.feed('"reason": "a } \\" {"') is None
+    assert scanner.feed("}\n```") == {"ok": True, "reason": 'a } " {'}
+
+
+@pytest.mark.asyncio
+async def test_streaming_stops_at_first_complete_json_object():
+    """Streaming mode returns as soon as the answer holds a complete JSON object."""
+    consumed = []
+    chunks = _sse(
+        {"event": "message", "answer": '```json\n{"ok": tr'},
+        {"event": "message", "answer": 'ue, "items": [{"sku": "A"}]}'},
+        {"event": "error", "code": "late", "message": "should never be read"},
+    )
+
+    async def body():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["response_mode"] == "streaming"
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body())
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = DifyClient("https://dify.example.com", "token-a", http_client=http_client, response_mode="streaming")
+
+    result = await client.chatflow_async(query="q", user="u", inputs={})
+
+    assert result == {"ok": True, "items": [{"sku": "A"}]}
+    assert len(consumed) == 2
+    await http_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_streaming_error_event_fails_call():
+    """An SSE error event is surfaced as a failed result."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/event-stream"},
+            content=b"".join(_sse({"event": "error", "code": "quota", "message": "exceeded"})),
+        )
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = DifyClient("https://dify.example.com", "token-a", http_client=http_client, response_mode="streaming")
+
+    result = await client.chatflow_async(query="q", user="u", inputs={})
+
+    assert result["ok"] is False
+    assert "quota: exceeded" in result["reason"]
+    await http_client.aclose()
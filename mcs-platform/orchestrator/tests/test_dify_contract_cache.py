@@ -0,0 +1,101 @@
+"""Test content-addressed Dify contract result cache."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from mcs_contracts import (
+    Customer,
+    CustomerMatchResult,
+    EmailAttachment,
+    EmailEvent,
+    FileUploadResult,
+    MasterData,
+)
+from graphs.sales_email.nodes.call_dify_contract import node_call_dify_contract
+from graphs.sales_email.state import SalesEmailState
+from settings import Settings
+from tools.dify_client import DifyClient
+
+
+def _state() -> SalesEmailState:
+    attachment = EmailAttachment(
+        attachment_id="att1",
+        filename="contract.pdf",
+        content_type="application/pdf",
+        size=1024,
+        sha256="a" * 64,
+    )
+    email_event = EmailEvent(
+        provider="imap",
+        account="sales@example.com",
+        folder="INBOX",
+        uid="1",
+        message_id="msg1",
+        from_email="customer@example.com",
+        subject="采购合同",
+        body_text="",
+        received_at="2024-01-01T00:00:00Z",
+        attachments=[attachment],
+    )
+    return SalesEmailState(
+        email_event=email_event,
+        pdf_attachment=attachment,
+        matched_customer=CustomerMatchResult(ok=True, customer_id="c1", score=100.0),
+        file_upload=FileUploadResult(ok=True, file_url="https://files/contract.pdf", sha256="a" * 64),
+    )
+
+
+def _client(result: dict) -> DifyClient:
+    client = DifyClient("https://dify.example.com", "token")
+    client.chatflow_async = AsyncMock(return_value=result)
+    return client
+
+
+MASTERDATA = MasterData(customers=[Customer(customer_id="c1", customer_num="C001", name="Customer 1")])
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_dify_call():
+    """A cached result for the same PDF/customer/app is used without calling Dify."""
+    repo = MagicMock()
+    repo.get_dify_result.return_value = {"ok": True, "contract_meta": {"no": "HT-1"}}
+    client = _client({"ok": False})
+
+    state = await node_call_dify_contract(_state(), MASTERDATA, client, Settings(), repo)
+
+    client.chatflow_async.assert_not_awaited()
+    assert state.contract_result.ok
+    repo.put_dify_result.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_stores_only_successful_results():
+    """Successful results are stored with the TTL; failures are not cached."""
+    repo = MagicMock()
+    repo.get_dify_result.return_value = None
+    settings = Settings(dify_contract_cache_ttl_seconds=60)
+
+    await node_call_dify_contract(_state(), MASTERDATA, _client({"ok": True}), settings, repo)
+    repo.put_dify_result.assert_called_once()
+    kwargs = repo.put_dify_result.call_args.kwargs
+    assert kwargs["file_sha256"] == "a" * 64
+    assert kwargs["customer_id"] == "c1"
+    assert kwargs["ttl_seconds"] == 60
+    assert "token" not in kwargs["app_id"]
+
+    repo.put_dify_result.reset_mock()
+    await node_call_dify_contract(_state(), MASTERDATA, _client({"ok": False}), settings, repo)
+    repo.put_dify_result.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_roll_back_shared_session():
+    """A failing cache statement is rolled back so later repo calls in the run still work."""
+    repo = MagicMock()
+    repo.get_dify_result.side_effect = RuntimeError("relation does not exist")
+    repo.put_dify_result.side_effect = RuntimeError("relation does not exist")
+
+    state = await node_call_dify_contract(_state(), MASTERDATA, _client({"ok": True}), Settings(), repo)
+
+    assert state.contract_result.ok
+    assert repo.rollback.call_count == 2
@@ -0,0 +1,334 @@
+"""Test IMAP EmailListener session reuse and IDLE."""
+
+import asyncio
+import imaplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import MagicMock
+
+from listener.channel.email import EmailListener
+
+
+class FakeIMAP:
+    """Scripted imaplib connection: readline returns queued lines (exceptions are raised)."""
+
+    def __init__(self, lines=(), capabilities=("IMAP4REV1", "IDLE"), uid_validity=7, uid_next=3):
+        self.lines = list(lines)
+        self.sent: list[bytes] = []
+        self.sock = MagicMock()
+        self.capabilities = capabilities
+        self.selected: list[str] = []
+        self.search_error = None
+        self.select_info = {"UIDVALIDITY": uid_validity, "UIDNEXT": uid_next}
+        self.uid_commands: list[tuple] = []
+        self.search_result = b"1 2"
+        self.fetch_results: dict[str, list] = {}
+
+    def _new_tag(self) -> bytes:
+        return b"A001"
+
+    def send(self, data: bytes) -> None:
+        self.sent.append(data)
+
+    def readline(self) -> bytes:
+        item = self.lines.pop(0)
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def select(self, folder):
+        self.selected.append(folder)
+        return "OK", [b"3"]
+
+    def response(self, name):
+        value = self.select_info.get(name)
+        return name, [str(value).encode() if value is not None else None]
+
+    def uid(self, command, *args):
+        self.uid_commands.append((command, *args))
+        if command == "SEARCH":
+            if self.search_error:
+                raise self.search_error
+            return "OK", [self.search_result]
+        if command == "FETCH":
+            return "OK", self.fetch_results.get(args[1], [None])
+        return "OK", [None]
+
+    def close(self):
+        pass
+
+    def logout(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def _listener(connection: FakeIMAP) -> EmailListener:
+    listener = EmailListener(host="imap.example.com", user="sales@example.com", password="x")
+    listener.connection = connection
+    listener.supports_idle = "IDLE" in connection.capabilities
+    return listener
+
+
+class SocketPairIMAP(imaplib.IMAP4):
+    """Real imaplib session over one end of a socketpair."""
+
+    def __init__(self, sock: socket.socket):
+        self._pair_sock = sock
+        super().__init__()
+
+    def open(self, host="", port=imaplib.IMAP4_PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.sock = self._pair_sock
+        self.file = self.sock.makefile("rb")
+
+
+def _serve_imap(sock: socket.socket, replies: list[bytes]) -> threading.Thread:
+    """Answer each client command with the next scripted reply (TAG = the command's tag)."""
+
+    def serve():
+        f = sock.makefile("rb")
+        sock.sendall(b"* OK ready\r\n")
+        tag = b""
+        for reply in replies:
+            line = f.readline()
+            if line.strip() != b"DONE":
+                tag = line.split()[0]
+            sock.sendall(reply.replace(b"TAG", tag))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout_keeps_session_readable():
+    """An IDLE that times out leaves the socket usable; EXISTS sent with the continuation ends the next IDLE."""
+    client, server = socket.socketpair()
+    thread = _serve_imap(server, [
+        b"* CAPABILITY IMAP4rev1 IDLE\r\nTAG OK done\r\n",
+        b"+ idling\r\n",
+        b"TAG OK IDLE terminated\r\n",
+        b"+ idling\r\n* 4 EXISTS\r\n",
+        b"TAG OK IDLE terminated\r\n",
+    ])
+    connection = SocketPairIMAP(client)
+    listener = EmailListener(host="imap.example.com", user="sales@example.com", password="x", timeout=5)
+    listener.connection = connection
+    listener.supports_idle = True
+    listener._selected = "INBOX"
+
+    assert await listener.wait_for_changes(timeout=0.2, poll_interval=60) is False
+    assert await listener.wait_for_changes(timeout=60, poll_interval=60) is True
+    assert listener.connection is connection
+    # IDLE 的 tag 不会在长连接上累积
+    assert connection.tagged_commands == {}
+    thread.join(timeout=5)
+    client.close()
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_polling_fallback():
+    """Servers without IDLE fall back to sleeping poll_interval."""
+    no_idle = FakeIMAP(capabilities=("IMAP4REV1",))
+    assert await _listener(no_idle).wait_for_changes(timeout=60, poll_interval=0) is True
+    assert no_idle.sent == []
+
+
+@pytest.mark.asyncio
+async def test_session_reused_and_reconnected_once():
+    """Polls reuse the session; a dropped session is re-established and the command retried."""
+    dropped = FakeIMAP()
+    dropped.search_error = imaplib.IMAP4.abort("socket error: EOF")
+    listener = _listener(dropped)
+    fresh = FakeIMAP()
+
+    def connect_sync():
+        listener.connection = fresh
+        listener.supports_idle = True
+
+    listener._connect_sync = connect_sync
+
+    assert await listener.poll_new_messages() == ["1", "2"]
+    assert listener.connection is fresh
+    assert fresh.uid_commands[0] == ("SEARCH", None, "UNSEEN")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reconnects_open_one_session():
+    """Operations that find the session gone at the same time share one reconnect."""
+    listener = _listener(FakeIMAP())
+    listener.connection = None
+    sessions = []
+
+    def connect_sync():
+        time.sleep(0.05)
+        sessions.append(FakeIMAP())
+        listener.connection = sessions[-1]
+
+    listener._connect_sync = connect_sync
+    listener._executor = ThreadPoolExecutor(max_workers=4)
+
+    await asyncio.gather(listener.connect(), listener.connect(), listener.connect())
+
+    assert len(sessions) == 1
+    assert listener.connection is sessions[0]
+
+
+@pytest.mark.asyncio
+async def test_uid_checkpoint_fetches_only_new_uids():
+    """After a checkpoint only UIDs above it are searched; UIDVALIDITY change re-baselines."""
+    connection = FakeIMAP(uid_validity=7, uid_next=11)
+    connection.search_result = b"4 9"
+    repo = MagicMock()
+    repo.get_sync_state.return_value = None
+    listener = _listener(connection)
+    listener.repo = repo
+
+    # 首次：以未读邮件为基线，检查点推进到 UIDNEXT - 1，失败的 UID 记入重试列表
+    assert await listener.poll_new_messages() == ["4", "9"]
+    await listener.commit_poll(["9"])
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 10, retry_ids={"9": 1}, dead_ids={}
+    )
+
+    connection.select_info["UIDNEXT"] = 13
+    connection.search_result = b"12"
+    assert await listener.poll_new_messages() == ["9", "12"]
+    assert connection.uid_commands[-2] == ("SEARCH", None, "UID", "11:*")
+    assert connection.uid_commands[-1][:2] == ("FETCH", "9,12")
+    await listener.commit_poll([])
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 12, retry_ids={}, dead_ids={}
+    )
+
+    # UIDNEXT 未变：不发 SEARCH
+    commands = len(connection.uid_commands)
+    assert await listener.poll_new_messages() == []
+    assert len(connection.uid_commands) == commands
+
+    connection.select_info["UIDVALIDITY"] = 8
+    connection.search_result = b"2"
+    assert await listener.poll_new_messages() == ["2"]
+    assert connection.uid_commands[-2] == ("SEARCH", None, "UNSEEN")
+
+
+@pytest.mark.asyncio
+async def test_failing_uid_moves_to_dead_letter_until_requeued():
+    """A UID that keeps failing goes to dead_ids after max_attempts; a requeue offers it again."""
+    connection = FakeIMAP(uid_validity=7, uid_next=6)
+    repo = MagicMock()
+    repo.get_sync_state.return_value = SimpleNamespace(
+        uid_validity=7, last_uid=5, retry_ids={"3": 1}, dead_ids=None
+    )
+    repo.take_requeued_messages.return_value = []
+    listener = _listener(connection)
+    listener.repo = repo
+    listener.max_attempts = 3
+
+    assert await listener.poll_new_messages() == ["3"]
+    await listener.commit_poll(["3"])
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 5, retry_ids={"3": 2}, dead_ids={}
+    )
+
+    # 依赖不可用：不计失败次数
+    assert await listener.poll_new_messages() == ["3"]
+    await listener.commit_poll([], ["3"])
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 5, retry_ids={"3": 2}, dead_ids={}
+    )
+
+    connection.select_info["UIDNEXT"] = 8
+    connection.search_result = b"7"
+    assert await listener.poll_new_messages() == ["3", "7"]
+    await listener.commit_poll(["3"])
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 7, retry_ids={}, dead_ids={"3": 3}
+    )
+    assert await listener.poll_new_messages() == []
+
+    repo.take_requeued_messages.return_value = ["3"]
+    await listener.commit_poll([])
+    repo.take_requeued_messages.assert_called_with("imap", "sales@example.com", "INBOX")
+    repo.save_sync_state.assert_called_with(
+        "imap", "sales@example.com", "INBOX", 7, 7, retry_ids={"3": 0}, dead_ids={}
+    )
+    assert await listener.poll_new_messages() == ["3"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_message_downloads_only_text_and_pdf_parts():
+    """Envelope comes from the prefetched structure; only text and PDF sections are downloaded."""
+    connection = FakeIMAP()
+    header = b"Message-ID: <m1@example.com>\r\nFrom: customer@example.com\r\nSubject: =?UTF-8?B?6YeH6LSt5ZCI5ZCM?=\r\n\r\n"
+    connection.fetch_results["5"] = [
+        (
+            b'1 (UID 5 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "BASE64" 12 1 NIL NIL NIL NIL)'
+            b'("IMAGE" "PNG" ("NAME" "logo.png") NIL NIL "BASE64" 4000 NIL ("ATTACHMENT" ("FILENAME" "logo.png")) NIL NIL)'
+            b'("APPLICATION" "PDF" ("NAME" "contract.pdf") NIL NIL "BASE64" 16 NIL ("ATTACHMENT" ("FILENAME" "contract.pdf")) NIL NIL)'
+            b' "MIXED" ("BOUNDARY" "b1") NIL NIL NIL) BODY[HEADER] {%d}' % len(header),
+            header,
+        ),
+        b")",
+    ]
+    listener = _listener(connection)
+
+    def fetch(command, *args):
+        connection.uid_commands.append((command, *args))
+        if args[1].startswith("(UID BODYSTRUCTURE"):
+            return "OK", connection.fetch_results["5"]
+        assert args[1] == "(BODY.PEEK[1] BODY.PEEK[3])"
+        return "OK", [(b"1 (UID 5 BODY[1] {8}", b"5L2g5aW9"), (b" BODY[3] {12}", b"JVBERi0xLjQ="), b")"]
+
+    connection.uid = fetch
+    envelope = await listener.fetch_envelope("5")
+    assert envelope["from"] == "customer@example.com"
+    assert envelope["has_attachments"] is True
+    assert "attachments" not in envelope
+    assert len(connection.uid_commands) == 1
+
+    message = await listener.fetch_message("5")
+    # 信封阶段已取到的 BODYSTRUCTURE 不会再次请求
+    assert len(connection.uid_commands) == 2
+
+    assert message["message_id"] == "<m1@example.com>"
+    assert message["body"] == "你好"
+    assert [att["filename"] for att in message["attachments"]] == ["logo.png", "contract.pdf"]
+    assert message["attachments"][0]["payload"] is None
+    assert message["attachments"][0]["size"] == 3000
+    assert message["attachments"][1]["payload"] == b"%PDF-1.4"
+
+
+def test_requeue_dead_messages_is_taken_once():
+    """Only dead ids are queued; the listener takes the queued ids exactly once."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from listener.db.models import MailboxSyncState
+    from listener.repo import ListenerRepo
+
+    engine = create_engine("sqlite://")
+    MailboxSyncState.__table__.create(engine)
+    session = Session(engine)
+    session.add(
+        MailboxSyncState(
+            provider="imap", account="sales@example.com", folder="INBOX", dead_ids={"3": 5, "4": 5}
+        )
+    )
+    session.commit()
+    repo = ListenerRepo(session)
+
+    assert repo.requeue_dead_messages("imap", "sales@example.com", "INBOX", ["3", "9"]) == ["3"]
+    assert repo.requeue_dead_messages("imap", "sales@example.com", "INBOX") == ["3", "4"]
+    assert repo.take_requeued_messages("imap", "sales@example.com", "INBOX") == ["3", "4"]
+    assert repo.take_requeued_messages("imap", "sales@example.com", "INBOX") == []
+    assert repo.requeue_dead_messages("imap", "sales@example.com", "Archive") == []
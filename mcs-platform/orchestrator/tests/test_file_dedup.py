@@ -0,0 +1,227 @@
+"""Test content-addressed attachment storage, references and upload reuse."""
+
+import base64
+import hashlib
+from types import SimpleNamespace
+from uuid import uuid4
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from mcs_contracts import EmailAttachment, EmailEvent, FileUploadResult
+from observability.retry import CircuitBreaker
+from graphs.sales_email.nodes.upload_pdf import node_upload_pdf
+from graphs.sales_email.state import SalesEmailState
+from listener.processors.email import EmailProcessor
+from tools.attachment_store import AttachmentStore
+from tools.file_server import FileServerClient
+
+PDF = b"%PDF-1.4 contract"
+PDF_SHA256 = hashlib.sha256(PDF).hexdigest()
+
+
+def _state() -> SalesEmailState:
+    attachment = EmailAttachment(
+        attachment_id="att1",
+        filename="contract.pdf",
+        content_type="application/pdf",
+        size=len(PDF),
+        sha256=PDF_SHA256,
+        bytes_b64=base64.b64encode(PDF).decode(),
+    )
+    email_event = EmailEvent(
+        provider="imap",
+        account="sales@example.com",
+        folder="INBOX",
+        uid="1",
+        message_id="msg1",
+        from_email="customer@example.com",
+        subject="采购合同",
+        body_text="",
+        received_at="2024-01-01T00:00:00Z",
+        attachments=[attachment],
+    )
+    return SalesEmailState(email_event=email_event, pdf_attachment=attachment)
+
+
+@pytest.mark.asyncio
+async def test_save_blob_stores_identical_content_once(tmp_path):
+    """Same content from different emails maps to one blob path and is written once."""
+    client = FileServerClient("https://files.example.com", "")
+
+    first = await client.save_blob(PDF, str(tmp_path))
+    blob = tmp_path / first
+    mtime = blob.stat().st_mtime_ns
+    second = await client.save_blob(PDF, str(tmp_path), sha256=PDF_SHA256)
+
+    assert first == second == f"blobs/{PDF_SHA256[:2]}/{PDF_SHA256}"
+    assert blob.read_bytes() == PDF
+    assert blob.stat().st_mtime_ns == mtime
+    assert [p.name for p in blob.parent.iterdir()] == [PDF_SHA256]
+
+
+@pytest.mark.asyncio
+async def test_upload_reuses_known_file_url():
+    """A PDF already uploaded (by sha256) is not decoded or uploaded again."""
+    repo = MagicMock()
+    repo.get_file_upload.return_value = SimpleNamespace(file_url="https://files/abc.pdf", file_id="f1")
+    repo.get_idempotency_record.return_value = None
+    file_server = MagicMock()
+
+    state = await node_upload_pdf(_state(), file_server, repo)
+
+    file_server.upload_file_async.assert_not_called()
+    assert state.file_upload.ok
+    assert state.file_upload.file_url == "https://files/abc.pdf"
+    assert state.file_upload.sha256 == PDF_SHA256
+
+
+@pytest.mark.asyncio
+async def test_upload_records_new_content():
+    """First upload of a PDF is recorded in the sha256 index."""
+    repo = MagicMock()
+    repo.get_file_upload.return_value = None
+    repo.get_idempotency_record.return_value = None
+    file_server = MagicMock()
+    file_server.upload_file_async = AsyncMock(
+        return_value=FileUploadResult(ok=True, file_url="https://files/new.pdf", file_id="f2", sha256=PDF_SHA256)
+    )
+
+    state = await node_upload_pdf(_state(), file_server, repo)
+
+    assert file_server.upload_file_async.call_args.args[0] == PDF
+    repo.put_file_upload.assert_called_once_with(
+        PDF_SHA256, file_url="https://files/new.pdf", file_id="f2", size=len(PDF)
+    )
+    assert state.file_upload.file_url == "https://files/new.pdf"
+
+
+@pytest.mark.asyncio
+async def test_upload_index_errors_roll_back_shared_session():
+    """A failing file_uploads statement is rolled back before the idempotency upsert runs."""
+    repo = MagicMock()
+    repo.get_file_upload.side_effect = RuntimeError("relation file_uploads does not exist")
+    repo.put_file_upload.side_effect = RuntimeError("relation file_uploads does not exist")
+    repo.get_idempotency_record.return_value = None
+    file_server = MagicMock()
+    file_server.upload_file_async = AsyncMock(
+        return_value=FileUploadResult(ok=True, file_url="https://files/new.pdf", sha256=PDF_SHA256)
+    )
+
+    state = await node_upload_pdf(_state(), file_server, repo)
+
+    assert state.file_upload.ok
+    assert repo.rollback.call_count == 2
+    repo.upsert_idempotency_record.assert_called_once()
+
+
+def test_reference_mode_carries_file_id_instead_of_bytes():
+    """Stored attachments travel as file_id + sha256; unstored ones stay inline."""
+    file_id = str(uuid4())
+    message = {
+        "message_id": "msg1",
+        "from": "customer@example.com",
+        "attachments": [
+            {"filename": "contract.pdf", "content_type": "application/pdf", "payload": PDF, "file_id": file_id},
+            {"filename": "note.txt", "content_type": "text/plain", "payload": b"note"},
+        ],
+    }
+
+    stored, unstored = EmailProcessor(inline_payloads=False).parse_to_event(message).attachments
+
+    assert stored.bytes_b64 is None
+    assert stored.file_id == file_id
+    assert stored.sha256 == PDF_SHA256
+    assert stored.size == len(PDF)
+    assert base64.b64decode(unstored.bytes_b64) == b"note"
+
+    inline = EmailProcessor().parse_to_event(message).attachments[0]
+    assert base64.b64decode(inline.bytes_b64) == PDF
+
+
+@pytest.mark.asyncio
+async def test_upload_reads_referenced_attachment_from_store(tmp_path):
+    """Without inline bytes the node streams the stored blob from disk."""
+    blob_path = await FileServerClient("https://files.example.com", "").save_blob(PDF, str(tmp_path))
+    listener_repo = MagicMock()
+    listener_repo.get_attachment_file.return_value = SimpleNamespace(file_path=blob_path)
+    store = AttachmentStore(lambda: listener_repo, base_dir=str(tmp_path))
+
+    state = _state()
+    state.pdf_attachment = state.pdf_attachment.model_copy(update={"bytes_b64": None, "file_id": str(uuid4())})
+    repo = MagicMock()
+    repo.get_file_upload.return_value = None
+    repo.get_idempotency_record.return_value = None
+    file_server = MagicMock()
+    file_server.upload_file_async = AsyncMock(
+        return_value=FileUploadResult(ok=True, file_url="https://files/new.pdf", sha256=PDF_SHA256)
+    )
+
+    state = await node_upload_pdf(state, file_server, repo, store)
+
+    assert file_server.upload_file_async.call_args.args[0] == tmp_path / blob_path
+    assert state.file_upload.ok
+
+
+@pytest.mark.asyncio
+async def test_upload_file_async_streams_multipart_and_retries(tmp_path):
+    """Async upload streams the file as multipart over the pooled client and retries 5xx."""
+    path = tmp_path / "contract.pdf"
+    path.write_bytes(PDF)
+    bodies = []
+
+    async def handler(request):
+        bodies.append((request.headers, await request.aread()))
+        if len(bodies) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"file_url": "https://files/contract.pdf", "file_id": "f1"})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = FileServerClient("https://files.example.com", "key", http_client=http_client)
+    client.breaker = CircuitBreaker("test-file-server")
+    progress = []
+
+    with patch("observability.retry.asyncio.sleep", AsyncMock()):
+        result = await client.upload_file_async(
+            path,
+            "合同.pdf",
+            "application/pdf",
+            sha256=PDF_SHA256,
+            on_progress=lambda sent, total: progress.append((sent, total)),
+        )
+
+    assert result.ok and result.file_url == "https://files/contract.pdf"
+    assert len(bodies) == 2
+    headers, body = bodies[-1]
+    assert headers["X-API-Key"] == "key"
+    assert int(headers["Content-Length"]) == len(body)
+    assert 'filename="合同.pdf"'.encode() in body
+    assert PDF in body
+    assert progress[-1] == (len(PDF), len(PDF))
+    await http_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_upload_file_async_rejects_file_not_matching_sha256(tmp_path):
+    """A stored file whose bytes changed is not uploaded under the recorded sha256."""
+    path = tmp_path / "contract.pdf"
+    path.write_bytes(b"%PDF-tampered")
+    received = []
+
+    async def handler(request):
+        received.append(await request.aread())
+        return httpx.Response(200, json={"file_url": "https://files/contract.pdf", "file_id": "f1"})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = FileServerClient("https://files.example.com", "key", http_client=http_client)
+    client.breaker = CircuitBreaker("test-file-server")
+
+    result = await client.upload_file_async(path, "contract.pdf", "application/pdf", sha256=PDF_SHA256)
+
+    assert not result.ok
+    assert result.errors[0].code == "FILE_UPLOAD_FAILED"
+    assert received == []
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    await http_client.aclose()
+
@@ -0,0 +1,56 @@
+"""Test the attachment download route."""
+
+import hashlib
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.deps import get_listener_repo
+from api.routes import file as file_routes
+
+PDF = b"%PDF-1.4 contract"
+PDF_SHA256 = hashlib.sha256(PDF).hexdigest()
+
+
+def test_file_download_supports_range_and_conditional_get(tmp_path, monkeypatch):
+    """Download streams from disk with a sha256 ETag, honours Range and answers 304."""
+    monkeypatch.chdir(tmp_path)
+    blob = tmp_path / "public" / "files" / "blobs" / PDF_SHA256[:2] / PDF_SHA256
+    blob.parent.mkdir(parents=True)
+    blob.write_bytes(PDF)
+
+    file_id = uuid4()
+    repo = MagicMock()
+    repo.get_attachment_file.return_value = SimpleNamespace(
+        message_id="msg1",
+        file_path=f"blobs/{PDF_SHA256[:2]}/{PDF_SHA256}",
+        sha256=PDF_SHA256,
+        filename="合同.pdf",
+        content_type="application/pdf",
+    )
+    app = FastAPI()
+    app.include_router(file_routes.router)
+    app.dependency_overrides[get_listener_repo] = lambda: repo
+    client = TestClient(app)
+    url = f"/v1/file/msg1?file_id={file_id}"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert response.headers["etag"] == f'"{PDF_SHA256}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "filename*=utf-8''" in response.headers["content-disposition"]
+
+    partial = client.get(url, headers={"Range": "bytes=5-7"})
+    assert partial.status_code == 206
+    assert partial.content == PDF[5:8]
+    assert partial.headers["content-range"] == f"bytes 5-7/{len(PDF)}"
+
+    not_modified = client.get(url, headers={"If-None-Match": f'W/"{PDF_SHA256}"'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    assert client.get(f"/v1/file/other?file_id={file_id}").status_code == 404
@@ -0,0 +1,109 @@
+"""Test process-wide compiled graph cache."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from mcs_contracts import EmailEvent, MasterData, StatusEnum
+from graphs.registry import GraphInfo, GraphRegistry, graph_registry
+from graphs.sales_email.graph import (
+    SALES_EMAIL_GRAPH_NAME,
+    SalesEmailDeps,
+    build_run_config,
+)
+from graphs.sales_email.state import SalesEmailState
+
+
+def test_get_compiled_builds_once_per_checkpointer():
+    """Compiled graph is built once and reused for the same checkpointer."""
+    build = MagicMock(side_effect=lambda checkpointer: object())
+    registry = GraphRegistry()
+    registry.register(
+        GraphInfo(
+            name="g",
+            version="1",
+            input_model=EmailEvent,
+            output_model=EmailEvent,
+            build_callable=build,
+        )
+    )
+    checkpointer = MemorySaver()
+
+    first = registry.get_compiled("g", checkpointer=checkpointer)
+    second = registry.get_compiled("g", checkpointer=checkpointer)
+    assert first is second
+    assert build.call_count == 1
+
+    other = registry.get_compiled("g", checkpointer=MemorySaver())
+    assert other is not first
+    assert build.call_count == 2
+
+    with pytest.raises(KeyError):
+        registry.get_compiled("missing", checkpointer=checkpointer)
+
+
+@pytest.mark.asyncio
+async def test_shared_graph_takes_deps_from_run_config():
+    """Shared sales_email graph resolves node dependencies from the run config."""
+    graph = graph_registry.get_compiled(SALES_EMAIL_GRAPH_NAME, checkpointer=MemorySaver())
+
+    masterdata_service = MagicMock()
+    masterdata_service.load_snapshot_async = AsyncMock(return_value=(7, MasterData()))
+    masterdata_service.get_snapshot_async = AsyncMock(return_value=MasterData())
+    mailer = MagicMock()
+    deps = SalesEmailDeps(
+        settings=MagicMock(),
+        db_repo=MagicMock(),
+        masterdata_service=masterdata_service,
+        file_server=MagicMock(),
+        dify_contract_client=MagicMock(),
+        dify_order_client=MagicMock(),
+        mailer=mailer,
+        gateway_service=MagicMock(),
+    )
+    email_event = EmailEvent(
+        provider="imap",
+        account="sales@example.com",
+        folder="INBOX",
+        uid="123",
+        message_id="msg1",
+        from_email="unknown@example.com",
+        subject="Test",
+        body_text="Test",
+        received_at="2024-01-01T00:00:00Z",
+    )
+    initial_state = SalesEmailState(email_event=email_event, run_id="run1")
+
+    result = await graph.ainvoke(initial_state.model_dump(), build_run_config("run1", deps))
+
+    final_state = SalesEmailState(**result)
+    assert final_state.final_status == StatusEnum.UNKNOWN_CONTACT
+    assert final_state.masterdata_version == 7
+    masterdata_service.load_snapshot_async.assert_awaited_once()
+    masterdata_service.get_snapshot_async.assert_awaited_with(7)
+    mailer.send_email.assert_called()
+    deps.db_repo.update_run_status.assert_called()
+
+    # Checkpointed state carries only the snapshot version, not the master data tables
+    snapshot = await graph.aget_state(build_run_config("run1", deps))
+    assert "masterdata" not in snapshot.values
+    assert snapshot.values["masterdata_version"] == 7
+
+
+def test_orchestration_service_requires_shared_checkpointer():
+    """Services never create their own checkpointer (it would leak a store and a compiled graph)."""
+    from services.orchestration_service import OrchestrationService
+
+    with pytest.raises(ValueError):
+        OrchestrationService(
+            settings=MagicMock(),
+            repo=MagicMock(),
+            masterdata_service=MagicMock(),
+            file_server=MagicMock(),
+            dify_contract_client=MagicMock(),
+            dify_order_client=MagicMock(),
+            mailer=MagicMock(),
+            gateway_service=MagicMock(),
+            checkpointer=None,
+        )
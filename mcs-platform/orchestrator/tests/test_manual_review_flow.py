@@ -76,7 +76,6 @@ async def test_generate_candidates_on_manual_review():
             )
         ],
     )
-    state.masterdata = masterdata
 
     # Set matched customer with low score
     state.matched_customer = CustomerMatchResult(
@@ -89,7 +88,7 @@ async def test_generate_candidates_on_manual_review():
         errors=[ErrorInfo(code="CUSTOMER_MATCH_LOW_SCORE", reason="Score too low")],
     )
 
-    candidates = generate_manual_review_candidates(state)
+    candidates = generate_manual_review_candidates(state, masterdata)
 
     assert len(candidates.pdfs) == 2
     assert len(candidates.customers) == 2
@@ -131,8 +130,6 @@ async def test_resume_from_node():
             Customer(customer_id="c1", customer_num="C001", name="Customer 1"),
         ],
     )
-    state.masterdata = masterdata
-
     repo = MagicMock(spec=OrchestratorRepo)
     repo.get_idempotency_record.return_value = None
 
@@ -180,8 +177,6 @@ async def test_resume_idempotency_hit():
             Customer(customer_id="c1", customer_num="C001", name="Customer 1"),
         ],
     )
-    state.masterdata = masterdata
-
     repo = MagicMock(spec=OrchestratorRepo)
     from db.models import IdempotencyRecord
     from datetime import datetime
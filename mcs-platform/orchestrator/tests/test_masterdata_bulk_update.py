@@ -0,0 +1,40 @@
+"""Test delta-based masterdata bulk update."""
+
+from unittest.mock import MagicMock
+
+from mcs_contracts import MasterData
+from internal.repo import MasterDataRepo, diff_rows
+
+
+def test_diff_rows_splits_inserts_updates_deletes():
+    """Only new, changed and missing rows are reported."""
+    current = {
+        "c1": {"customer_id": "c1", "name": "A"},
+        "c2": {"customer_id": "c2", "name": "B"},
+        "c3": {"customer_id": "c3", "name": "C"},
+    }
+    incoming = {
+        "c1": {"customer_id": "c1", "name": "A"},
+        "c2": {"customer_id": "c2", "name": "B2"},
+        "c4": {"customer_id": "c4", "name": "D"},
+    }
+
+    inserts, updates, delete_ids = diff_rows(current, incoming)
+
+    assert inserts == [{"customer_id": "c4", "name": "D"}]
+    assert updates == [{"customer_id": "c2", "name": "B2"}]
+    assert delete_ids == ["c3"]
+
+
+def test_bulk_update_without_changes_skips_version_bump():
+    """An unchanged payload writes nothing and does not bump the version."""
+    session = MagicMock()
+    session.execute.return_value = []
+    repo = MasterDataRepo(session)
+    repo._add_version = MagicMock()
+
+    stats = repo.bulk_update(MasterData())
+
+    assert all(counts == {"inserted": 0, "updated": 0, "deleted": 0} for counts in stats.values())
+    repo._add_version.assert_not_called()
+    session.commit.assert_called_once()
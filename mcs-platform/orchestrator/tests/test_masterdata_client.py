@@ -0,0 +1,92 @@
+"""Test incremental masterdata client sync."""
+
+import json
+
+import httpx
+import pytest
+
+from tools.masterdata_client import MasterDataClient
+
+
+def _ndjson(version: int, rows: list[tuple[str, dict]]) -> str:
+    lines = [{"type": "meta", "version": version, "since_version": None, "full": True}]
+    lines += [{"type": "row", "table": table, "data": data} for table, data in rows]
+    lines.append({"type": "end", "version": version, "count": len(rows)})
+    return "\n".join(json.dumps(line) for line in lines) + "\n"
+
+
+class FakeServer:
+    """Serves /all (NDJSON) and /changes from canned payloads and records requests."""
+
+    def __init__(self):
+        self.requests: list[str] = []
+        self.changes: dict = {}
+        self.snapshot = _ndjson(
+            1,
+            [
+                ("customers", {"customer_id": "c1", "customer_num": "C001", "name": "Customer 1"}),
+                (
+                    "contacts",
+                    {"contact_id": "ct1", "email": "a@example.com", "name": "A", "customer_id": "c1"},
+                ),
+            ],
+        )
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        if request.url.path == "/v1/masterdata/all":
+            return httpx.Response(200, text=self.snapshot)
+        if request.url.path == "/v1/masterdata/changes":
+            return httpx.Response(200, json=self.changes)
+        return httpx.Response(404)
+
+
+def _client(server: FakeServer) -> MasterDataClient:
+    http = httpx.AsyncClient(base_url="http://md", transport=httpx.MockTransport(server.handler))
+    return MasterDataClient("http://md", "", cache_ttl=0, client=http)
+
+
+@pytest.mark.asyncio
+async def test_client_applies_change_log_after_initial_snapshot():
+    """After the first full load, only changes since the local version are fetched."""
+    server = FakeServer()
+    client = _client(server)
+
+    masterdata = await client.get_all()
+    assert masterdata.get_customer_by_id("c1").name == "Customer 1"
+
+    server.changes = {
+        "version": 3,
+        "since_version": 1,
+        "truncated": False,
+        "changes": [
+            {
+                "version": 2,
+                "table": "customers",
+                "id": "c1",
+                "op": "upsert",
+                "data": {"customer_id": "c1", "customer_num": "C001", "name": "Renamed"},
+            },
+            {"version": 3, "table": "contacts", "id": "ct1", "op": "delete", "data": None},
+        ],
+    }
+    updated = await client.get_all()
+
+    assert server.requests == ["/v1/masterdata/all", "/v1/masterdata/changes"]
+    assert updated.get_customer_by_id("c1").name == "Renamed"
+    assert updated.get_contact_by_email("a@example.com") is None
+    # previous copy is untouched for readers still holding it
+    assert masterdata.get_customer_by_id("c1").name == "Customer 1"
+
+
+@pytest.mark.asyncio
+async def test_client_falls_back_to_snapshot_when_log_truncated():
+    """A truncated change log triggers a full snapshot reload."""
+    server = FakeServer()
+    client = _client(server)
+    await client.get_all()
+
+    server.changes = {"version": 9, "since_version": 1, "truncated": True, "changes": []}
+    await client.get_all()
+
+    assert server.requests == ["/v1/masterdata/all", "/v1/masterdata/changes", "/v1/masterdata/all"]
@@ -0,0 +1,123 @@
+"""Test streaming NDJSON masterdata export."""
+
+import json
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mcs_contracts import Customer
+from internal.cache.snapshot_store import MasterDataSnapshotStore
+from internal.cache.version_memo import VersionMemo
+from services.masterdata_service import MasterDataService
+
+
+def _service(version: int) -> tuple[MasterDataService, MagicMock]:
+    repo = MagicMock()
+    repo.get_version.return_value = version
+    repo.iter_table.side_effect = lambda table, since=None: iter(
+        [Customer(customer_id="c1", customer_num="C001", name="Customer 1")] if table == "customers" else []
+    )
+    service = MasterDataService(repo, snapshots=MasterDataSnapshotStore(), version_memo=VersionMemo())
+    return service, repo
+
+
+def _records(service: MasterDataService, **kwargs) -> list[dict]:
+    return [json.loads(line) for line in b"".join(service.export_ndjson(**kwargs)).splitlines()]
+
+
+def test_export_full_streams_rows_between_meta_and_end():
+    """Full export emits meta, one line per row, and an end marker."""
+    service, repo = _service(5)
+
+    records = _records(service)
+
+    assert records[0] == {"type": "meta", "version": 5, "since_version": None, "full": True}
+    assert records[1]["table"] == "customers"
+    assert records[1]["data"]["customer_id"] == "c1"
+    assert records[-1] == {"type": "end", "version": 5, "count": 1}
+    assert all(call.kwargs["since"] is None for call in repo.iter_table.call_args_list)
+
+
+def test_export_since_version_filters_by_version_timestamp():
+    """since_version streams only rows updated after that version."""
+    service, repo = _service(5)
+    since = datetime(2024, 1, 1)
+    repo.get_version_updated_at.return_value = since
+    repo.get_oldest_change_version.return_value = 2
+    repo.get_changes.return_value = []
+
+    records = _records(service, since_version=3)
+
+    assert records[0]["full"] is False
+    repo.get_version_updated_at.assert_called_once_with(3)
+    assert all(call.kwargs["since"] == since for call in repo.iter_table.call_args_list)
+
+
+def test_export_since_version_emits_deleted_rows():
+    """Deltas carry delete lines from the change log; a truncated log falls back to a full export."""
+    service, repo = _service(5)
+    repo.get_version_updated_at.return_value = datetime(2024, 1, 1)
+    repo.get_oldest_change_version.return_value = 3
+    repo.get_changes.return_value = [
+        {"version": 4, "table": "customers", "id": "c2", "op": "delete", "data": None},
+        {"version": 4, "table": "customers", "id": "c3", "op": "delete", "data": None},
+        {"version": 5, "table": "customers", "id": "c3", "op": "upsert", "data": {}},  # 删除后重建
+        {"version": 5, "table": "products", "id": "p1", "op": "delete", "data": None},
+    ]
+
+    records = _records(service, since_version=3, tables=("customers",))
+
+    assert [r for r in records if r["type"] == "delete"] == [{"type": "delete", "table": "customers", "id": "c2"}]
+    assert records[-1] == {"type": "end", "version": 5, "count": 2}
+    repo.get_changes.assert_called_once_with(3)
+
+    records = _records(service, since_version=1, tables=("customers",))
+    assert records[0]["full"] is True
+    assert all(r["type"] != "delete" for r in records)
+
+
+def test_export_up_to_date_emits_no_rows():
+    """A client already at the current version gets only meta and end."""
+    service, repo = _service(5)
+
+    records = _records(service, since_version=5)
+
+    assert [r["type"] for r in records] == ["meta", "end"]
+    repo.iter_table.assert_not_called()
+
+
+def test_get_changes_reports_truncated_log():
+    """Changes are served only while the log still covers the client's version."""
+    service, repo = _service(10)
+    repo.get_oldest_change_version.return_value = 6
+    repo.get_changes.return_value = [{"version": 10, "table": "customers", "id": "c1", "op": "delete", "data": None}]
+
+    assert service.get_changes(5)["truncated"] is False
+    repo.get_changes.assert_called_once_with(5)
+
+    result = service.get_changes(4)
+    assert result["truncated"] is True
+    assert result["changes"] == []
+
+    assert service.get_changes(10) == {"version": 10, "since_version": 10, "truncated": False, "changes": []}
+
+
+def test_export_reads_from_its_own_session_and_closes_it():
+    """Streaming outlives the request session: the export uses its own session, then closes it."""
+    request_repo = MagicMock()
+    stream_repo = MagicMock()
+    stream_repo.get_version.return_value = 5
+    stream_repo.iter_table.side_effect = lambda table, since=None: iter([])
+    service = MasterDataService(
+        request_repo,
+        snapshots=MasterDataSnapshotStore(),
+        version_memo=VersionMemo(),
+        repo_factory=lambda: stream_repo,
+    )
+
+    lines = service.export_ndjson(("customers",))
+    assert json.loads(next(lines))["version"] == 5
+    stream_repo.session.close.assert_not_called()
+    assert [json.loads(line)["type"] for line in lines] == ["end"]
+
+    stream_repo.session.close.assert_called_once()
+    request_repo.get_version.assert_not_called()
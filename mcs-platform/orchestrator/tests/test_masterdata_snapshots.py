@@ -0,0 +1,137 @@
+"""Test versioned masterdata snapshots."""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from mcs_contracts import Customer, MasterData
+from internal.cache.snapshot_store import MasterDataSnapshotStore
+from internal.cache.version_memo import VersionMemo
+from services.masterdata_service import MasterDataService
+
+
+def _service(version: int, masterdata: MasterData, store: MasterDataSnapshotStore) -> MasterDataService:
+    repo = MagicMock()
+    repo.get_version.return_value = version
+    repo.get_all_masterdata.return_value = masterdata
+    return MasterDataService(repo, snapshots=store, version_memo=VersionMemo(ttl_seconds=0))
+
+
+def test_snapshot_store_evicts_oldest_version():
+    """Store keeps only the most recent max_versions snapshots."""
+    store = MasterDataSnapshotStore(max_versions=2)
+    for version in (1, 2, 3):
+        store.put(version, MasterData())
+
+    assert store.get(1) is None
+    assert store.get(2) is not None
+    assert store.get(3) is not None
+
+
+def test_get_snapshot_resolves_version_across_services():
+    """Snapshot loaded by one service instance is resolved by version from another."""
+    store = MasterDataSnapshotStore()
+    v1 = MasterData(customers=[Customer(customer_id="c1", customer_num="C001", name="Old")])
+    version, loaded = _service(1, v1, store).load_snapshot()
+    assert version == 1
+    assert loaded is v1
+
+    # Master data updated after the run started: the run still sees its version
+    v2 = MasterData(customers=[Customer(customer_id="c1", customer_num="C001", name="New")])
+    service = _service(2, v2, store)
+    assert service.get_snapshot(1).get_customer_by_id("c1").name == "Old"
+    assert service.get_snapshot(None).get_customer_by_id("c1").name == "New"
+
+    # Evicted version falls back to the current data
+    store.invalidate()
+    assert service.get_snapshot(1).get_customer_by_id("c1").name == "New"
+
+
+@pytest.mark.asyncio
+async def test_get_all_async_single_flight_db_load():
+    """Concurrent cold-cache misses trigger a single DB load."""
+    repo = MagicMock()
+    repo.get_version.return_value = 11
+
+    def load():
+        time.sleep(0.05)
+        return MasterData()
+
+    repo.get_all_masterdata.side_effect = load
+    service = MasterDataService(repo, snapshots=MasterDataSnapshotStore(), version_memo=VersionMemo())
+
+    results = await asyncio.gather(*(service.get_all_async() for _ in range(5)))
+
+    assert repo.get_all_masterdata.call_count == 1
+    assert all(result is results[0] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_get_all_async_prefers_redis_tier():
+    """Redis hit fills the memory tier without touching the DB."""
+    repo = MagicMock()
+    repo.get_version.return_value = 3
+    redis_cache = MagicMock()
+    redis_cache.get_all = AsyncMock(return_value=MasterData())
+    redis_cache.set_all = AsyncMock()
+    service = MasterDataService(
+        repo, snapshots=MasterDataSnapshotStore(), redis_cache=redis_cache, version_memo=VersionMemo()
+    )
+
+    await service.get_all_async()
+    await service.get_all_async()
+
+    redis_cache.get_all.assert_awaited_once_with(3)
+    repo.get_all_masterdata.assert_not_called()
+
+    # Invalidation from another replica drops the memory tier only
+    await service._on_version_bump(4)
+    assert service.cache.get_all(3) is None
+    assert await service.get_all_async() is not None
+    assert repo.get_version.call_count == 1  # version 4 came from the broadcast, not the DB
+
+
+def test_version_memo_skips_db_round_trip_until_write():
+    """Cache hits reuse the memoized version; a local write forces a fresh read."""
+    repo = MagicMock()
+    repo.get_version.return_value = 1
+    repo.get_all_masterdata.return_value = MasterData()
+    service = MasterDataService(repo, snapshots=MasterDataSnapshotStore(), version_memo=VersionMemo())
+
+    service.get_all()
+    service.get_all()
+    assert repo.get_version.call_count == 1
+    assert repo.get_all_masterdata.call_count == 1
+
+    repo.get_version.return_value = 2
+    service.create_customer(Customer(customer_id="c2", customer_num="C002", name="New"))
+    service.get_all()
+    assert repo.get_all_masterdata.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_db_calls_use_own_session_per_thread():
+    """Worker-thread DB calls get a fresh repo/session each; the shared session is never touched."""
+    shared = MagicMock()
+    created = []
+
+    def repo_factory():
+        repo = MagicMock()
+        repo.get_version.return_value = 5
+        repo.get_all_masterdata.return_value = MasterData()
+        created.append(repo)
+        return repo
+
+    service = MasterDataService(
+        shared, snapshots=MasterDataSnapshotStore(), version_memo=VersionMemo(), repo_factory=repo_factory
+    )
+
+    await service.get_all_async()
+
+    assert len(created) == 2  # version lookup + full load
+    for repo in created:
+        repo.session.close.assert_called_once()
+    shared.get_version.assert_not_called()
+    shared.get_all_masterdata.assert_not_called()
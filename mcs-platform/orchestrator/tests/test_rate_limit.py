@@ -0,0 +1,72 @@
+"""Test adaptive outbound rate limiter."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from observability.rate_limit import AdaptiveRateLimiter, parse_retry_after
+from tools.dify_client import DifyClientRegistry
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    """Retry-After accepts delta-seconds and HTTP-date; junk is ignored."""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(later) <= 30
+
+
+@pytest.mark.asyncio
+async def test_throttle_halves_rate_and_pauses_for_retry_after():
+    """429 decreases the rate once per congestion event and blocks the bucket."""
+    limiter = AdaptiveRateLimiter("test", rate=10.0, min_rate=1.0, max_rate=10.0)
+
+    await limiter.on_throttled(retry_after=0.2)
+    await limiter.on_throttled(retry_after=0.2)  # same congestion window
+    assert limiter.rate == 5.0
+
+    started = time.monotonic()
+    async with limiter.slot():
+        pass
+    assert time.monotonic() - started >= 0.19
+
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(5.1)
+
+
+@pytest.mark.asyncio
+async def test_in_flight_cap_and_fifo_order():
+    """At most max_in_flight callers run at once and they are admitted in arrival order."""
+    limiter = AdaptiveRateLimiter("test", rate=1000.0, max_rate=1000.0, max_in_flight=2)
+    running = 0
+    peak = 0
+    order = []
+
+    async def call(i: int):
+        nonlocal running, peak
+        async with limiter.slot():
+            order.append(i)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call(i) for i in range(6)))
+
+    assert peak == 2
+    assert order == list(range(6))
+
+
+def test_registry_shares_one_limiter_per_app():
+    """Clients of the same Dify app share a limiter; other apps get their own."""
+    registry = DifyClientRegistry()
+    a = registry.get("https://dify.example.com", "token-a")
+    a_other_path = registry.get("https://dify.example.com", "token-a", api_path="/v1/workflows/run")
+    b = registry.get("https://dify.example.com", "token-b")
+
+    assert a.limiter is a_other_path.limiter
+    assert a.limiter is not b.limiter
@@ -1,9 +1,13 @@
 ﻿"""Test retry mechanism."""
 
+import asyncio
+import time
+
+import httpx
 import pytest
 from unittest.mock import AsyncMock, patch
 
-from observability.retry import retry_with_backoff
+from observability.retry import CircuitBreaker, CircuitOpenError, retry_with_backoff
 
 
 @retry_with_backoff(max_retries=3, backoff_factor=0.1)
@@ -21,3 +25,76 @@ async def test_retry_mechanism():
     # The function should have been retried 3 times
     # (actual retry count verification would require more sophisticated mocking)
 
+
+
+def _fail(breaker: CircuitBreaker) -> None:
+    with pytest.raises(httpx.ConnectError):
+        with breaker.guard():
+            raise httpx.ConnectError("connection refused")
+
+
+def test_circuit_opens_on_failure_rate_and_fails_fast():
+    """Breaker opens once the windowed failure rate crosses the threshold."""
+    breaker = CircuitBreaker("test", failure_rate_threshold=0.5, minimum_calls=4, open_seconds=30)
+    with breaker.guard():
+        pass
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.state == CircuitBreaker.CLOSED  # below minimum_calls
+
+    _fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as exc_info:
+        with breaker.guard():
+            pytest.fail("call must not run while the circuit is open")
+    assert 0 < exc_info.value.retry_in_seconds <= 30
+
+
+def test_client_errors_do_not_trip_circuit():
+    """4xx responses mean the dependency is up and count as successes."""
+    breaker = CircuitBreaker("test", minimum_calls=2)
+    response = httpx.Response(404, request=httpx.Request("GET", "https://erp.example.com"))
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            with breaker.guard():
+                response.raise_for_status()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_closes_or_reopens():
+    """After open_seconds one probe is admitted; its outcome closes or reopens the circuit."""
+    breaker = CircuitBreaker("test", minimum_calls=1, open_seconds=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    _fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    with breaker.guard():
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize(
+    "error", [asyncio.CancelledError(), ValueError("content does not match sha256")]
+)
+def test_aborted_half_open_probe_records_nothing(error):
+    """A cancelled probe or a non-dependency error leaves the circuit half-open."""
+    breaker = CircuitBreaker("test", minimum_calls=1, open_seconds=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The probe slot was given back
+    with breaker.guard():
+        pass
+    assert breaker.state == CircuitBreaker.CLOSED
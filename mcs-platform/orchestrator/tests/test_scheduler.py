@@ -0,0 +1,169 @@
+"""Test listener scheduler email polling."""
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from listener.processors.email import EmailProcessor
+from listener.scheduler import UnifiedScheduler
+from observability.retry import CircuitOpenError
+from settings import Settings
+
+
+class FakeEmailListener:
+    """In-memory listener that records concurrency and call order."""
+
+    def __init__(self, uids: list[str]):
+        self.uids = uids
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.events: list[tuple[str, str]] = []
+        self.senders: dict[str, str] = {}
+        self.without_attachments: set[str] = set()
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def poll_new_messages(self) -> list[str]:
+        return list(self.uids)
+
+    async def fetch_envelope(self, uid: str) -> dict:
+        self.events.append((uid, "envelope"))
+        return {
+            "uid": uid,
+            "message_id": f"<{uid}@example.com>",
+            "from": self.senders.get(uid, "customer@example.com"),
+            "has_attachments": uid not in self.without_attachments,
+        }
+
+    async def fetch_message(self, uid: str) -> dict:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.events.append((uid, "fetch"))
+        await asyncio.sleep(0.01)
+        return {
+            "uid": uid,
+            "message_id": f"<{uid}@example.com>",
+            "from": "customer@example.com",
+            "subject": "合同",
+            "body": "",
+            "attachments": [{"filename": "a.pdf", "content_type": "application/pdf", "payload": b"%PDF"}],
+        }
+
+    async def mark_as_processed(self, uid: str) -> None:
+        self.events.append((uid, "mark"))
+        self.in_flight -= 1
+
+    async def commit_poll(self, failed_ids: list[str], deferred_ids: list[str] = ()) -> None:
+        self.events.append(("poll", "commit"))
+        self.failed_ids = list(failed_ids)
+        self.deferred_ids = list(deferred_ids)
+
+    def is_allowed(self, sender_id: str) -> bool:
+        return sender_id != "spam@example.com"
+
+
+@pytest.mark.asyncio
+async def test_poll_email_bounded_concurrency():
+    """Messages are processed concurrently up to listener_max_in_flight."""
+    settings = Settings(listener_max_in_flight=2)
+    scheduler = UnifiedScheduler(settings)
+    listener = FakeEmailListener([str(i) for i in range(6)])
+    scheduler.listeners["email"] = listener
+    scheduler.processors["email"] = EmailProcessor()
+
+    orchestration_service = MagicMock()
+
+    async def run_sales_email(email_event):
+        listener.events.append((email_event.uid, "run"))
+        await asyncio.sleep(0.01)
+
+    orchestration_service.run_sales_email = AsyncMock(side_effect=run_sales_email)
+    scheduler.set_orchestration_service(orchestration_service)
+
+    await scheduler._poll_email()
+
+    assert orchestration_service.run_sales_email.await_count == 6
+    assert listener.max_in_flight == 2
+    for uid in listener.uids:
+        steps = [step for event_uid, step in listener.events if event_uid == uid]
+        assert steps == ["envelope", "fetch", "run", "mark"]
+
+
+@pytest.mark.asyncio
+async def test_poll_email_resolves_records_in_one_batch():
+    """One repo call per poll; processed messages and duplicate UIDs are skipped."""
+    settings = Settings(listener_max_in_flight=4)
+    repo = MagicMock()
+    repo.resolve_message_records.side_effect = lambda channel_type, messages: {
+        m["message_id"]: MagicMock(id=f"r{m['uid']}", processed=m["uid"] == "0") for m in messages
+    }
+    scheduler = UnifiedScheduler(settings, repo=repo)
+    listener = FakeEmailListener(["0", "1", "1"])
+    scheduler.listeners["email"] = listener
+    scheduler.processors["email"] = EmailProcessor()
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock()
+    scheduler.set_orchestration_service(orchestration_service)
+
+    await scheduler._poll_email()
+
+    repo.resolve_message_records.assert_called_once()
+    channel_type, messages = repo.resolve_message_records.call_args.args
+    assert channel_type == "email"
+    assert [m["uid"] for m in messages] == ["0", "1"]
+    repo.find_message_by_id.assert_not_called()
+    repo.create_message_record.assert_not_called()
+    orchestration_service.run_sales_email.assert_awaited_once()
+    repo.mark_as_processed.assert_called_once_with("r1")
+    # 已处理的邮件只取信封
+    assert [uid for uid, step in listener.events if step == "fetch"] == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_poll_email_filters_on_envelope_before_fetching():
+    """Disallowed senders and mail without attachments are never fetched in full."""
+    scheduler = UnifiedScheduler(Settings(), repo=MagicMock())
+    scheduler.repo.resolve_message_records.return_value = {}
+    listener = FakeEmailListener(["0", "1", "2"])
+    listener.senders["0"] = "spam@example.com"
+    listener.without_attachments.add("1")
+    scheduler.listeners["email"] = listener
+    scheduler.processors["email"] = EmailProcessor()
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock()
+    scheduler.set_orchestration_service(orchestration_service)
+
+    await scheduler._poll_email()
+
+    assert [uid for uid, step in listener.events if step == "fetch"] == ["2"]
+    messages = scheduler.repo.resolve_message_records.call_args.args[1]
+    assert [m["uid"] for m in messages] == ["2"]
+    orchestration_service.run_sales_email.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_poll_email_defers_messages_failed_by_unavailable_dependency():
+    """Circuit-open failures are committed as deferred (no attempt); other errors as failed."""
+    scheduler = UnifiedScheduler(Settings())
+    listener = FakeEmailListener(["0", "1", "2"])
+    scheduler.listeners["email"] = listener
+    scheduler.processors["email"] = EmailProcessor()
+    errors = {"0": CircuitOpenError("erp", 30), "1": ValueError("bad contract")}
+
+    async def run_sales_email(email_event):
+        if email_event.uid in errors:
+            raise errors[email_event.uid]
+
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock(side_effect=run_sales_email)
+    scheduler.set_orchestration_service(orchestration_service)
+
+    await scheduler._poll_email()
+
+    assert listener.failed_ids == ["1"]
+    assert listener.deferred_ids == ["0"]
@@ -0,0 +1,202 @@
+"""Test durable work queue workers."""
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from mcs_contracts import EmailEvent
+from listener.worker import OrchestrationWorkerPool
+from observability.retry import CircuitOpenError
+from settings import Settings
+
+
+def _work_item(attempts: int = 1) -> SimpleNamespace:
+    event = EmailEvent(
+        provider="imap",
+        account="sales@example.com",
+        folder="INBOX",
+        uid="1",
+        message_id="msg1",
+        from_email="customer@example.com",
+        subject="合同",
+        body_text="",
+        received_at="2024-01-01T00:00:00Z",
+    )
+    return SimpleNamespace(
+        id=uuid4(),
+        message_id="msg1",
+        record_id="rec1",
+        attempts=attempts,
+        payload=event.model_dump(mode="json"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_acks_and_marks_record():
+    """Successful run acks the item and marks the message record processed."""
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock()
+    pool = OrchestrationWorkerPool(Settings(), MagicMock(), orchestration_service)
+    repo = MagicMock()
+    repo.ack_work.return_value = True
+    item = _work_item()
+
+    await pool._process(repo, "w1", item)
+
+    orchestration_service.run_sales_email.assert_awaited_once()
+    repo.ack_work.assert_called_once_with(item.id, "w1")
+    repo.mark_as_processed.assert_called_once_with("rec1")
+    repo.fail_work.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_failure_retries_with_backoff():
+    """Failed run is released with exponential backoff and the record stays unprocessed."""
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock(side_effect=RuntimeError("dify down"))
+    pool = OrchestrationWorkerPool(
+        Settings(work_queue_retry_base_seconds=10), MagicMock(), orchestration_service
+    )
+    repo = MagicMock()
+    repo.fail_work.return_value = "pending"
+    item = _work_item(attempts=3)
+
+    await pool._process(repo, "w1", item)
+
+    repo.fail_work.assert_called_once()
+    args = repo.fail_work.call_args.args
+    assert args[0] == item.id
+    assert args[1] == "w1"
+    assert "dify down" in args[2]
+    assert args[3] == 40
+    repo.ack_work.assert_not_called()
+    repo.mark_as_processed.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_parks_item_while_circuit_open():
+    """Open circuit defers the item past the open window without consuming an attempt."""
+    orchestration_service = MagicMock()
+    orchestration_service.run_sales_email = AsyncMock(side_effect=CircuitOpenError("dify:api", 20))
+    pool = OrchestrationWorkerPool(Settings(), MagicMock(), orchestration_service)
+    repo = MagicMock()
+    item = _work_item(attempts=5)
+
+    await pool._process(repo, "w1", item)
+
+    repo.defer_work.assert_called_once()
+    args = repo.defer_work.call_args.args
+    assert args[:2] == (item.id, "w1")
+    assert 20 < args[3] <= 30
+    repo.fail_work.assert_not_called()
+    repo.ack_work.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_inside_graph_parks_item(monkeypatch):
+    """CircuitOpenError raised by a dependency inside the graph reaches the worker and parks the item."""
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from mcs_contracts import Contact, ContractSignalResult, Customer, EmailAttachment, MasterData
+    from graphs.sales_email import graph as sales_email_graph
+    from services.orchestration_service import OrchestrationService
+
+    async def select_pdf(state):
+        # 当前合同识别节点直接放行且不选 PDF；这里选中附件让 upload_pdf 真正访问文件服务
+        state.pdf_attachment = state.email_event.attachments[0]
+        state.contract_signals = ContractSignalResult(
+            ok=True, is_contract_mail=True, pdf_attachment_id=state.pdf_attachment.attachment_id
+        )
+        return state
+
+    monkeypatch.setattr(sales_email_graph, "detect_contract_signal", select_pdf)
+
+    masterdata = MasterData(
+        customers=[Customer(customer_id="c1", customer_num="C001", name="Customer 1")],
+        contacts=[Contact(contact_id="p1", email="customer@example.com", name="Buyer", customer_id="c1")],
+    )
+    masterdata_service = MagicMock()
+    masterdata_service.load_snapshot_async = AsyncMock(return_value=(1, masterdata))
+    masterdata_service.get_snapshot_async = AsyncMock(return_value=masterdata)
+    db_repo = MagicMock()
+    db_repo.get_idempotency_record.return_value = None
+    db_repo.find_run_by_message_id.return_value = None
+    db_repo.get_file_upload.return_value = None
+    file_server = MagicMock()
+    file_server.upload_file_async = AsyncMock(side_effect=CircuitOpenError("file_server", 20))
+    gateway_service = MagicMock()
+    gateway_service.create_order = AsyncMock(side_effect=CircuitOpenError("erp", 20))
+    orchestration_service = OrchestrationService(
+        settings=Settings(),
+        repo=db_repo,
+        masterdata_service=masterdata_service,
+        file_server=file_server,
+        dify_contract_client=MagicMock(),
+        dify_order_client=MagicMock(),
+        mailer=MagicMock(),
+        gateway_service=gateway_service,
+        checkpointer=MemorySaver(),
+    )
+    pool = OrchestrationWorkerPool(Settings(), MagicMock(), orchestration_service)
+    item = _work_item()
+    event = EmailEvent.model_validate(item.payload)
+    event.subject = "采购合同"
+    event.attachments = [
+        EmailAttachment(
+            attachment_id="att1",
+            filename="contract.pdf",
+            content_type="application/pdf",
+            size=4,
+            sha256="a" * 64,
+            bytes_b64="JVBERg==",
+        )
+    ]
+    item.payload = event.model_dump(mode="json")
+    repo = MagicMock()
+
+    await pool._process(repo, "w1", item)
+    file_server.upload_file_async.assert_awaited()
+
+    repo.defer_work.assert_called_once()
+    assert repo.defer_work.call_args.args[:2] == (item.id, "w1")
+    repo.fail_work.assert_not_called()
+    repo.ack_work.assert_not_called()
+
+
+def test_expired_lease_on_last_attempt_goes_dead():
+    """Crashed/hung workers: expired leases are reclaimed until max_attempts, then dead-lettered."""
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from listener.db.models import WorkItem
+    from listener.repo import ListenerRepo
+
+    engine = create_engine("sqlite://")
+    WorkItem.__table__.create(engine)
+    session = Session(engine)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    for message_id, attempts in (("retry", 2), ("exhausted", 3)):
+        session.add(
+            WorkItem(
+                id=uuid4(),
+                message_id=message_id,
+                channel_type="email",
+                payload={},
+                status="leased",
+                attempts=attempts,
+                max_attempts=3,
+                lease_owner="crashed",
+                lease_expires_at=expired,
+            )
+        )
+    session.commit()
+
+    claimed = ListenerRepo(session).claim_work("w1", lease_seconds=60, limit=10)
+
+    assert [(item.message_id, item.attempts) for item in claimed] == [("retry", 3)]
+    dead = session.query(WorkItem).filter_by(message_id="exhausted").one()
+    assert (dead.status, dead.last_error, dead.lease_owner) == ("dead", "lease expired", None)